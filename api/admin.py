@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 
 from .models import Record
+from .rollups import remove_from_rollups, update_rollups
 
 
 @admin.register(Record)
@@ -14,3 +16,21 @@ class RecordAdmin(admin.ModelAdmin):
         'is_archived',
         'user_id',
     )
+
+    def save_model(self, request, obj, form, change):
+        """Saves the record, moving it between the rollups buckets.
+        """
+        with transaction.atomic():
+            previous = Record.objects.filter(pk=obj.pk).first()
+            super().save_model(request, obj, form, change)
+            update_rollups([obj], [previous] if previous else [])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            remove_from_rollups(Record.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            remove_from_rollups(queryset)
+            super().delete_queryset(request, queryset)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """LRU of the tokens already resolved, expiring after a TTL.
+
+    Entries live in the process memory and, when the
+    AUTH_TOKEN_CACHE_ALIAS setting names a cache, also on Django's cache
+    framework, shared by the processes. The TTL bounds how long another
+    process may keep a token deleted elsewhere.
+    """
+    key_prefix = 'auth-token:'
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        alias = settings.AUTH_TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                token, expires = entry
+                if expires > now:
+                    self.entries.move_to_end(key)
+                    return token
+                del self.entries[key]
+
+        if self.shared is not None:
+            token = self.shared.get(self.key_prefix + key)
+            if token is not None:
+                self._store(key, token, now)
+            return token
+        return None
+
+    def set(self, key, token):
+        self._store(key, token, time.monotonic())
+        if self.shared is not None:
+            self.shared.set(
+                self.key_prefix + key, token, settings.AUTH_TOKEN_CACHE_TTL
+            )
+
+    def _store(self, key, token, now):
+        with self.lock:
+            self.entries[key] = (token, now + settings.AUTH_TOKEN_CACHE_TTL)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self.key_prefix + key)
+
+    def invalidate_user(self, user_id):
+        """Drops the tokens of the user from the process memory.
+        """
+        with self.lock:
+            keys = [
+                key for key, (token, _) in self.entries.items()
+                if token.user_id == user_id
+            ]
+            for key in keys:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token and user lookup for the
+    tokens found on the token cache.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+            return user, token
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return token.user, token
@@ -0,0 +1,133 @@
+"""Bulk archive and delete of the records matching the records list
+filters.
+
+Rows are changed in batches of ids, each batch in its own transaction, so
+no lock is held for long on a large set. Sets larger than
+RECORDS_BULK_JOB_THRESHOLD are left to a background job, run by the
+`run_bulk_jobs` command, which keeps its progress up to date.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.request import Request
+
+from .caching import bump_generation
+from .models import RecordBulkJob
+from .rollups import remove_from_rollups
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = [action for action, _ in RecordBulkJob.ACTION_CHOICES]
+
+
+def action_querysets(action, records):
+    """Querysets of the records changed by `action` among the tiered
+    `records`, archiving only touches the records table.
+    """
+    hot = records.querysets[0]
+    if action == 'archive':
+        return [hot.filter(is_archived=False)]
+    return records.querysets
+
+
+def count_action(action, records, limit=None):
+    """Number of records changed by `action`, counting up to `limit`
+    records on each tier.
+    """
+    return sum(
+        queryset[:limit].count() if limit is not None else queryset.count()
+        for queryset in action_querysets(action, records)
+    )
+
+
+def run_action(action, records, batch_size, progress=None):
+    """Archives or deletes the tiered `records` in batches of
+    `batch_size` records, calling `progress` with the number of records
+    affected so far after each batch. Returns the number of affected
+    records.
+    """
+    affected = 0
+    for queryset in action_querysets(action, records):
+        model = queryset.model
+        queryset = queryset.order_by('id')
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                ids = list(queryset.filter(id__gt=last_id).values_list(
+                    'id', flat=True
+                )[:batch_size])
+                if not ids:
+                    break
+                batch = model.objects.filter(id__in=ids)
+                if action == 'archive':
+                    affected += batch.update(is_archived=True)
+                else:
+                    remove_from_rollups(batch)
+                    affected += batch.delete()[0]
+                bump_generation()
+            last_id = ids[-1]
+            if progress is not None:
+                progress(affected)
+    return affected
+
+
+def filter_records(params):
+    """Tiered records matching the records list filters and search given
+    in the `params` query string.
+    """
+    from .views import RecordBulkAction
+
+    http_request = HttpRequest()
+    http_request.GET = QueryDict(params)
+    view = RecordBulkAction(request=Request(http_request), format_kwarg=None)
+    return view.get_tiered_queryset()
+
+
+def update_job(job, **fields):
+    RecordBulkJob.objects.filter(pk=job.pk).update(
+        updated=timezone.now(), **fields
+    )
+
+
+def claim_job():
+    """Next pending job, marked as running, or None when there isn't one.
+    """
+    pending = RecordBulkJob.objects.filter(status='pending')
+    while True:
+        job = pending.order_by('id').first()
+        if job is None:
+            return None
+        # Another worker may have claimed the job in the meantime.
+        if pending.filter(pk=job.pk).update(
+            status='running', updated=timezone.now()
+        ):
+            job.status = 'running'
+            return job
+
+
+def run_job(job, batch_size=None):
+    """Runs a claimed job, recording its total, progress and outcome.
+    """
+    batch_size = batch_size or settings.RECORDS_BULK_ACTION_BATCH_SIZE
+    try:
+        records = filter_records(job.params)
+        job.total = count_action(job.action, records)
+        update_job(job, total=job.total)
+
+        job.processed = run_action(
+            job.action,
+            records,
+            batch_size,
+            lambda processed: update_job(job, processed=processed)
+        )
+        job.status = 'done'
+        update_job(job, status=job.status, processed=job.processed)
+    except Exception as exc:
+        logger.exception('Bulk job %s failed.', job.pk)
+        job.status = 'failed'
+        job.error = str(exc)
+        update_job(job, status=job.status, error=job.error)
+    return job
@@ -0,0 +1,144 @@
+"""Response cache of the records list and detail.
+
+Entries are keyed by the current generation of the records, the user,
+the accepted media type and the normalized URL. Every write of records
+bumps the generation, so the entries cached before it are never read
+again and just expire, without scanning keys. The ETag comes from the
+key too, a client revalidating an unchanged response gets a 304 while
+the response is still cached.
+
+The cache must be shared by every process writing records, or their
+writes are only seen once the responses expire. The generation is bumped
+atomically: with `incr` on the backends doing it atomically and under a
+file lock on the file based cache, where `incr` is a get then a set.
+"""
+import os
+import time
+from hashlib import sha1
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+GENERATION_KEY = 'records-generation'
+
+
+def get_cache():
+    alias = settings.RECORDS_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _initial_generation():
+    # Starting from the clock keeps the generation growing when the
+    # counter is evicted, writes don't come faster than once a nanosecond.
+    return time.time_ns()
+
+
+def get_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, _initial_generation(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _bump_file_generation(cache):
+    # Processes bumping it at the same time would otherwise both write the
+    # same next generation, or write it back after a newer one.
+    os.makedirs(cache._dir, exist_ok=True)
+    with open(os.path.join(cache._dir, 'generation.lock'), 'ab') as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        try:
+            current = cache.get(GENERATION_KEY) or 0
+            cache.set(
+                GENERATION_KEY, max(_initial_generation(), current + 1), None
+            )
+        finally:
+            locks.unlock(lock)
+
+
+def _incr_generation():
+    cache = get_cache()
+    if cache is None:
+        return
+    if isinstance(cache, FileBasedCache):
+        _bump_file_generation(cache)
+        return
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, _initial_generation(), None)
+
+
+def bump_generation():
+    """Invalidates the cached responses after a write of records.
+
+    The generation is bumped right away and once more on commit, so the
+    responses cached by concurrent reads while the transaction was open
+    are dropped as well.
+    """
+    _incr_generation()
+    transaction.on_commit(_incr_generation)
+
+
+def invalidate_responses():
+    """Invalidates the cached responses right away, outside of any
+    transaction.
+    """
+    _incr_generation()
+
+
+def response_key(request, generation):
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+    url = '{}://{}{}?{}'.format(
+        request.scheme, request.get_host(), request.path, query
+    )
+    digest = sha1('\x1f'.join([
+        str(request.user.pk),
+        request.accepted_media_type or '',
+        url,
+    ]).encode('utf-8')).hexdigest()
+    return 'records-response:{}:{}'.format(generation, digest)
+
+
+def cached_response(request, build):
+    """Response of `request` from the cache or built by calling `build`,
+    with an ETag. Answers with a 304 when the client already has it.
+    """
+    cache = get_cache()
+    if cache is None:
+        return build()
+
+    key = response_key(request, get_generation(cache))
+    etag = quote_etag(sha1(key.encode('ascii')).hexdigest())
+    # Weak comparison, the ETag is made weak when the response is
+    # compressed.
+    if_none_match = [
+        tag[2:] if tag.startswith('W/') else tag
+        for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    ]
+    data = cache.get(key)
+    if data is None:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, settings.RECORDS_CACHE_TIMEOUT)
+    elif etag in if_none_match or '*' in if_none_match:
+        # Only while the response is cached, a write the generation
+        # missed is seen once it expires.
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+
+    response['ETag'] = etag
+    return response
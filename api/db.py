@@ -0,0 +1,128 @@
+"""Tuning of the database connections.
+
+* sqlite connections get the SQLITE_PRAGMAS on connect, WAL lets the
+  readers go on while a write is in progress.
+* Persistent connections, kept by CONN_MAX_AGE, are checked at the start
+  of the requests with DATABASE_HEALTH_CHECKS on, once every
+  DATABASE_HEALTH_CHECK_INTERVAL seconds, so a connection closed by the
+  server is replaced instead of failing the request.
+* The statements of each view are limited by DATABASE_STATEMENT_TIMEOUTS,
+  Postgres cancels them and sqlite interrupts them. The timeout is only
+  applied when the view runs statements.
+"""
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+# Postgres error code of the statements cancelled by the timeout.
+QUERY_CANCELED = '57014'
+
+# Number of sqlite virtual machine instructions between the checks of
+# the statement deadline.
+SQLITE_PROGRESS_STEPS = 1000
+
+
+def apply_pragmas(connection):
+    """Applies the SQLITE_PRAGMAS to a new sqlite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def check_connections():
+    """Closes the persistent connections that are no longer usable, they
+    are opened again when needed. A connection is checked at most once
+    every DATABASE_HEALTH_CHECK_INTERVAL seconds.
+    """
+    if not settings.DATABASE_HEALTH_CHECKS:
+        return
+    now = time.monotonic()
+    interval = settings.DATABASE_HEALTH_CHECK_INTERVAL
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if now - getattr(connection, 'health_checked', 0) < interval:
+            continue
+        connection.health_checked = now
+        if not connection.is_usable():
+            connection.close()
+
+
+def get_statement_timeout(view):
+    """Statement timeout of the `view` name, in milliseconds, or None.
+    """
+    timeouts = settings.DATABASE_STATEMENT_TIMEOUTS
+    return timeouts.get(view, timeouts.get('default'))
+
+
+class PostgresStatementTimeout:
+    """Execute wrapper setting the statement timeout of the request on
+    the Postgres session before its first statement, unless it is already
+    the one of the session. Requests without statements don't set it.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        # Whether the timeout was set inside a transaction, which undoes
+        # it when rolled back.
+        self.transactional = False
+
+    def __call__(self, execute, sql, params, many, context):
+        timeout = int(getattr(self.request, 'statement_timeout', None) or 0)
+        connection = context['connection']
+        if getattr(connection, 'statement_timeout', None) != timeout:
+            # The DB-API cursor, the wrappers don't see the statement.
+            context['cursor'].cursor.execute(
+                'SET statement_timeout = %s', [timeout]
+            )
+            connection.statement_timeout = timeout
+            self.transactional |= connection.in_atomic_block
+        return execute(sql, params, many, context)
+
+    def finish(self, connection):
+        """Called at the end of the request. A timeout set inside a
+        transaction is set again by the next request.
+        """
+        if self.transactional:
+            connection.statement_timeout = None
+
+
+class SQLiteStatementTimeout:
+    """Execute wrapper interrupting the sqlite statements running longer
+    than the statement timeout of the request.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        timeout = getattr(self.request, 'statement_timeout', None)
+        if not timeout:
+            return execute(sql, params, many, context)
+
+        deadline = time.monotonic() + timeout / 1000
+        conn = context['connection'].connection
+        conn.set_progress_handler(
+            lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS
+        )
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def finish(self, connection):
+        pass
+
+
+def is_statement_timeout(exc):
+    """Whether `exc` comes from a statement stopped by its timeout.
+    """
+    if not isinstance(exc, OperationalError):
+        return False
+    if getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED:
+        return True
+    return str(exc) == 'interrupted'
@@ -0,0 +1,74 @@
+"""Streaming export of the records as NDJSON or CSV.
+
+Rows are read in chunks through `QuerySet.iterator()`, a server-side
+cursor on Postgres, and written as they come, so the memory used doesn't
+depend on the number of exported records.
+"""
+import csv
+import io
+import json
+import zlib
+
+from .serializers import RecordFastSerializer, RecordModelSerializer
+
+FIELDS = RecordModelSerializer.Meta.fields
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_rows(queryset, chunk_size):
+    """Yields the records of `queryset` as lists of values in the FIELDS
+    order, formatted like the records serializer does.
+    """
+    serializer = RecordFastSerializer(FIELDS)
+    rows = serializer.get_queryset(queryset.order_by('date', 'id'))
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield serializer.to_values(row)
+
+
+def iter_ndjson(rows, chunk_size):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(FIELDS, row))))
+        if len(lines) == chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_csv(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_records(queryset, fmt, chunk_size):
+    """Yields the text chunks of the records of `queryset` in the `fmt`
+    format, one chunk every `chunk_size` records.
+    """
+    rows = iter_rows(queryset, chunk_size)
+    if fmt == 'csv':
+        return iter_csv(rows, chunk_size)
+    return iter_ndjson(rows, chunk_size)
+
+
+def gzip_stream(chunks, encoding='utf-8'):
+    """Compresses the text `chunks` on the fly into a gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,266 @@
+"""Compact encodings of the record fields.
+
+The dictionary encoded fields hold strings on the Python side, so the
+models, filters, serializers and the API keep working with the values as
+before, while the database stores small integers:
+
+* `SmallEnumField`: a fixed set of values, stored as their codes.
+* `InternedCharField`: an open set of values repeated over many rows,
+  interned on a lookup table with a unique `name` and stored as the id
+  of their row there.
+
+`IPv4IntegerField` keeps the integer value of an IPv4 address field next
+to it, so ranges of addresses are ranges of integers.
+"""
+import threading
+from ipaddress import IPv4Address
+
+from django.apps import apps
+from django.db import models, router, transaction
+
+# Code given to lookups of unknown values, never stored, so they match
+# no rows.
+UNKNOWN_CODE = 0
+
+
+class SmallEnumField(models.CharField):
+    """String field with a fixed set of values stored as small integers,
+    given by `codes`, a dict of the value of each code.
+    """
+
+    def __init__(self, *args, codes=None, **kwargs):
+        self.codes = dict(codes or {})
+        self.values = {code: value for value, code in self.codes.items()}
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['codes'] = self.codes
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'SmallIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.values[value]
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        return self.codes.get(value, UNKNOWN_CODE)
+
+    def get_db_prep_save(self, value, connection):
+        if value is not None and value not in self.codes:
+            raise ValueError('Invalid value {!r} for {}.'.format(
+                value, self.name
+            ))
+        return super().get_db_prep_save(value, connection)
+
+
+class InternedValues:
+    """Two-way cache, in the process memory, of the values interned on a
+    lookup table and the ids of their rows.
+
+    Rows are never deleted nor changed, so the entries never go stale.
+    Rows read are cached right away. Rows created inside a transaction
+    are kept apart, for the transaction only, and cached once it commits,
+    they would be gone after a rollback.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.ids = {}
+        self.names = {}
+        self.lock = threading.Lock()
+        # Rows created by the transaction of each thread, by name, with
+        # the commit hook caching them.
+        self.local = threading.local()
+
+    @property
+    def model(self):
+        return apps.get_model(self.label)
+
+    def _remember(self, rows):
+        with self.lock:
+            for pk, name in rows:
+                self.ids[name] = pk
+                self.names[pk] = name
+
+    def _pending(self, using):
+        """Rows created by the transaction in progress, by name. The ones
+        of rolled back transactions or savepoints are left out, their
+        commit hook is gone with them.
+        """
+        pending = getattr(self.local, 'pending', None)
+        if not pending:
+            return {}
+        hooks = {
+            id(func)
+            for _, func in transaction.get_connection(using).run_on_commit
+        }
+        pending = {
+            name: (pk, hook) for name, (pk, hook) in pending.items()
+            if id(hook) in hooks
+        }
+        self.local.pending = pending
+        return pending
+
+    def _created(self, pk, name, using):
+        if not transaction.get_connection(using).in_atomic_block:
+            self._remember([(pk, name)])
+            return
+
+        def hook():
+            self._remember([(pk, name)])
+
+        transaction.on_commit(hook, using=using)
+        self.local.pending = self._pending(using)
+        self.local.pending[name] = (pk, hook)
+
+    def get_id(self, name, create=False):
+        """Id of the row of `name`, created when missing with `create`,
+        or None.
+        """
+        pk = self.ids.get(name)
+        if pk is not None:
+            return pk
+        using = router.db_for_write(self.model)
+        pending = self._pending(using)
+        if name in pending:
+            return pending[name][0]
+
+        if create:
+            row, created = self.model.objects.get_or_create(name=name)
+            if created:
+                self._created(row.pk, name, using)
+                return row.pk
+            pk = row.pk
+        else:
+            pk = self.model.objects.filter(name=name).values_list(
+                'pk', flat=True
+            ).first()
+            if pk is None:
+                return None
+        self._remember([(pk, name)])
+        return pk
+
+    def get_name(self, pk):
+        """Value of the row `pk`, reading the whole table when it isn't
+        cached, it only holds a handful of rows.
+        """
+        name = self.names.get(pk)
+        if name is not None:
+            return name
+        using = router.db_for_write(self.model)
+        created = {
+            row_pk: name
+            for name, (row_pk, _) in self._pending(using).items()
+        }
+        if pk in created:
+            return created[pk]
+
+        rows = list(self.model.objects.values_list('pk', 'name'))
+        self._remember(
+            (row_pk, name) for row_pk, name in rows if row_pk not in created
+        )
+        return dict(rows)[pk]
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+            self.names.clear()
+
+
+_interned = {}
+_interned_lock = threading.Lock()
+
+
+def interned_values(label):
+    """Cache of the values interned on the `label` model.
+    """
+    cache = _interned.get(label)
+    if cache is None:
+        with _interned_lock:
+            cache = _interned.setdefault(label, InternedValues(label))
+    return cache
+
+
+def clear_interned_values():
+    """Empties the caches, after the lookup tables were emptied.
+    """
+    with _interned_lock:
+        caches = list(_interned.values())
+    for cache in caches:
+        cache.clear()
+
+
+class InternedCharField(models.CharField):
+    """String field storing the id of its value on the `to` lookup table,
+    a model with a unique `name`, interning new values when saved.
+
+    The ids are resolved through the cache of the process, lookups only
+    support exact matches.
+    """
+
+    def __init__(self, *args, to=None, **kwargs):
+        self.to = to
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['to'] = self.to
+        return name, path, args, kwargs
+
+    @property
+    def interned(self):
+        return interned_values(self.to)
+
+    def get_internal_type(self):
+        return 'IntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.interned.get_name(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        pk = self.interned.get_id(value)
+        return UNKNOWN_CODE if pk is None else pk
+
+    def get_db_prep_save(self, value, connection):
+        value = self.to_python(value)
+        if value is None:
+            return value
+        return self.interned.get_id(value, create=True)
+
+
+class IPv4IntegerField(models.BigIntegerField):
+    """Integer value of the IPv4 address held by the `source` field, set
+    whenever the row is saved, also by bulk inserts.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', 0)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        kwargs.pop('editable', None)
+        if kwargs.get('default') == 0:
+            del kwargs['default']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        address = getattr(model_instance, self.source)
+        value = int(IPv4Address(address)) if address else 0
+        setattr(model_instance, self.attname, value)
+        return value
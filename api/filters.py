@@ -0,0 +1,125 @@
+from functools import reduce
+from ipaddress import IPv4Network, ip_network
+from operator import or_
+
+from django import forms
+from django.db.models import Q
+from django.utils import timezone
+from django_filters import rest_framework as rest_filters
+from rest_framework import filters
+
+from .models import Record
+from .search import fulltext_enabled, fulltext_filter
+
+
+class RecordSearchFilter(filters.SearchFilter):
+    """Search filter backed by the full text index of the record messages.
+
+    Matches the records with words starting with each search term. Falls
+    back to the default `icontains` search when there's no full text
+    index available.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if terms and fulltext_enabled(queryset.model):
+            filtered = fulltext_filter(queryset, terms)
+            if filtered is not None:
+                return filtered
+        return super().filter_queryset(request, queryset, view)
+
+
+class IPv4NetworkField(forms.Field):
+    """Form field of an IPv4 network in CIDR notation, like 10.0.0.0/8.
+    """
+    default_error_messages = {
+        'invalid': 'Enter a valid IPv4 network in CIDR notation.',
+    }
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            network = ip_network(value.strip(), strict=False)
+        except ValueError:
+            raise forms.ValidationError(
+                self.error_messages['invalid'], code='invalid'
+            )
+        if not isinstance(network, IPv4Network):
+            raise forms.ValidationError(
+                self.error_messages['invalid'], code='invalid'
+            )
+        return network
+
+
+class CharInFilter(rest_filters.BaseInFilter, rest_filters.CharFilter):
+    pass
+
+
+class ChoiceInFilter(rest_filters.BaseInFilter, rest_filters.ChoiceFilter):
+    pass
+
+
+class IPv4NetworksFilter(rest_filters.BaseCSVFilter):
+    """Records with `origin_int` inside any of a comma separated list of
+    networks, each one a range scan of the integer addresses.
+    """
+    field_class = IPv4NetworkField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        ranges = [
+            Q(**{
+                self.field_name + '__gte': int(network.network_address),
+                self.field_name + '__lte': int(network.broadcast_address),
+            })
+            for network in value
+        ]
+        return qs.filter(reduce(or_, ranges))
+
+
+class RecordFilterSet(rest_filters.FilterSet):
+    """Filters of the records list.
+
+    Every filter is a comparison, a list or a range on a column leading
+    one of the record indexes, followed by the date. The filters are all
+    declared, without a model, so they apply to the archived records
+    table, with the same columns, as well.
+    """
+    environment = rest_filters.CharFilter()
+    environment__in = CharInFilter(field_name='environment')
+    level = rest_filters.ChoiceFilter(choices=Record.REC_CHOICES)
+    level__in = ChoiceInFilter(
+        field_name='level', choices=Record.REC_CHOICES
+    )
+    message = rest_filters.CharFilter()
+    origin = rest_filters.CharFilter()
+    origin__in = CharInFilter(field_name='origin')
+    origin__cidr = IPv4NetworksFilter(field_name='origin_int')
+    is_archived = rest_filters.BooleanFilter()
+    date__gte = rest_filters.IsoDateTimeFilter(
+        field_name='date', lookup_expr='gte'
+    )
+    date__gt = rest_filters.IsoDateTimeFilter(
+        field_name='date', lookup_expr='gt'
+    )
+    date__lte = rest_filters.IsoDateTimeFilter(
+        field_name='date', lookup_expr='lte'
+    )
+    date__lt = rest_filters.IsoDateTimeFilter(
+        field_name='date', lookup_expr='lt'
+    )
+    last = rest_filters.DurationFilter(method='filter_last')
+    events__gte = rest_filters.NumberFilter(
+        field_name='events', lookup_expr='gte'
+    )
+    events__lte = rest_filters.NumberFilter(
+        field_name='events', lookup_expr='lte'
+    )
+
+    def filter_last(self, queryset, name, value):
+        """Records dated within the `value` duration, like PT15M for the
+        last 15 minutes.
+        """
+        return queryset.filter(date__gte=timezone.now() - value)
@@ -0,0 +1,213 @@
+import copy
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateTimeField, F, Max, Value
+from django.db.models.functions import Greatest
+
+from .caching import bump_generation
+from .metrics import INGEST_BATCH_SIZE, RECORDS_INGESTED
+from .models import Record
+from .rollups import update_rollups
+from .tail import publish
+
+
+def as_record(item):
+    """Returns an unsaved Record, with its fingerprint, from validated
+    record data or from an unsaved Record instance.
+    """
+    record = item if isinstance(item, Record) else Record(**item)
+    record.fingerprint = record.compute_fingerprint()
+    return record
+
+
+def fill_ids(records):
+    """Sets the ids of the `records` just bulk inserted, in order, on
+    sqlite, where `bulk_create` doesn't return them. Called inside the
+    inserting transaction: sqlite serializes the writers and the records
+    table uses AUTOINCREMENT, so its last ids are the inserted ones.
+    """
+    if not records or records[0].pk is not None \
+            or connection.vendor != 'sqlite':
+        return
+    last = Record.objects.aggregate(last=Max('id'))['last']
+    for pk, record in enumerate(records, last - len(records) + 1):
+        record.pk = pk
+        record._state.adding = False
+
+
+def dedup_window():
+    """Time window where records with the same fingerprint are merged, or
+    None when the RECORDS_DEDUP_WINDOW setting disables deduplication.
+    """
+    if settings.RECORDS_DEDUP_WINDOW <= 0:
+        return None
+    return timedelta(seconds=settings.RECORDS_DEDUP_WINDOW)
+
+
+def lock_fingerprints(fingerprints):
+    """Serializes the ingestion of the records with the given fingerprints
+    until the end of the transaction, so concurrent duplicates are merged
+    instead of both being inserted.
+
+    Postgres takes a transaction advisory lock per fingerprint, in order
+    so concurrent batches don't deadlock. sqlite has a single writer, its
+    lock is taken up front by a write changing no row, so a concurrent
+    ingestion waits before looking for the duplicate instead of failing
+    on a stale read.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE {} SET id = id WHERE 0'.format(
+                Record._meta.db_table
+            ))
+        return
+    if connection.vendor != 'postgresql':
+        return
+    # First 60 bits of the fingerprint, within the bigint lock keys.
+    keys = sorted({int(fingerprint[:15], 16) for fingerprint in fingerprints})
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(key) FROM '
+            '(SELECT unnest(%s::bigint[]) AS key ORDER BY 1) AS keys',
+            [keys]
+        )
+
+
+def merge_duplicate(record, window):
+    """Adds the events of `record` to the latest record with the same
+    fingerprint dated within `window` of it, moving its date forward.
+
+    Called with the fingerprint locked by `lock_fingerprints`, the
+    increment is a single UPDATE, so concurrent merges never lose events.
+    Returns the merged record as it was before the merge, for the
+    rollups, or None when there isn't a duplicate.
+    """
+    duplicate = Record.objects.filter(
+        fingerprint=record.fingerprint,
+        is_archived=False,
+        date__gte=record.date - window,
+        date__lte=record.date + window,
+    ).order_by('-date', '-id').first()
+    if duplicate is None:
+        return None
+
+    updated = Record.objects.filter(pk=duplicate.pk).update(
+        events=F('events') + record.events,
+        date=Greatest(
+            F('date'), Value(record.date, output_field=DateTimeField())
+        ),
+    )
+    return duplicate if updated else None
+
+
+def merged_copy(duplicate, record):
+    """Copy of the `duplicate` record once `record` is merged into it.
+    """
+    merged = copy.copy(duplicate)
+    merged.events += record.events
+    merged.date = max(duplicate.date, record.date)
+    return merged
+
+
+def collapse_duplicates(records, window):
+    """Merges the records of a batch with the same fingerprint dated
+    within `window` of each other. Returns the remaining records.
+    """
+    latest = {}
+    collapsed = []
+    for record in sorted(records, key=lambda record: record.date):
+        head = latest.get(record.fingerprint)
+        if head is not None and record.date - head.date <= window:
+            head.events += record.events
+            head.date = record.date
+        else:
+            latest[record.fingerprint] = record
+            collapsed.append(record)
+    return collapsed
+
+
+def ingest_record(item):
+    """Stores one validated record, merged into a recent duplicate when
+    deduplication is enabled.
+
+    Returns the stored record and whether it was created.
+    """
+    record = as_record(item)
+    window = dedup_window()
+
+    with transaction.atomic():
+        if window is not None:
+            lock_fingerprints([record.fingerprint])
+            duplicate = merge_duplicate(record, window)
+            if duplicate is not None:
+                merged = Record.objects.get(pk=duplicate.pk)
+                update_rollups([merged], [duplicate])
+                bump_generation()
+                publish([merged], 'merge')
+                RECORDS_INGESTED.labels('merged').inc()
+                return merged, False
+        record.save()
+        update_rollups([record])
+        publish([record])
+    RECORDS_INGESTED.labels('created').inc()
+    return record, True
+
+
+def bulk_ingest(items, batch_size=None):
+    """Stores a list of validated record data using bulk inserts.
+
+    `items` may also hold unsaved Record instances. The rollups are
+    updated once for the whole batch. When deduplication is enabled
+    duplicates are merged, inside the batch and into recent records,
+    before inserting. The inserts are split in chunks of
+    `batch_size` items, by default the RECORDS_BULK_BATCH_SIZE setting,
+    limited to what the database accepts in one statement, and run in a
+    single transaction.
+
+    Returns the list of created records and the number of merged ones.
+    """
+    records = [as_record(item) for item in items]
+    batch_size = min(
+        batch_size or settings.RECORDS_BULK_BATCH_SIZE,
+        connection.ops.bulk_batch_size(Record._meta.concrete_fields, records)
+    )
+    window = dedup_window()
+
+    with transaction.atomic():
+        merged = 0
+        # Merged records by id, as they were before and after the merges.
+        merges = {}
+        if window is not None:
+            collapsed = collapse_duplicates(records, window)
+            merged = len(records) - len(collapsed)
+            lock_fingerprints(record.fingerprint for record in collapsed)
+            records = []
+            for record in collapsed:
+                duplicate = merge_duplicate(record, window)
+                if duplicate is None:
+                    records.append(record)
+                else:
+                    merged += 1
+                    before, after = merges.get(
+                        duplicate.pk, (duplicate, duplicate)
+                    )
+                    merges[duplicate.pk] = (
+                        before, merged_copy(after, record)
+                    )
+
+        created = Record.objects.bulk_create(records, batch_size=batch_size)
+        fill_ids(created)
+        update_rollups(
+            created + [after for _, after in merges.values()],
+            [before for before, _ in merges.values()]
+        )
+        if created or merges:
+            bump_generation()
+        publish(created)
+        publish([after for _, after in merges.values()], 'merge')
+    INGEST_BATCH_SIZE.observe(len(items))
+    RECORDS_INGESTED.labels('created').inc(len(created))
+    RECORDS_INGESTED.labels('merged').inc(merged)
+    return created, merged
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.partitions import apply_retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Removes the records older than the retention period and, on '
+        'Postgres, creates the partitions of the upcoming months.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.RECORDS_RETENTION_DAYS,
+            help=(
+                'Retention period in days. Defaults to the '
+                'RECORDS_RETENTION_DAYS setting, records are kept forever '
+                'when not set.'
+            ),
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=settings.RECORDS_PARTITIONS_AHEAD,
+            help='Number of upcoming months with a partition.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECORDS_RETENTION_BATCH_SIZE,
+            help='Maximum number of records deleted per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        result = apply_retention(
+            options['days'], options['months_ahead'], options['batch_size']
+        )
+        for name in result['created']:
+            self.stdout.write('Created partition {}.'.format(name))
+        for name in result['dropped']:
+            self.stdout.write('Dropped partition {}.'.format(name))
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted {} expired records.'.format(result['deleted'])
+        ))
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.spool import get_spool, store_spooled
+
+
+class Command(BaseCommand):
+    help = (
+        'Stores the records queued on the spool by the write-behind mode, '
+        'in transactions of up to --batch-size records.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECORDS_SPOOL_BATCH_SIZE,
+            help='Maximum number of records stored per transaction.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='Seconds to wait when the spool is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exits when the spool is empty instead of waiting.',
+        )
+
+    def handle(self, *args, **options):
+        spool = get_spool()
+        total = 0
+        try:
+            while True:
+                drained = spool.drain(store_spooled, options['batch_size'])
+                total += drained
+                if drained:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            'Stored {} spooled records.'.format(total)
+        ))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.tiers import move_archived
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the archived records from the records table to the cold '
+        'archived records table, keeping their ids.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=settings.RECORDS_COLD_MIN_AGE,
+            help='Only moves the records older than this number of days.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECORDS_COLD_BATCH_SIZE,
+            help='Maximum number of records moved per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        moved = move_archived(options['batch_size'], options['min_age'])
+        self.stdout.write(self.style.SUCCESS(
+            'Moved {} archived records.'.format(moved)
+        ))
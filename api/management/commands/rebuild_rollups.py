@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.models import RecordRollup
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the records rollups, used by the statistics endpoint, '
+        'from the stored records.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bucket',
+            action='append',
+            dest='buckets',
+            choices=[choice for choice, _ in RecordRollup.BUCKET_CHOICES],
+            help=(
+                'Bucket size to rebuild, may be repeated. Defaults to the '
+                'RECORDS_ROLLUP_BUCKETS setting.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        buckets = options['buckets'] or settings.RECORDS_ROLLUP_BUCKETS
+        created = rebuild_rollups(buckets)
+        self.stdout.write(self.style.SUCCESS(
+            'Created {} rollups for the buckets: {}.'.format(
+                created, ', '.join(buckets)
+            )
+        ))
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.bulk import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the pending bulk archive and delete jobs, changing up to '
+        '--batch-size records per transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECORDS_BULK_ACTION_BATCH_SIZE,
+            help='Maximum number of records changed per transaction.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when there are no pending jobs.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exits when there are no pending jobs instead of waiting.',
+        )
+
+    def handle(self, *args, **options):
+        done = 0
+        try:
+            while True:
+                job = claim_job()
+                if job is not None:
+                    job = run_job(job, options['batch_size'])
+                    self.stdout.write('Job {} {}: {} of {} records.'.format(
+                        job.pk, job.status, job.processed, job.total
+                    ))
+                    done += 1
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            'Ran {} bulk jobs.'.format(done)
+        ))
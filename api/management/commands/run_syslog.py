@@ -0,0 +1,105 @@
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.syslog import RecordBatcher, serve
+
+
+class Command(BaseCommand):
+    help = (
+        'Receives syslog messages (RFC 5424 and RFC 3164) over UDP and TCP '
+        'and stores them as records, in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Username owning the received records.',
+        )
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument(
+            '--udp-port',
+            type=int,
+            default=settings.RECORDS_SYSLOG_PORT,
+            help='UDP port, 0 disables the UDP listener.',
+        )
+        parser.add_argument(
+            '--tcp-port',
+            type=int,
+            default=settings.RECORDS_SYSLOG_PORT,
+            help='TCP port, 0 disables the TCP listener.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECORDS_SYSLOG_BATCH_SIZE,
+            help='Stores the records every this number of messages.',
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=int,
+            default=settings.RECORDS_SYSLOG_FLUSH_INTERVAL,
+            help='Stores the records at least every this number of ms.',
+        )
+        parser.add_argument(
+            '--max-pending',
+            type=int,
+            default=settings.RECORDS_SYSLOG_MAX_PENDING,
+            help=(
+                'Batches waiting for the database before pausing the TCP '
+                'senders and shedding the UDP messages.'
+            ),
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=settings.RECORDS_SYSLOG_RETRIES,
+            help='Times a batch failing to be stored is tried again.',
+        )
+        parser.add_argument(
+            '--environment-from',
+            choices=['hostname', 'app-name'],
+            default='hostname',
+            help='Message field used as the record environment.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(
+                'User "{}" does not exist.'.format(options['user'])
+            )
+
+        udp_port = options['udp_port'] or None
+        tcp_port = options['tcp_port'] or None
+        if udp_port is None and tcp_port is None:
+            raise CommandError('Both the UDP and TCP listeners are disabled.')
+
+        batcher = RecordBatcher(
+            user,
+            options['batch_size'],
+            options['flush_interval'] / 1000,
+            options['environment_from'],
+            max_pending=options['max_pending'],
+            retries=options['retries'],
+        )
+        self.stdout.write(
+            'Listening for syslog on {} (udp {}, tcp {}).'.format(
+                options['host'], udp_port or '-', tcp_port or '-'
+            )
+        )
+        try:
+            asyncio.run(serve(batcher, options['host'], udp_port, tcp_port))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            'Stored {} syslog records, dropped {}, shed {}, failed {}.'
+            .format(
+                batcher.stored, batcher.dropped, batcher.shed, batcher.failed
+            )
+        ))
@@ -0,0 +1,316 @@
+"""Metrics of the service in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in the memory of each process, each
+labelled child holding its own lock, held only for a few additions, so
+they are cheap enough to stay on in production. Gauges may be computed
+on scraping by a function. With several worker processes each one
+serves its own values, scrape them separately or keep one process.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def escape_label(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace(
+        '"', r'\"'
+    )
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, escape_label(value)) for name, value in pairs
+    ) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yields the (suffix, label values, extra labels, value) of the
+        samples.
+        """
+        for values, child in sorted(self.children.items()):
+            for suffix, extra, value in child.samples():
+                yield suffix, values, extra, value
+
+    def expose(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.kind),
+        ]
+        for suffix, values, extra, value in self.samples():
+            lines.append('{}{}{} {}'.format(
+                self.name,
+                suffix,
+                format_labels(self.labelnames, values, extra),
+                format_value(value),
+            ))
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        yield '', (), self.value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self):
+        yield '', (), self.function() if self.function else self.value
+
+
+class Gauge(Metric):
+    """Gauge, set by the code or, given `function`, computed by it on
+    every scrape.
+    """
+    kind = 'gauge'
+
+    def __init__(self, *args, function=None, **kwargs):
+        self.function = function
+        super().__init__(*args, **kwargs)
+
+    def new_child(self):
+        return _GaugeChild(self.function)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def samples(self):
+        if self.function is not None and not self.labelnames:
+            self.labels()
+        return super().samples()
+
+
+class _HistogramChild:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = 0
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield '_bucket', [('le', format_value(bound))], cumulative
+        yield '_sum', (), total
+        yield '_count', (), cumulative
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(*args, **kwargs)
+
+    def new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def expose(self):
+        """Text exposition of all the metrics.
+        """
+        return '\n'.join(metric.expose() for metric in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _spool_size():
+    from django.conf import settings
+
+    from .spool import get_spool
+
+    if not settings.RECORDS_WRITE_BEHIND:
+        return 0
+    return get_spool().size()
+
+
+def _pending_bulk_jobs():
+    from .models import RecordBulkJob
+
+    return RecordBulkJob.objects.filter(status='pending').count()
+
+
+def _tail_subscribers():
+    from .tail import broadcaster
+
+    return len(broadcaster.subscriptions)
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Time to answer the requests, up to the response headers.',
+    ['view', 'method'],
+)
+REQUESTS = Counter(
+    'http_requests_total',
+    'Answered requests.',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'db_queries_per_request',
+    'Database queries run by each request.',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+QUERY_SECONDS = Counter(
+    'db_query_duration_seconds_total',
+    'Time spent running database queries.',
+    ['view'],
+)
+SERIALIZER_SECONDS = Histogram(
+    'serializer_duration_seconds',
+    'Time to serialize the responses.',
+    ['serializer'],
+)
+RECORDS_INGESTED = Counter(
+    'records_ingested_total',
+    'Records received by the ingestion, created or merged.',
+    ['outcome'],
+)
+INGEST_BATCH_SIZE = Histogram(
+    'records_ingest_batch_size',
+    'Number of records stored by each ingestion.',
+    buckets=(1, 10, 100, 500, 1000, 5000, 10000),
+)
+SPOOL_SIZE = Gauge(
+    'records_spool_size',
+    'Records queued on the write-behind spool.',
+    function=_spool_size,
+)
+BULK_JOBS_PENDING = Gauge(
+    'records_bulk_jobs_pending',
+    'Bulk archive and delete jobs waiting for the worker.',
+    function=_pending_bulk_jobs,
+)
+TAIL_SUBSCRIBERS = Gauge(
+    'records_tail_subscribers',
+    'Open live tail streams.',
+    function=_tail_subscribers,
+)
+TAIL_DROPPED = Counter(
+    'records_tail_dropped_total',
+    'Records not sent to live tail viewers falling behind.',
+)
+
+
+class QueryStats:
+    """Database execute wrapper counting and timing the queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
@@ -0,0 +1,212 @@
+import gzip
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from .db import (
+    PostgresStatementTimeout,
+    SQLiteStatementTimeout,
+    get_statement_timeout,
+    is_statement_timeout,
+)
+from .metrics import (
+    QUERY_SECONDS,
+    REQUEST_QUERIES,
+    REQUEST_SECONDS,
+    REQUESTS,
+    QueryStats,
+)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def view_name(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return view_class.__name__ if view_class is not None \
+        else view_func.__name__
+
+
+class MetricsMiddleware:
+    """Records the latency, status and database queries of each request,
+    labelled by the view answering it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        queries = QueryStats()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = getattr(request, 'metrics_view', 'unmatched')
+        REQUEST_SECONDS.labels(view, request.method).observe(elapsed)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        QUERY_SECONDS.labels(view).inc(queries.seconds)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func)
+
+
+def accepted_encodings(header):
+    """Content codings of an Accept-Encoding header with their quality,
+    the refused ones with a quality of 0.
+    """
+    encodings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[coding] = quality
+    return encodings
+
+
+def coding_quality(accepted, coding):
+    """Quality of `coding` among the `accepted` encodings, the one of the
+    '*' wildcard when the header doesn't name it.
+    """
+    if coding in accepted:
+        return accepted[coding]
+    return accepted.get('*', 0)
+
+
+def compressors():
+    """Available content codings, by order of preference, and their
+    compression function.
+    """
+    level = settings.RESPONSE_COMPRESSION_LEVEL
+    available = []
+    if brotli is not None:
+        # Brotli qualities go up to 11 and gzip levels up to 9.
+        available.append(('br', lambda data: brotli.compress(
+            data, quality=min(level + 1, 11)
+        )))
+    available.append(('gzip', lambda data: gzip.compress(
+        data, compresslevel=level
+    )))
+    return available
+
+
+class CompressionMiddleware:
+    """Compresses the responses with brotli, when installed, or gzip,
+    whichever the client prefers.
+
+    Responses smaller than RESPONSE_COMPRESSION_MIN_SIZE bytes aren't
+    worth the CPU and are sent as they are, as are the streamed responses,
+    the export compresses its own stream and the live tail events must go
+    out at once.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ['Accept-Encoding'])
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        choices = [
+            (coding_quality(accepted, coding), -rank, coding, func)
+            for rank, (coding, func) in enumerate(compressors())
+        ]
+        quality, _, coding, compress = max(choices)
+        if quality <= 0:
+            return response
+
+        compressed = compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        # The compressed body is no longer byte for byte the one of the
+        # strong ETag.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class StatementTimeoutMiddleware:
+    """Limits the time each database statement of a request may take, by
+    view, as given by DATABASE_STATEMENT_TIMEOUTS. Requests stopped by
+    the timeout get a service unavailable status code.
+
+    The timeout applies to the statements of the streamed responses too.
+    """
+    timeouts = {
+        'postgresql': PostgresStatementTimeout,
+        'sqlite': SQLiteStatementTimeout,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timeout_class = self.timeouts.get(connection.vendor)
+        if timeout_class is None:
+            return self.get_response(request)
+
+        timeout = timeout_class(request)
+        with connection.execute_wrapper(timeout):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, timeout
+            )
+        else:
+            timeout.finish(connection)
+        return response
+
+    def stream(self, content, timeout):
+        # Installed around each chunk only, so the wrappers of the
+        # connection stay nested when streams are consumed in turns.
+        iterator = iter(content)
+        try:
+            while True:
+                with connection.execute_wrapper(timeout):
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        return
+                yield chunk
+        finally:
+            timeout.finish(connection)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.statement_timeout = get_statement_timeout(
+            view_name(view_func)
+        )
+
+    def process_exception(self, request, exception):
+        if not is_statement_timeout(exception):
+            return None
+        return JsonResponse(
+            {'detail': 'The request took too long, try a narrower one.'},
+            status=503
+        )
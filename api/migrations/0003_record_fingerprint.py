@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:37
+
+from hashlib import sha1
+
+from django.db import migrations, models
+
+
+def fill_fingerprints(apps, schema_editor):
+    Record = apps.get_model('api', 'Record')
+
+    batch = []
+    for record in Record.objects.iterator(chunk_size=2000):
+        key = '\x1f'.join([
+            record.environment, record.level, record.origin, record.message
+        ])
+        record.fingerprint = sha1(key.encode('utf-8')).hexdigest()
+        batch.append(record)
+        if len(batch) == 2000:
+            Record.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    Record.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_record_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='fingerprint',
+            field=models.CharField(default='', editable=False, max_length=40, verbose_name='Fingerprint'),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['fingerprint', 'date'], name='record_fingerprint_date_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from api.migrations._fulltext import (
+    install_fulltext_index, remove_fulltext_index
+)
+
+
+def install(apps, schema_editor):
+    install_fulltext_index(schema_editor)
+
+
+def remove(apps, schema_editor):
+    remove_fulltext_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_record_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, remove),
+    ]
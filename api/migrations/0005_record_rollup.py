@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_record_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_size', models.CharField(choices=[('minute', 'MINUTE'), ('hour', 'HOUR'), ('day', 'DAY')], max_length=6, verbose_name='Bucket size')),
+                ('bucket', models.DateTimeField(verbose_name='Bucket')),
+                ('environment', models.CharField(max_length=30, verbose_name='Environment')),
+                ('level', models.CharField(choices=[('error', 'ERROR'), ('info', 'INFO'), ('debug', 'DEBUG'), ('warning', 'WARNING'), ('critical', 'CRITICAL')], max_length=10, verbose_name='Level')),
+                ('origin', models.GenericIPAddressField(protocol='IPv4', verbose_name='Origin')),
+                ('records', models.BigIntegerField(default=0, verbose_name='Records')),
+                ('events', models.BigIntegerField(default=0, verbose_name='Events')),
+            ],
+            options={
+                'unique_together': {('bucket_size', 'bucket', 'environment', 'level', 'origin')},
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+from api.migrations._fulltext import install_fulltext_index
+
+TABLE = 'api_record'
+NEW_TABLE = 'api_record_partitioned'
+DEFAULT_PARTITION = 'api_record_default'
+
+
+def month_start(date):
+    date = date.astimezone(timezone.utc)
+    return datetime(date.year, date.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(date, months):
+    month = date.month - 1 + months
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1)
+
+
+def partition_records_table(apps, schema_editor):
+    """Converts the records table into a table partitioned by month of
+    `date`, moving the existing rows.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    model = apps.get_model('api', 'Record')
+    execute = schema_editor.execute
+
+    execute(
+        'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (date)'.format(NEW_TABLE, TABLE)
+    )
+    execute('ALTER TABLE {} ADD PRIMARY KEY (id, date)'.format(NEW_TABLE))
+    execute(
+        'CREATE TABLE {} PARTITION OF {} DEFAULT'.format(
+            DEFAULT_PARTITION, NEW_TABLE
+        )
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(date), MAX(date) FROM {}'.format(TABLE))
+        first, last = cursor.fetchone()
+    now = timezone.now()
+    month = month_start(min(first or now, now))
+    end = add_months(
+        month_start(max(last or now, now)), settings.RECORDS_PARTITIONS_AHEAD
+    )
+    while month <= end:
+        execute(
+            "CREATE TABLE {}_p{:04d}{:02d} PARTITION OF {} "
+            "FOR VALUES FROM ('{}') TO ('{}')".format(
+                TABLE,
+                month.year,
+                month.month,
+                NEW_TABLE,
+                month.isoformat(),
+                add_months(month, 1).isoformat(),
+            )
+        )
+        month = add_months(month, 1)
+
+    execute('INSERT INTO {} SELECT * FROM {}'.format(NEW_TABLE, TABLE))
+    execute('ALTER SEQUENCE {}_id_seq OWNED BY {}.id'.format(
+        TABLE, NEW_TABLE
+    ))
+    execute('DROP TABLE {}'.format(TABLE))
+    execute('ALTER TABLE {} RENAME TO {}'.format(NEW_TABLE, TABLE))
+    execute('ALTER TABLE {} RENAME CONSTRAINT {}_pkey TO {}_pkey'.format(
+        TABLE, NEW_TABLE, TABLE
+    ))
+    execute(
+        'ALTER TABLE {0} ADD CONSTRAINT {0}_user_id_fk '
+        'FOREIGN KEY (user_id_id) REFERENCES auth_user (id) '
+        'DEFERRABLE INITIALLY DEFERRED'.format(TABLE)
+    )
+    user_field = model._meta.get_field('user_id')
+    execute(schema_editor._create_index_sql(model, [user_field]))
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+    install_fulltext_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    """Partitions the records table by month on Postgres, a no-op on the
+    other databases. Not reversed, the partitioned table keeps working
+    with the previous migrations.
+    """
+
+    dependencies = [
+        ('api', '0005_record_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            partition_records_table, migrations.RunPython.noop
+        ),
+    ]
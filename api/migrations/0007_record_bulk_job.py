@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0006_partition_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordBulkJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('archive', 'ARCHIVE'), ('delete', 'DELETE')], max_length=10, verbose_name='Action')),
+                ('params', models.TextField(blank=True, verbose_name='Filter parameters')),
+                ('status', models.CharField(choices=[('pending', 'PENDING'), ('running', 'RUNNING'), ('done', 'DONE'), ('failed', 'FAILED')], default='pending', max_length=10, verbose_name='Status')),
+                ('total', models.IntegerField(null=True, verbose_name='Total')),
+                ('processed', models.IntegerField(default=0, verbose_name='Processed')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0007_record_bulk_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('environment', models.CharField(max_length=30, verbose_name='Environment')),
+                ('level', models.CharField(choices=[('error', 'ERROR'), ('info', 'INFO'), ('debug', 'DEBUG'), ('warning', 'WARNING'), ('critical', 'CRITICAL')], max_length=10, verbose_name='Level')),
+                ('message', models.CharField(max_length=200, verbose_name='Message')),
+                ('origin', models.GenericIPAddressField(protocol='IPv4', verbose_name='Origin')),
+                ('date', models.DateTimeField(verbose_name='Date')),
+                ('is_archived', models.BooleanField(default=True, verbose_name='Is archived')),
+                ('events', models.IntegerField(verbose_name='Events')),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['date', 'id'], name='archived_date_id_idx'),
+        ),
+    ]
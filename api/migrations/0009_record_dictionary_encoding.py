@@ -0,0 +1,211 @@
+from django.db import migrations, models
+
+import api.fields
+from api.migrations._fulltext import install_fulltext_index
+
+LEVEL_CHOICES = [
+    ('error', 'ERROR'),
+    ('info', 'INFO'),
+    ('debug', 'DEBUG'),
+    ('warning', 'WARNING'),
+    ('critical', 'CRITICAL'),
+]
+
+LEVEL_CODES = {
+    'debug': 10,
+    'info': 20,
+    'warning': 30,
+    'error': 40,
+    'critical': 50,
+}
+
+TABLES = ['api_record', 'api_archivedrecord']
+ENVIRONMENTS = 'api_recordenvironment'
+
+
+def _case(column, mapping):
+    return 'CASE {} {} END'.format(column, ' '.join(
+        "WHEN '{}' THEN {}".format(key, value) if isinstance(key, str)
+        else "WHEN {} THEN '{}'".format(key, value)
+        for key, value in mapping.items()
+    ))
+
+
+def encode(apps, schema_editor):
+    """Interns the environments and fills the code columns, in a few set
+    based statements, whatever the size of the tables.
+    """
+    execute = schema_editor.execute
+    execute(
+        'INSERT INTO {} (name) SELECT environment FROM {} '
+        'UNION SELECT environment FROM {}'.format(ENVIRONMENTS, *TABLES)
+    )
+    for table in TABLES:
+        execute(
+            'UPDATE {table} SET level_code = {level}, environment_code = ('
+            'SELECT e.id FROM {environments} e '
+            'WHERE e.name = {table}.environment)'.format(
+                table=table,
+                level=_case('level', LEVEL_CODES),
+                environments=ENVIRONMENTS,
+            )
+        )
+
+
+def decode(apps, schema_editor):
+    levels = {code: level for level, code in LEVEL_CODES.items()}
+    for table in TABLES:
+        schema_editor.execute(
+            'UPDATE {table} SET level = {level}, environment = ('
+            'SELECT e.name FROM {environments} e '
+            'WHERE e.id = {table}.environment_code)'.format(
+                table=table,
+                level=_case('level_code', levels),
+                environments=ENVIRONMENTS,
+            )
+        )
+
+
+def add_foreign_keys(apps, schema_editor):
+    # Only Postgres, sqlite can't add constraints to existing tables.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            'ALTER TABLE {table} ADD CONSTRAINT {table}_environment_fk '
+            'FOREIGN KEY (environment) REFERENCES {environments} (id) '
+            'DEFERRABLE INITIALLY DEFERRED'.format(
+                table=table, environments=ENVIRONMENTS
+            )
+        )
+
+
+def remove_foreign_keys(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS '
+            '{table}_environment_fk'.format(table=table)
+        )
+
+
+def install_fulltext(apps, schema_editor):
+    # The records table was rebuilt on sqlite, dropping the triggers.
+    install_fulltext_index(schema_editor)
+
+
+def code_fields(model_name):
+    """Adds the columns of the codes and lets the old columns be null, so
+    the migration can be reversed.
+    """
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name='level_code',
+            field=api.fields.SmallEnumField(
+                choices=LEVEL_CHOICES, codes=LEVEL_CODES, max_length=10,
+                null=True, verbose_name='Level'
+            ),
+        ),
+        migrations.AddField(
+            model_name=model_name,
+            name='environment_code',
+            field=api.fields.InternedCharField(
+                max_length=30, null=True, to='api.RecordEnvironment',
+                verbose_name='Environment'
+            ),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='level',
+            field=models.CharField(
+                choices=LEVEL_CHOICES, max_length=10, null=True,
+                verbose_name='Level'
+            ),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='environment',
+            field=models.CharField(
+                max_length=30, null=True, verbose_name='Environment'
+            ),
+        ),
+    ]
+
+
+def replace_fields(model_name):
+    operations = []
+    for name in ['level', 'environment']:
+        operations += [
+            migrations.RemoveField(model_name=model_name, name=name),
+            migrations.RenameField(
+                model_name=model_name,
+                old_name='{}_code'.format(name),
+                new_name=name,
+            ),
+        ]
+    operations += [
+        migrations.AlterField(
+            model_name=model_name,
+            name='level',
+            field=api.fields.SmallEnumField(
+                choices=LEVEL_CHOICES, codes=LEVEL_CODES, max_length=10,
+                verbose_name='Level'
+            ),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='environment',
+            field=api.fields.InternedCharField(
+                max_length=30, to='api.RecordEnvironment',
+                verbose_name='Environment'
+            ),
+        ),
+    ]
+    return operations
+
+
+class Migration(migrations.Migration):
+    """Stores the record levels as small integer codes and the record
+    environments as ids of the interned environments table.
+    """
+
+    dependencies = [
+        ('api', '0008_archived_record'),
+    ]
+
+    operations = [
+        # Reinstalls the triggers when reversed, the last operation then.
+        migrations.RunPython(migrations.RunPython.noop, install_fulltext),
+        migrations.CreateModel(
+            name='RecordEnvironment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True, verbose_name='Name')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='record',
+            name='record_env_level_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='record',
+            name='record_level_date_idx',
+        ),
+        *code_fields('record'),
+        *code_fields('archivedrecord'),
+        migrations.RunPython(encode, decode),
+        *replace_fields('record'),
+        *replace_fields('archivedrecord'),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['environment', 'level', 'date'], name='record_env_level_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['level', 'date'], name='record_level_date_idx'),
+        ),
+        migrations.RunPython(add_foreign_keys, remove_foreign_keys),
+        migrations.RunPython(install_fulltext, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:20
+
+from ipaddress import IPv4Address
+
+import api.fields
+from django.db import migrations, models
+
+from api.migrations._fulltext import install_fulltext_index
+
+
+def fill_origin_ints(apps, schema_editor):
+    for name in ['Record', 'ArchivedRecord']:
+        model = apps.get_model('api', name)
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(
+                "UPDATE {} SET origin_int = origin::inet - '0.0.0.0'::inet"
+                .format(model._meta.db_table)
+            )
+            continue
+
+        batch = []
+        queryset = model.objects.only('id', 'origin')
+        for record in queryset.iterator(chunk_size=2000):
+            record.origin_int = int(IPv4Address(record.origin))
+            batch.append(record)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['origin_int'])
+                batch = []
+        model.objects.bulk_update(batch, ['origin_int'])
+
+
+def install_fulltext(apps, schema_editor):
+    # The records table was rebuilt on sqlite, dropping the triggers.
+    install_fulltext_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_record_dictionary_encoding'),
+    ]
+
+    operations = [
+        # Reinstalls the triggers when reversed, the last operation then.
+        migrations.RunPython(migrations.RunPython.noop, install_fulltext),
+        migrations.AddField(
+            model_name='archivedrecord',
+            name='origin_int',
+            field=api.fields.IPv4IntegerField(source='origin', verbose_name='Origin as integer'),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='origin_int',
+            field=api.fields.IPv4IntegerField(source='origin', verbose_name='Origin as integer'),
+        ),
+        migrations.RunPython(fill_origin_ints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['origin_int', 'date'], name='record_origin_int_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['events', 'date'], name='record_events_date_idx'),
+        ),
+        migrations.RunPython(install_fulltext, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+"""Full text index of the record messages, as created by the migrations.
+
+The table and index names are the ones of the migrated schema, not the
+ones of the current models, so the migrations keep doing the same.
+"""
+TABLE = 'api_record'
+FTS_TABLE = 'api_record_fts'
+PG_CONFIG = 'simple'
+PG_INDEX = 'record_message_fts_idx'
+
+SQLITE_INSTALL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+        message, content='{table}', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF message
+    ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+        INSERT INTO {fts}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVE = [
+    'DROP TRIGGER IF EXISTS {fts}_ai',
+    'DROP TRIGGER IF EXISTS {fts}_ad',
+    'DROP TRIGGER IF EXISTS {fts}_au',
+    'DROP TABLE IF EXISTS {fts}',
+]
+
+PG_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS {index} ON {table} "
+    "USING GIN (to_tsvector('{config}', message))",
+]
+
+PG_REMOVE = [
+    'DROP INDEX IF EXISTS {index}',
+]
+
+
+def _statements(vendor, install):
+    if vendor == 'sqlite':
+        return SQLITE_INSTALL if install else SQLITE_REMOVE
+    if vendor == 'postgresql':
+        return PG_INSTALL if install else PG_REMOVE
+    return []
+
+
+def _run(schema_editor, install):
+    vendor = schema_editor.connection.vendor
+    for statement in _statements(vendor, install):
+        schema_editor.execute(statement.format(
+            fts=FTS_TABLE,
+            table=TABLE,
+            index=PG_INDEX,
+            config=PG_CONFIG,
+        ))
+
+
+def install_fulltext_index(schema_editor):
+    """Creates, or recreates after the records table is rebuilt, the full
+    text index and fills it with the existing records.
+    """
+    _run(schema_editor, install=True)
+
+
+def remove_fulltext_index(schema_editor):
+    _run(schema_editor, install=False)
@@ -1,6 +1,21 @@
+from hashlib import sha1
+
 from django.contrib.auth.models import User
 from django.db import models
 
+from .fields import InternedCharField, IPv4IntegerField, SmallEnumField
+
+
+class RecordEnvironment(models.Model):
+    """Environments of the records, interned, so the records store the id
+    of their environment instead of the name.
+    """
+
+    name = models.CharField('Name', max_length=30, unique=True)
+
+    def __str__(self):
+        return self.name
+
 
 class Record(models.Model):
     """Represents the model of how the error information is recorded into
@@ -15,14 +30,82 @@ class Record(models.Model):
         ('critical', 'CRITICAL'),
     )
 
-    environment = models.CharField('Environment', max_length=30)
-    level = models.CharField('Level', max_length=10, choices=REC_CHOICES)
+    # Codes of the levels on the database, ordered by severity.
+    LEVEL_CODES = {
+        'debug': 10,
+        'info': 20,
+        'warning': 30,
+        'error': 40,
+        'critical': 50,
+    }
+
+    environment = InternedCharField(
+        'Environment', max_length=30, to='api.RecordEnvironment'
+    )
+    level = SmallEnumField(
+        'Level', max_length=10, choices=REC_CHOICES, codes=LEVEL_CODES
+    )
     message = models.CharField('Message', max_length=200)
     origin = models.GenericIPAddressField('Origin', protocol='IPv4')
+    origin_int = IPv4IntegerField('Origin as integer', source='origin')
     date = models.DateTimeField('Date')
     is_archived = models.BooleanField('Is archived')
     events = models.IntegerField('Events')
     user_id = models.ForeignKey(User, on_delete=models.CASCADE)
+    fingerprint = models.CharField(
+        'Fingerprint', max_length=40, editable=False, default=''
+    )
+
+    class Meta:
+        # Match the filters used by the records list, always followed by
+        # the date so the most recent records come straight from the index.
+        indexes = [
+            models.Index(
+                fields=['environment', 'level', 'date'],
+                name='record_env_level_date_idx'
+            ),
+            models.Index(
+                fields=['level', 'date'],
+                name='record_level_date_idx'
+            ),
+            models.Index(
+                fields=['origin', 'date'],
+                name='record_origin_date_idx'
+            ),
+            models.Index(
+                fields=['origin_int', 'date'],
+                name='record_origin_int_date_idx'
+            ),
+            models.Index(
+                fields=['is_archived', 'date'],
+                name='record_archived_date_idx'
+            ),
+            models.Index(
+                fields=['events', 'date'],
+                name='record_events_date_idx'
+            ),
+            models.Index(fields=['date', 'id'], name='record_date_id_idx'),
+            models.Index(
+                fields=['fingerprint', 'date'],
+                name='record_fingerprint_date_idx'
+            ),
+        ]
+
+    def compute_fingerprint(self):
+        """Hash identifying the records of the same kind, the ones with
+        the same environment, level, origin and message.
+        """
+        key = '\x1f'.join([
+            str(self.environment),
+            str(self.level),
+            str(self.origin),
+            str(self.message),
+        ])
+        return sha1(key.encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.compute_fingerprint()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return "{} [{}][{}][{}] {}: {}".format(
@@ -33,3 +116,120 @@ class Record(models.Model):
             self.events,
             self.message
         )
+
+
+class ArchivedRecord(models.Model):
+    """Cold tier of the archived records, moved out of the records table
+    keeping their ids.
+
+    Only the (date, id) index is kept, enough for the records list
+    pagination, so the table stays compact.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    environment = InternedCharField(
+        'Environment', max_length=30, to='api.RecordEnvironment'
+    )
+    level = SmallEnumField(
+        'Level',
+        max_length=10,
+        choices=Record.REC_CHOICES,
+        codes=Record.LEVEL_CODES,
+    )
+    message = models.CharField('Message', max_length=200)
+    origin = models.GenericIPAddressField('Origin', protocol='IPv4')
+    origin_int = IPv4IntegerField('Origin as integer', source='origin')
+    date = models.DateTimeField('Date')
+    is_archived = models.BooleanField('Is archived', default=True)
+    events = models.IntegerField('Events')
+    user_id = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['date', 'id'], name='archived_date_id_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return Record.__str__(self)
+
+
+class RecordRollup(models.Model):
+    """Number of records and sum of their events by level, environment
+    and origin on each time bucket. Kept up to date on ingestion and
+    used by the statistics endpoint.
+    """
+
+    BUCKET_CHOICES = (
+        ('minute', 'MINUTE'),
+        ('hour', 'HOUR'),
+        ('day', 'DAY'),
+    )
+
+    bucket_size = models.CharField(
+        'Bucket size', max_length=6, choices=BUCKET_CHOICES
+    )
+    bucket = models.DateTimeField('Bucket')
+    environment = models.CharField('Environment', max_length=30)
+    level = models.CharField(
+        'Level', max_length=10, choices=Record.REC_CHOICES
+    )
+    origin = models.GenericIPAddressField('Origin', protocol='IPv4')
+    records = models.BigIntegerField('Records', default=0)
+    events = models.BigIntegerField('Events', default=0)
+
+    class Meta:
+        unique_together = [
+            ['bucket_size', 'bucket', 'environment', 'level', 'origin'],
+        ]
+
+    def __str__(self):
+        return "{} {} [{}][{}][{}] {}/{}".format(
+            self.bucket_size,
+            self.bucket.strftime('%Y-%m-%d %H:%M'),
+            self.level,
+            self.origin,
+            self.environment,
+            self.records,
+            self.events
+        )
+
+
+class RecordBulkJob(models.Model):
+    """Bulk archive or delete of the records matching the records list
+    filters, run in the background by the bulk jobs worker.
+    """
+
+    ACTION_CHOICES = (
+        ('archive', 'ARCHIVE'),
+        ('delete', 'DELETE'),
+    )
+
+    STATUS_CHOICES = (
+        ('pending', 'PENDING'),
+        ('running', 'RUNNING'),
+        ('done', 'DONE'),
+        ('failed', 'FAILED'),
+    )
+
+    action = models.CharField('Action', max_length=10, choices=ACTION_CHOICES)
+    params = models.TextField('Filter parameters', blank=True)
+    status = models.CharField(
+        'Status', max_length=10, choices=STATUS_CHOICES, default='pending'
+    )
+    total = models.IntegerField('Total', null=True)
+    processed = models.IntegerField('Processed', default=0)
+    error = models.TextField('Error', blank=True)
+    created = models.DateTimeField('Created', auto_now_add=True)
+    updated = models.DateTimeField('Updated', auto_now=True)
+    user_id = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    def __str__(self):
+        return "{} {} [{}] {}/{}".format(
+            self.created.strftime('%Y-%m-%d %H:%M:%S'),
+            self.action,
+            self.status,
+            self.processed,
+            self.total
+        )
@@ -0,0 +1,179 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """Number of rows of `queryset` estimated by the Postgres planner,
+    from the table statistics, or None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, threshold):
+    """Number of rows of `queryset`, or of each queryset of a tiered
+    queryset, and whether it is approximate.
+
+    Counting stops after `threshold` rows, past them the count is the
+    planner estimate on Postgres, at least the rows already counted, and
+    a lower bound, the rows counted, elsewhere. None counts them all.
+    """
+    querysets = getattr(queryset, 'querysets', [queryset])
+    if threshold is None:
+        return sum(qs.count() for qs in querysets), False
+
+    count, approximate = 0, False
+    for qs in querysets:
+        qs = qs.order_by()
+        capped = qs[:threshold + 1].count()
+        if capped > threshold:
+            approximate = True
+            capped = max(capped, estimate_count(qs) or 0)
+        count += capped
+    return count, approximate
+
+
+class RecordKeysetPagination(BasePagination):
+    """Keyset pagination over the (date, id) ordering, newest first.
+
+    The opaque cursor holds the (date, id) position of the record next to
+    the requested page, so the database seeks it through the (date, id)
+    index and deep pages cost the same as the first one.
+
+    The count of the whole list is exact up to RECORDS_COUNT_THRESHOLD
+    records and approximate above, see `count_rows`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        self.count, self.count_is_approximate = count_rows(
+            queryset, settings.RECORDS_COUNT_THRESHOLD
+        )
+
+        reverse = False
+        if cursor is not None:
+            date, pk, reverse = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(date__gt=date) | Q(date=date, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(date__lt=date) | Q(date=date, id__lt=pk)
+                )
+
+        ordering = ('date', 'id') if reverse else ('-date', '-id')
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.first = self.get_position(results[0]) if results else None
+        self.last = self.get_position(results[-1]) if results else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.RECORDS_PAGE_SIZE
+        if page_size <= 0:
+            return settings.RECORDS_PAGE_SIZE
+        return min(page_size, settings.RECORDS_MAX_PAGE_SIZE)
+
+    def get_position(self, record):
+        # Records or named rows from `values_list()`.
+        return record.date, record.id
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self.encode_cursor(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('count_is_approximate', self.count_is_approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            date = parse_datetime(tokens['d'][0])
+            pk = int(tokens['p'][0])
+            reverse = tokens.get('r', ['0'])[0] == '1'
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk, reverse
+
+    def encode_cursor(self, position, reverse):
+        date, pk = position
+        tokens = OrderedDict([('d', date.isoformat()), ('p', pk)])
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class UserCursorPagination(CursorPagination):
+    """Cursor pagination of the users list by id.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.USERS_PAGE_SIZE
+        if page_size <= 0:
+            return settings.USERS_PAGE_SIZE
+        return min(page_size, settings.USERS_MAX_PAGE_SIZE)
@@ -0,0 +1,48 @@
+import json
+
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import MSGPACK_MEDIA_TYPE
+
+
+class NDJSONParser(BaseParser):
+    """Newline delimited JSON parser, one JSON document per line.
+
+    Blank lines are ignored and the result is a list with the parsed
+    documents.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        items = []
+        for number, line in enumerate(stream, start=1):
+            try:
+                line = line.decode(encoding).strip()
+                if not line:
+                    continue
+                items.append(json.loads(line))
+            except ValueError as exc:
+                # UnicodeDecodeError included.
+                raise ParseError(
+                    'NDJSON parse error at line {}: {}'.format(number, exc)
+                )
+        return items
+
+
+class MessagePackParser(BaseParser):
+    """MessagePack parser. Timestamps are parsed into aware datetimes,
+    strings are accepted for the dates as in JSON.
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error: {}'.format(exc))
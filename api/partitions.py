@@ -0,0 +1,223 @@
+"""Monthly partitions of the records table and the retention policy.
+
+On Postgres the records table is partitioned by range of `date`, one
+partition per month (UTC) plus a default partition for the dates without
+one. Expired months are dropped as a whole, a single DDL statement
+instead of a DELETE of all their rows. Other databases keep a single
+table and the expired records are deleted in batches. Either way the
+removed records are taken off the rollups.
+"""
+import re
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_generation
+from .models import ArchivedRecord, Record
+from .rollups import remove_from_rollups
+
+TABLE = Record._meta.db_table
+DEFAULT_PARTITION = '{}_default'.format(TABLE)
+PARTITION_RE = re.compile(r'^{}_p(\d{{4}})(\d{{2}})$'.format(TABLE))
+
+
+def month_start(date):
+    """First instant, in UTC, of the month holding `date`.
+    """
+    date = date.astimezone(timezone.utc)
+    return datetime(date.year, date.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(date, months):
+    month = date.month - 1 + months
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(month):
+    return '{}_p{:04d}{:02d}'.format(TABLE, month.year, month.month)
+
+
+def partition_month(name):
+    """Month of a partition given its name, None for other tables.
+    """
+    match = PARTITION_RE.match(name)
+    if match is None:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def create_partition_sql(month, parent=TABLE):
+    return (
+        "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} "
+        "FOR VALUES FROM ('{}') TO ('{}')".format(
+            partition_name(month),
+            parent,
+            month.isoformat(),
+            add_months(month, 1).isoformat(),
+        )
+    )
+
+
+def month_condition(month):
+    return "date >= '{}' AND date < '{}'".format(
+        month.isoformat(), add_months(month, 1).isoformat()
+    )
+
+
+def attach_partition_sql(month, parent=TABLE):
+    """Statements creating the partition of `month` when the default
+    partition holds rows of the month, like records dated past the
+    prepared months. Postgres refuses to create the partition then, so
+    the rows are moved to a new table attached as the partition.
+    """
+    name = partition_name(month)
+    condition = month_condition(month)
+    return [
+        'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(name, parent),
+        'INSERT INTO {} SELECT * FROM {} WHERE {}'.format(
+            name, DEFAULT_PARTITION, condition
+        ),
+        'DELETE FROM {} WHERE {}'.format(DEFAULT_PARTITION, condition),
+        "ALTER TABLE {} ATTACH PARTITION {} "
+        "FOR VALUES FROM ('{}') TO ('{}')".format(
+            parent,
+            name,
+            month.isoformat(),
+            add_months(month, 1).isoformat(),
+        ),
+    ]
+
+
+def default_has_rows(cursor, month):
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM {} WHERE {})'.format(
+        DEFAULT_PARTITION, month_condition(month)
+    ))
+    return cursor.fetchone()[0]
+
+
+def is_partitioned(cursor):
+    if connection.vendor != 'postgresql':
+        return False
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [TABLE]
+    )
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions(cursor, parent=TABLE):
+    """Dict mapping the month of each partition to its name.
+    """
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = to_regclass(%s)',
+        [parent]
+    )
+    months = {}
+    for name, in cursor.fetchall():
+        month = partition_month(name)
+        if month is not None:
+            months[month] = name
+    return months
+
+
+def ensure_partitions(cursor, first, last, parent=TABLE):
+    """Creates the missing partitions of the months from `first` to
+    `last`, moving their rows out of the default partition, returns the
+    names of the created partitions.
+    """
+    existing = partitions(cursor, parent)
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if month not in existing:
+            with transaction.atomic():
+                if default_has_rows(cursor, month):
+                    for sql in attach_partition_sql(month, parent):
+                        cursor.execute(sql)
+                else:
+                    cursor.execute(create_partition_sql(month, parent))
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def partition_records(name):
+    """Records stored on the `name` partition.
+    """
+    return Record.objects.extra(
+        where=['tableoid = %s::regclass'], params=[name]
+    )
+
+
+def drop_expired_partitions(cursor, cutoff):
+    """Drops the partitions of the months ended before `cutoff`, returns
+    their names.
+    """
+    dropped = []
+    for month, name in sorted(partitions(cursor).items()):
+        if add_months(month, 1) <= cutoff:
+            with transaction.atomic():
+                remove_from_rollups(partition_records(name))
+                cursor.execute('DROP TABLE {}'.format(name))
+            dropped.append(name)
+    return dropped
+
+
+def delete_expired(queryset, cutoff, batch_size):
+    """Deletes the records of `queryset` older than `cutoff`, in batches
+    of `batch_size` rows so no lock is held for long. Returns the number
+    of deleted records.
+    """
+    expired = queryset.filter(date__lt=cutoff)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            batch = expired.model.objects.filter(id__in=ids)
+            remove_from_rollups(batch)
+            deleted += batch.delete()[0]
+            bump_generation()
+
+
+def apply_retention(days, months_ahead, batch_size):
+    """Removes the records, the cold ones included, older than `days` days
+    and, on a partitioned table, creates the partitions of the current
+    month and the next `months_ahead` months.
+
+    Returns a dict with the created and dropped partitions and the number
+    of records deleted row by row.
+    """
+    now = timezone.now()
+    result = {'created': [], 'dropped': [], 'deleted': 0}
+
+    with connection.cursor() as cursor:
+        partitioned = is_partitioned(cursor)
+        if partitioned:
+            result['created'] = ensure_partitions(
+                cursor, now, add_months(month_start(now), months_ahead)
+            )
+
+        if days is None:
+            return result
+
+        cutoff = now - timedelta(days=days)
+        if partitioned:
+            result['dropped'] = drop_expired_partitions(cursor, cutoff)
+            if result['dropped']:
+                bump_generation()
+            # Rows on the default partition don't have a month to drop.
+            queryset = partition_records(DEFAULT_PARTITION)
+        else:
+            queryset = Record.objects.all()
+
+    result['deleted'] = delete_expired(queryset, cutoff, batch_size)
+    result['deleted'] += delete_expired(
+        ArchivedRecord.objects.all(), cutoff, batch_size
+    )
+    return result
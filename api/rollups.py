@@ -0,0 +1,167 @@
+"""Incremental maintenance of the records rollups.
+
+Buckets are aligned in UTC. The rollups count the stored records, the
+cold ones included, and sum their events: a record merged by the
+deduplication adds its events to the bucket of the record it is merged
+into, and updated or deleted records are taken off their buckets, so the
+rollups always match what `rebuild_rollups` computes.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import ArchivedRecord, Record, RecordRollup
+
+TRUNCATE = {
+    'minute': dict(second=0, microsecond=0),
+    'hour': dict(minute=0, second=0, microsecond=0),
+    'day': dict(hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+def truncate(date, bucket_size):
+    """Start of the `bucket_size` bucket, in UTC, holding `date`.
+    """
+    return date.astimezone(timezone.utc).replace(**TRUNCATE[bucket_size])
+
+
+def aggregate(records, bucket_sizes):
+    """Sums the records by rollup key, returns a dict mapping the keys to
+    [records, events] lists.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for record in records:
+        for bucket_size in bucket_sizes:
+            key = (
+                bucket_size,
+                truncate(record.date, bucket_size),
+                record.environment,
+                record.level,
+                record.origin,
+            )
+            totals[key][0] += 1
+            totals[key][1] += record.events
+    return totals
+
+
+def add_to_rollup(key, records, events):
+    bucket_size, bucket, environment, level, origin = key
+    rollup = RecordRollup.objects.filter(
+        bucket_size=bucket_size,
+        bucket=bucket,
+        environment=environment,
+        level=level,
+        origin=origin,
+    )
+    increment = dict(
+        records=F('records') + records,
+        events=F('events') + events,
+    )
+    if rollup.update(**increment):
+        if records < 0:
+            # Emptied by the removal of its last records.
+            rollup.filter(records__lte=0).delete()
+        return
+
+    try:
+        with transaction.atomic():
+            RecordRollup.objects.create(
+                bucket_size=bucket_size,
+                bucket=bucket,
+                environment=environment,
+                level=level,
+                origin=origin,
+                records=records,
+                events=events,
+            )
+    except IntegrityError:
+        # Created by a concurrent ingestion since the update.
+        rollup.update(**increment)
+
+
+def apply_totals(totals):
+    # Rollups are changed in key order, so concurrent transactions lock
+    # them in the same order and don't deadlock.
+    for key, (count, events) in sorted(totals.items()):
+        if count or events:
+            add_to_rollup(key, count, events)
+
+
+def update_rollups(records, removed=()):
+    """Adds the stored `records` to the rollups of each bucket size on
+    the RECORDS_ROLLUP_BUCKETS setting and takes the `removed` ones off,
+    copies of the records as they were before being changed or deleted.
+    """
+    bucket_sizes = settings.RECORDS_ROLLUP_BUCKETS
+    totals = aggregate(records, bucket_sizes)
+    for key, (count, events) in aggregate(removed, bucket_sizes).items():
+        totals[key][0] -= count
+        totals[key][1] -= events
+    apply_totals(totals)
+
+
+def stored_totals(queryset, bucket_size):
+    """Rows with the number of records of `queryset` and the sum of their
+    events by `bucket_size` bucket, environment, level and origin.
+    """
+    return queryset.annotate(
+        bucket=Trunc('date', bucket_size, tzinfo=timezone.utc)
+    ).values(
+        'bucket', 'environment', 'level', 'origin'
+    ).annotate(
+        records=Count('id'), events=Sum('events')
+    ).order_by()
+
+
+def row_key(bucket_size, row):
+    return (
+        bucket_size,
+        row['bucket'],
+        row['environment'],
+        row['level'],
+        row['origin'],
+    )
+
+
+def remove_from_rollups(queryset):
+    """Takes the records of `queryset` off the rollups, called before they
+    are deleted.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for bucket_size in settings.RECORDS_ROLLUP_BUCKETS:
+        for row in stored_totals(queryset, bucket_size):
+            key = row_key(bucket_size, row)
+            totals[key][0] -= row['records']
+            totals[key][1] -= row['events']
+    apply_totals(totals)
+
+
+def rebuild_rollups(bucket_sizes, batch_size=1000):
+    """Replaces the rollups of the given bucket sizes by the aggregation
+    of the stored records, hot and cold. Returns the number of rollups
+    created.
+    """
+    rollups = RecordRollup.objects.filter(bucket_size__in=bucket_sizes)
+    with transaction.atomic():
+        rollups.delete()
+        for bucket_size in bucket_sizes:
+            batch = []
+            rows = stored_totals(Record.objects.all(), bucket_size)
+            for row in rows.iterator():
+                batch.append(RecordRollup(bucket_size=bucket_size, **row))
+                if len(batch) == batch_size:
+                    RecordRollup.objects.bulk_create(batch)
+                    batch = []
+            RecordRollup.objects.bulk_create(batch)
+
+            # Cold records share the buckets of the hot ones.
+            rows = stored_totals(ArchivedRecord.objects.all(), bucket_size)
+            for row in rows.iterator():
+                add_to_rollup(
+                    row_key(bucket_size, row), row['records'], row['events']
+                )
+        return rollups.count()
@@ -0,0 +1,72 @@
+"""Full text index of the record messages.
+
+On Postgres the index is a GIN index over the `tsvector` of the message
+and on sqlite an FTS5 table kept in sync by triggers, both created by the
+migrations. Both are updated by the database itself on every write,
+including bulk inserts.
+"""
+import re
+
+from django.db import connection
+
+from .models import Record
+
+FTS_TABLE = 'api_record_fts'
+PG_CONFIG = 'simple'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Whether the full text table exists, by database alias, looked up once
+# instead of on every search.
+_fulltext_tables = {}
+
+
+def fulltext_enabled(model):
+    """Whether the searches on `model` can use the full text index.
+    """
+    if model is not Record:
+        return False
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        enabled = _fulltext_tables.get(connection.alias)
+        if enabled is None:
+            enabled = FTS_TABLE in connection.introspection.table_names()
+            _fulltext_tables[connection.alias] = enabled
+        return enabled
+    return False
+
+
+def clear_fulltext_tables():
+    """Forgets whether the full text tables exist, after the migrations
+    may have created or dropped them.
+    """
+    _fulltext_tables.clear()
+
+
+def fulltext_filter(queryset, terms):
+    """Filters the records whose message has words starting with every
+    one of the search `terms`. Returns None when the terms have no words
+    to look for.
+    """
+    words = [word for term in terms for word in WORD_RE.findall(term)]
+    if not words:
+        return None
+
+    if connection.vendor == 'postgresql':
+        query = ' & '.join('{}:*'.format(word) for word in words)
+        return queryset.extra(
+            where=["to_tsvector('{0}', {1}.message) @@ "
+                   "to_tsquery('{0}', %s)".format(
+                       PG_CONFIG, Record._meta.db_table
+                   )],
+            params=[query]
+        )
+
+    query = ' '.join('"{}"*'.format(word) for word in words)
+    return queryset.extra(
+        where=['{}.id IN (SELECT rowid FROM {} WHERE {} MATCH %s)'.format(
+            Record._meta.db_table, FTS_TABLE, FTS_TABLE
+        )],
+        params=[query]
+    )
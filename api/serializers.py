@@ -1,14 +1,56 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework.serializers import ModelSerializer
+from django.db import models
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.settings import api_settings
+from rest_framework.serializers import (
+    BooleanField,
+    CharField,
+    ChoiceField,
+    DateTimeField,
+    IPAddressField,
+    ListSerializer,
+    ModelSerializer,
+    PrimaryKeyRelatedField,
+    Serializer,
+    SerializerMethodField,
+    ValidationError,
+)
+
+from .metrics import SERIALIZER_SECONDS
+from .models import ArchivedRecord, Record, RecordBulkJob, RecordRollup
 
-from .models import Record
 
+class TimedListSerializer(ListSerializer):
+    """List serializer recording the serialization time of its child.
+    """
+    @property
+    def data(self):
+        with SERIALIZER_SECONDS.labels(type(self.child).__name__).time():
+            return super().data
 
-class UserModelSerializer(ModelSerializer):
+
+class TimedSerializerMixin:
+    """Records the serialization time of the serializer, alone or as a
+    list.
+    """
+    @property
+    def data(self):
+        with SERIALIZER_SECONDS.labels(type(self).__name__).time():
+            return super().data
+
+
+class UserModelSerializer(TimedSerializerMixin, ModelSerializer):
     """User serializer.
     """
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'username',
@@ -21,11 +63,71 @@ class UserModelSerializer(ModelSerializer):
         return user
 
 
-class RecordModelSerializer(ModelSerializer):
+class UserRecordStatsSerializer(UserModelSerializer):
+    """User serializer embedding the number of records of the user by
+    level and the date of the last error, read from the annotations made
+    by `annotate_record_stats()`.
+    """
+    record_stats = SerializerMethodField()
+
+    class Meta(UserModelSerializer.Meta):
+        fields = UserModelSerializer.Meta.fields + ['record_stats']
+
+    def get_record_stats(self, user):
+        stats = OrderedDict(
+            (level, getattr(user, 'records_' + level))
+            for level, _ in Record.REC_CHOICES
+        )
+        stats['last_error_date'] = self.date_field.to_representation(
+            user.last_error_date
+        ) if user.last_error_date is not None else None
+        return stats
+
+    @cached_property
+    def date_field(self):
+        return DateTimeField()
+
+
+def archived_stat(level, aggregate, output_field):
+    """Correlated subquery of `aggregate` over the archived records of the
+    outer user at `level`.
+    """
+    archived = ArchivedRecord.objects.filter(
+        user_id=OuterRef('pk'), level=level
+    ).order_by().values('user_id').annotate(value=aggregate)
+    return Subquery(archived.values('value'), output_field=output_field)
+
+
+def annotate_record_stats(queryset):
+    """Annotates the users of `queryset` with their number of records by
+    level, as `records_<level>`, and the date of their last error, all in
+    the same grouped query. The cold tier is counted in by correlated
+    subqueries, so the archived records moved out still count.
+    """
+    annotations = {
+        'records_' + level: Count(
+            'record', filter=Q(record__level=level)
+        ) + Coalesce(
+            archived_stat(level, Count('id'), models.IntegerField()), 0
+        )
+        for level, _ in Record.REC_CHOICES
+    }
+    hot = Max('record__date', filter=Q(record__level='error'))
+    cold = archived_stat('error', Max('date'), models.DateTimeField())
+    # Greatest is NULL on SQLite when any side is, so each side falls back
+    # on the other.
+    annotations['last_error_date'] = Greatest(
+        Coalesce(hot, cold), Coalesce(cold, hot)
+    )
+    return queryset.annotate(**annotations)
+
+
+class RecordModelSerializer(TimedSerializerMixin, ModelSerializer):
     """Record serializer.
     """
     class Meta:
         model = Record
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'environment',
@@ -37,3 +139,195 @@ class RecordModelSerializer(ModelSerializer):
             'events',
             'user_id',
         ]
+
+
+def datetime_converter():
+    """Function giving the representation of a datetime as the DRF
+    DateTimeField does, resolving the output format and time zone once.
+    """
+    field = DateTimeField()
+    output_format = api_settings.DATETIME_FORMAT
+    if not settings.USE_TZ or output_format is None \
+            or output_format.lower() != 'iso-8601':
+        return field.to_representation
+
+    current_timezone = timezone.get_current_timezone()
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(current_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+class RecordFastSerializer:
+    """Read only serializer giving the same representation of the records
+    as RecordModelSerializer, built straight from `values_list()` rows.
+
+    The conversion of each field is resolved once, on creation, instead of
+    calling a serializer field per value. `extra_fields` are read along
+    with the serialized fields, for the pagination, without being
+    serialized.
+    """
+
+    def __init__(self, fields=None, extra_fields=()):
+        self.fields = list(fields or RecordModelSerializer.Meta.fields)
+        self.query_fields = self.fields + [
+            name for name in extra_fields if name not in self.fields
+        ]
+        self.converters = []
+        for index, name in enumerate(self.fields):
+            if isinstance(Record._meta.get_field(name), models.DateTimeField):
+                self.converters.append((index, datetime_converter()))
+        self.width = len(self.fields)
+
+    def get_queryset(self, queryset):
+        """Queryset of named rows with the serialized and extra fields.
+        """
+        return queryset.values_list(*self.query_fields, named=True)
+
+    def to_values(self, row):
+        values = list(row[:self.width])
+        for index, convert in self.converters:
+            if values[index] is not None:
+                values[index] = convert(values[index])
+        return values
+
+    def to_representation(self, row):
+        return dict(zip(self.fields, self.to_values(row)))
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+    def serialize_compact(self, rows):
+        """Rows as lists of values, in the order of `fields`.
+        """
+        return [self.to_values(row) for row in rows]
+
+
+class BatchUserRelatedField(PrimaryKeyRelatedField):
+    """User primary key field that resolves the users from the `users`
+    dict found in the serializer context, filled once for a whole batch.
+    """
+    def to_internal_value(self, data):
+        users = self.context.get('users')
+        if users is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        if pk not in users:
+            self.fail('does_not_exist', pk_value=data)
+        return users[pk]
+
+
+class RecordBulkSerializer(RecordModelSerializer):
+    """Record serializer used to validate the items of a bulk request.
+    """
+    user_id = BatchUserRelatedField(queryset=User.objects.all())
+
+
+class RecordStatsQuerySerializer(Serializer):
+    """Query parameters of the records statistics.
+    """
+    GROUP_FIELDS = ['level', 'environment', 'origin']
+
+    bucket = ChoiceField(choices=RecordRollup.BUCKET_CHOICES, default='hour')
+    group_by = CharField(required=False)
+    since = DateTimeField(required=False)
+    until = DateTimeField(required=False)
+    environment = CharField(required=False, max_length=30)
+    level = ChoiceField(choices=Record.REC_CHOICES, required=False)
+    origin = IPAddressField(protocol='IPv4', required=False)
+
+    def validate_bucket(self, value):
+        if value not in settings.RECORDS_ROLLUP_BUCKETS:
+            raise ValidationError(
+                'Statistics by {} are not available.'.format(value)
+            )
+        return value
+
+    def validate_group_by(self, value):
+        fields = [field.strip() for field in value.split(',')]
+        fields = [field for field in fields if field]
+        invalid = [field for field in fields if field not in self.GROUP_FIELDS]
+        if invalid:
+            raise ValidationError(
+                'Invalid fields: {}.'.format(', '.join(invalid))
+            )
+        return fields
+
+
+class UserListQuerySerializer(Serializer):
+    """Query parameters of the users list.
+    """
+    INCLUDES = ['record_stats']
+
+    include = CharField(required=False)
+
+    def validate_include(self, value):
+        includes = [include.strip() for include in value.split(',')]
+        includes = [include for include in includes if include]
+        invalid = [
+            include for include in includes if include not in self.INCLUDES
+        ]
+        if invalid:
+            raise ValidationError(
+                'Invalid includes: {}.'.format(', '.join(invalid))
+            )
+        return includes
+
+
+class RecordListQuerySerializer(Serializer):
+    """Query parameters of the records list representation.
+    """
+    fields = CharField(required=False)
+    compact = BooleanField(required=False, default=False)
+
+    def validate_fields(self, value):
+        fields = [field.strip() for field in value.split(',')]
+        fields = [field for field in fields if field]
+        allowed = RecordModelSerializer.Meta.fields
+        invalid = [field for field in fields if field not in allowed]
+        if invalid:
+            raise ValidationError(
+                'Invalid fields: {}.'.format(', '.join(invalid))
+            )
+        # Repeated fields are serialized once.
+        return list(OrderedDict.fromkeys(fields))
+
+
+class RecordTailQuerySerializer(Serializer):
+    """Filters of the records live tail.
+    """
+    environment = CharField(required=False, max_length=30)
+    level = ChoiceField(choices=Record.REC_CHOICES, required=False)
+    origin = IPAddressField(protocol='IPv4', required=False)
+
+
+class RecordBulkJobSerializer(ModelSerializer):
+    """Bulk job serializer.
+    """
+    class Meta:
+        model = RecordBulkJob
+        fields = [
+            'id',
+            'action',
+            'params',
+            'status',
+            'total',
+            'processed',
+            'error',
+            'created',
+            'updated',
+            'user_id',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,107 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .caching import bump_generation, invalidate_responses
+from .db import apply_pragmas, check_connections
+from .fields import clear_interned_values
+from .models import ArchivedRecord, Record
+from .rollups import remove_from_rollups
+from .search import clear_fulltext_tables
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Drops a rotated or deleted token from the token cache.
+    """
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, created=False, **kwargs):
+    """Drops the cached tokens of a changed or deleted user, so changes
+    like the deactivation apply right away.
+    """
+    if created:
+        return
+
+    keys = Token.objects.filter(user_id=instance.pk).values_list(
+        'key', flat=True
+    )
+    for key in keys:
+        token_cache.invalidate(key)
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Record)
+@receiver(post_delete, sender=User)
+def invalidate_records_responses(sender, **kwargs):
+    """Drops the cached records responses when a record is saved or the
+    records of a user are deleted along with it.
+
+    There's no receiver for deleted records, it would prevent the fast
+    deletes, so deletes and bulk writes invalidate them on their own.
+    """
+    bump_generation()
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_records_from_rollups(sender, instance, **kwargs):
+    """Takes the records of a user, hot and cold, off the rollups before
+    they are deleted along with it.
+    """
+    remove_from_rollups(Record.objects.filter(user_id=instance.pk))
+    remove_from_rollups(ArchivedRecord.objects.filter(user_id=instance.pk))
+
+
+@receiver(post_migrate)
+def clear_interned(sender, **kwargs):
+    """Empties the cache of the interned values, the lookup tables may
+    have been emptied, like when flushing the database.
+    """
+    clear_interned_values()
+
+
+@receiver(post_migrate)
+def clear_fulltext(sender, **kwargs):
+    """Forgets whether the full text index exists, the migrations may
+    have created or removed it.
+    """
+    clear_fulltext_tables()
+
+
+@receiver(post_migrate)
+def invalidate_migrated_responses(sender, **kwargs):
+    """Drops the cached records responses, the records may have been
+    emptied or changed too. The responses cache outlives the database
+    of the test runs.
+    """
+    invalidate_responses()
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Tunes each new database connection.
+    """
+    # The statement timeout of the new session is the default one.
+    connection.statement_timeout = None
+    connection.health_checked = time.monotonic()
+    apply_pragmas(connection)
+
+
+@receiver(request_started)
+def check_database_connections(sender, **kwargs):
+    """Replaces the persistent connections closed by the server before
+    the request uses them.
+    """
+    check_connections()
@@ -0,0 +1,137 @@
+"""Durable queue of validated records waiting to be stored.
+
+With the write-behind mode on, the records views only append the
+validated records to the spool, a local sqlite database in WAL mode, and
+the `drain_spool` command stores them in large transactions. The spool
+is local to the host, so the worker must run next to the web workers.
+
+Records are stored at least once: a worker stopped between storing a
+batch and removing it from the spool stores the batch again on restart.
+"""
+import json
+import logging
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.dateparse import parse_datetime
+
+from .models import Record
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def encode_record(data):
+    """JSON payload of the validated record data.
+    """
+    return json.dumps({
+        'environment': data['environment'],
+        'level': data['level'],
+        'message': data['message'],
+        'origin': data['origin'],
+        'date': data['date'].isoformat(),
+        'is_archived': data['is_archived'],
+        'events': data['events'],
+        'user_id': data['user_id'].pk,
+    })
+
+
+def decode_record(payload):
+    """Unsaved Record from a spool payload.
+    """
+    data = json.loads(payload)
+    data['date'] = parse_datetime(data['date'])
+    data['user_id_id'] = data.pop('user_id')
+    return Record(**data)
+
+
+class RecordSpool:
+    """Append only queue of records on a sqlite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def connection(self):
+        connections = getattr(_local, 'connections', None)
+        if connections is None:
+            connections = _local.connections = {}
+
+        conn = connections.get(self.path)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS spool ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'payload TEXT NOT NULL)'
+            )
+            connections[self.path] = conn
+        return conn
+
+    def put(self, items):
+        """Appends the validated record data of `items` to the spool.
+        """
+        conn = self.connection
+        with conn:
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT INTO spool (payload) VALUES (?)',
+                ((encode_record(item),) for item in items)
+            )
+
+    def size(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM spool'
+        ).fetchone()[0]
+
+    def drain(self, handler, limit):
+        """Gives up to `limit` of the oldest records to `handler` and
+        removes them from the spool once it returns. Returns the number of
+        records handled.
+
+        Only one worker may drain a spool at a time.
+        """
+        conn = self.connection
+        rows = conn.execute(
+            'SELECT id, payload FROM spool ORDER BY id LIMIT ?', (limit,)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        handler([decode_record(payload) for _, payload in rows])
+        with conn:
+            conn.execute('BEGIN')
+            conn.execute('DELETE FROM spool WHERE id <= ?', (rows[-1][0],))
+        return len(rows)
+
+
+def get_spool():
+    return RecordSpool(settings.RECORDS_SPOOL_PATH)
+
+
+def store_spooled(records):
+    """Stores the records drained from the spool, dropping the ones whose
+    user was deleted in the meantime.
+    """
+    from .ingest import bulk_ingest
+
+    user_ids = {record.user_id_id for record in records}
+    existing = set(
+        User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+    )
+    if existing != user_ids:
+        kept = [record for record in records if record.user_id_id in existing]
+        logger.warning(
+            'Dropped %d spooled records of deleted users.',
+            len(records) - len(kept)
+        )
+        records = kept
+    return bulk_ingest(records)
@@ -0,0 +1,365 @@
+"""Syslog ingestion, RFC 5424 and RFC 3164, over UDP and TCP.
+
+The listener runs on asyncio and only parses the messages, the records
+are stored with `bulk_ingest` by a single thread in batches, every
+`batch_size` messages or `flush_interval` seconds, whatever comes first.
+"""
+import asyncio
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from ipaddress import IPv4Address, ip_address
+
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ingest import bulk_ingest
+from .models import Record
+
+logger = logging.getLogger(__name__)
+
+# Syslog severities, from emergency (0) to debug (7).
+SEVERITY_LEVELS = [
+    'critical',
+    'critical',
+    'critical',
+    'error',
+    'warning',
+    'info',
+    'info',
+    'debug',
+]
+
+# user.notice, the priority of the messages without one.
+DEFAULT_PRIORITY = 13
+
+# Longest octet counted TCP frame accepted, longer ones are skipped. New
+# line framed messages are limited to the 64 KiB of the stream buffer.
+MAX_FRAME_BYTES = 64 * 1024
+
+PRIORITY_RE = re.compile(r'^<(\d{1,3})>')
+RFC5424_RE = re.compile(
+    r'^(\d{1,2}) (\S+) (\S+) (\S+) (\S+) (\S+) (.*)$', re.DOTALL
+)
+RFC3164_RE = re.compile(
+    r'^([A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d) (?:(\S+) )?(.*)$', re.DOTALL
+)
+TAG_RE = re.compile(r'^([^\s\[\]:]{1,48})(?:\[[^\]]*\])?: ?(.*)$', re.DOTALL)
+
+NIL = '-'
+
+
+def max_length(name):
+    return Record._meta.get_field(name).max_length
+
+
+def _nil(value):
+    return None if value == NIL else value
+
+
+def _skip_structured_data(text):
+    """`text` after the STRUCTURED-DATA of a RFC 5424 message.
+    """
+    if text.startswith(NIL):
+        return text[2:]
+    index = 0
+    while index < len(text) and text[index] == '[':
+        index += 1
+        while index < len(text) and text[index] != ']':
+            # Escaped characters inside PARAM-VALUE.
+            index += 2 if text[index] == '\\' else 1
+        index += 1
+    return text[index + 1:]
+
+
+def _rfc3164_date(value, now):
+    try:
+        date = datetime.strptime(
+            '{} {}'.format(now.year, value.replace('  ', ' ')),
+            '%Y %b %d %H:%M:%S'
+        )
+    except ValueError:
+        return None
+    date = timezone.make_aware(date)
+    # The timestamp doesn't have the year, it may be from the last one.
+    if date > now + timedelta(days=1):
+        date = date.replace(year=date.year - 1)
+    return date
+
+
+def parse_message(text, now=None):
+    """Parses a RFC 5424 or RFC 3164 syslog message.
+
+    Returns a dict with severity, date, hostname, app_name and message,
+    the ones not in the message being None.
+    """
+    now = now or timezone.now()
+    text = text.rstrip('\r\n\x00')
+
+    priority = DEFAULT_PRIORITY
+    match = PRIORITY_RE.match(text)
+    if match is not None:
+        priority = min(int(match.group(1)), 191)
+        text = text[match.end():]
+
+    parsed = {
+        'severity': priority % 8,
+        'date': None,
+        'hostname': None,
+        'app_name': None,
+        'message': text,
+    }
+
+    match = RFC5424_RE.match(text)
+    if match is not None:
+        _, date, hostname, app_name, _, _, rest = match.groups()
+        if date != NIL:
+            try:
+                date = parse_datetime(date)
+            except ValueError:
+                # Well formed but invalid, like February 30th.
+                date = None
+            if date is not None and timezone.is_aware(date):
+                parsed['date'] = date
+        parsed['hostname'] = _nil(hostname)
+        parsed['app_name'] = _nil(app_name)
+        parsed['message'] = _skip_structured_data(rest).lstrip('\ufeff')
+        return parsed
+
+    match = RFC3164_RE.match(text)
+    if match is not None:
+        date, hostname, rest = match.groups()
+        parsed['date'] = _rfc3164_date(date, now)
+        parsed['hostname'] = hostname
+        parsed['message'] = rest
+        tag = TAG_RE.match(rest)
+        if tag is not None:
+            parsed['app_name'], parsed['message'] = tag.groups()
+    return parsed
+
+
+def source_ipv4(host):
+    """IPv4 address of the sender, also the IPv4 mapped on IPv6, or None.
+    """
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return None
+    if isinstance(address, IPv4Address):
+        return str(address)
+    if address.ipv4_mapped is not None:
+        return str(address.ipv4_mapped)
+    return None
+
+
+def to_record(parsed, origin, user, environment_from='hostname'):
+    """Unsaved record of a parsed message, with the values truncated to
+    the model limits.
+    """
+    if environment_from == 'app-name':
+        environment = parsed['app_name'] or parsed['hostname']
+    else:
+        environment = parsed['hostname'] or parsed['app_name']
+
+    return Record(
+        environment=(environment or 'syslog')[:max_length('environment')],
+        level=SEVERITY_LEVELS[parsed['severity']],
+        message=parsed['message'][:max_length('message')],
+        origin=origin,
+        date=parsed['date'] or timezone.now(),
+        is_archived=False,
+        events=1,
+        user_id=user,
+    )
+
+
+class RecordBatcher:
+    """Collects the records of the received messages and stores them in
+    batches on a single thread, keeping the event loop free.
+
+    A batch failing to be stored is tried again `retries` times, waiting
+    `retry_delay` seconds, doubled each time, in between. At most
+    `max_pending` batches wait for the database: past that the TCP
+    senders are paused and the UDP messages are shed.
+    """
+
+    def __init__(self, user, batch_size, flush_interval,
+                 environment_from='hostname', max_pending=10, retries=3,
+                 retry_delay=1.0):
+        self.user = user
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.environment_from = environment_from
+        self.max_pending = max_pending
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.records = []
+        self.stored = 0
+        self.dropped = 0
+        self.shed = 0
+        self.failed = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = set()
+
+    def full(self):
+        """Whether the current batch is complete and can't be handed to
+        the database yet.
+        """
+        return len(self.records) >= self.batch_size \
+            and len(self.pending) >= self.max_pending
+
+    def add(self, data, host):
+        origin = source_ipv4(host)
+        if origin is None:
+            self.dropped += 1
+            logger.warning('Dropped message from non IPv4 sender %s.', host)
+            return
+        if self.full():
+            if not self.shed:
+                logger.warning('Shedding syslog messages, the database is '
+                               'behind.')
+            self.shed += 1
+            return
+        text = data.decode('utf-8', errors='replace')
+        self.records.append(to_record(
+            parse_message(text), origin, self.user, self.environment_from
+        ))
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    async def wait_ready(self):
+        """Waits until a message can be added without being shed, the TCP
+        senders aren't read meanwhile.
+        """
+        while self.full():
+            await asyncio.wait(
+                set(self.pending), return_when=asyncio.FIRST_COMPLETED
+            )
+            self.flush()
+
+    def flush(self):
+        """Hands the collected records to the database thread, unless
+        `max_pending` batches already wait for it.
+        """
+        if not self.records or len(self.pending) >= self.max_pending:
+            return
+        records, self.records = self.records, []
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self.executor, self._store, records)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+
+    def _store(self, records):
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            close_old_connections()
+            try:
+                created, merged = bulk_ingest(records)
+            except Exception as exc:
+                if attempt < self.retries:
+                    logger.warning(
+                        'Failed to store %d syslog records, retrying in '
+                        '%s seconds: %s', len(records), delay, exc
+                    )
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                self.failed += len(records)
+                logger.exception(
+                    'Failed to store %d syslog records.', len(records)
+                )
+                return
+            self.stored += len(created) + merged
+            return
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def close(self):
+        while True:
+            self.flush()
+            if not self.pending:
+                break
+            await asyncio.wait(set(self.pending))
+        self.executor.shutdown()
+
+
+class SyslogUDPProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    def datagram_received(self, data, addr):
+        self.batcher.add(data, addr[0])
+
+
+async def read_frames(reader):
+    """Yields the messages of a TCP stream, framed by octet counting or
+    by new lines (RFC 6587). Frames longer than MAX_FRAME_BYTES are
+    skipped without buffering them.
+    """
+    while True:
+        first = await reader.read(1)
+        if not first:
+            return
+        if first.isdigit():
+            prefix = first + await reader.readuntil(b' ')
+            length = int(prefix[:-1])
+            if length <= MAX_FRAME_BYTES:
+                yield await reader.readexactly(length)
+                continue
+            logger.warning('Skipped a syslog frame of %s bytes.', length)
+            while length:
+                skipped = await reader.read(min(length, MAX_FRAME_BYTES))
+                if not skipped:
+                    return
+                length -= len(skipped)
+        else:
+            line = first + await reader.readline()
+            if line.strip():
+                yield line
+
+
+def tcp_handler(batcher):
+    async def handle(reader, writer):
+        host = writer.get_extra_info('peername')[0]
+        try:
+            async for frame in read_frames(reader):
+                await batcher.wait_ready()
+                batcher.add(frame, host)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(batcher, host, udp_port=None, tcp_port=None):
+    """Runs the UDP and TCP listeners until cancelled.
+    """
+    loop = asyncio.get_event_loop()
+    transport = server = None
+    if udp_port is not None:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: SyslogUDPProtocol(batcher), local_addr=(host, udp_port)
+        )
+    if tcp_port is not None:
+        server = await asyncio.start_server(
+            tcp_handler(batcher), host, tcp_port
+        )
+
+    try:
+        await batcher.run_flusher()
+    finally:
+        if transport is not None:
+            transport.close()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        await batcher.close()
@@ -0,0 +1,290 @@
+"""Live tail of the ingested records over Server-Sent Events.
+
+The ingestion publishes the stored records and each viewer of the tail
+subscribes to the broadcaster of its process, receiving the records
+matching its filters on a bounded queue. The RECORDS_TAIL_BACKEND
+setting picks how the records reach the broadcasters:
+
+* 'local': straight from the ingestion of the same process, once the
+  transaction commits. Fits a single process, records stored by other
+  processes, like the spool worker, aren't seen.
+* 'postgres': through NOTIFY, sent along with the ingestion transaction,
+  and a thread of each process LISTENing on a dedicated connection, so
+  every viewer sees the records stored by any process.
+
+New records are sent as `record` events, with their id to resume from.
+Records a duplicate was merged into are sent again, with their new
+events count and date, as `merge` events without an id: it would move
+the resuming point back. A reconnecting viewer only gets the new records
+it missed.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .metrics import TAIL_DROPPED
+from .models import Record
+from .serializers import RecordFastSerializer
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'records_tail'
+FILTER_FIELDS = ['environment', 'level', 'origin']
+
+# NOTIFY payloads are limited to 8000 bytes.
+NOTIFY_MAX_BYTES = 7900
+
+
+class Subscription:
+    """Records matching `filters` waiting to be sent to a viewer. Records
+    are dropped, and counted, when the viewer doesn't keep up.
+    """
+
+    def __init__(self, filters, maxsize):
+        self.filters = filters
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def matches(self, record):
+        return all(
+            record[name] == value for name, value in self.filters.items()
+        )
+
+    def put(self, event, record):
+        try:
+            self.queue.put_nowait((event, record))
+        except queue.Full:
+            self.dropped += 1
+            TAIL_DROPPED.inc()
+
+
+class Broadcaster:
+    """Fan-out of the published records to the subscriptions of the
+    process.
+    """
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def subscribe(self, filters):
+        """New subscription to the records matching `filters`, or None
+        when the process already has RECORDS_TAIL_MAX_SUBSCRIBERS.
+        """
+        if settings.RECORDS_TAIL_BACKEND == 'postgres':
+            self._start_listener()
+        subscription = Subscription(filters, settings.RECORDS_TAIL_QUEUE_SIZE)
+        limit = settings.RECORDS_TAIL_MAX_SUBSCRIBERS
+        with self.lock:
+            if limit is not None and len(self.subscriptions) >= limit:
+                return None
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+    def dispatch(self, records, event='record'):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for record in records:
+            for subscription in subscriptions:
+                if subscription.matches(record):
+                    subscription.put(event, record)
+
+    def _start_listener(self):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = PostgresListener(self)
+                self.listener.start()
+
+
+class PostgresListener(threading.Thread):
+    """Thread LISTENing on the tail channel, on its own connection, and
+    dispatching the notified records. Reconnects after errors.
+    """
+    daemon = True
+
+    def __init__(self, broadcaster):
+        super().__init__(name='records-tail-listener')
+        self.broadcaster = broadcaster
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                logger.exception('Records tail listener failed.')
+                time.sleep(settings.RECORDS_TAIL_HEARTBEAT)
+
+    def listen(self):
+        params = connection.get_connection_params()
+        conn = connection.get_new_connection(params)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN {}'.format(CHANNEL))
+            while True:
+                ready, _, _ = select.select(
+                    [conn], [], [], settings.RECORDS_TAIL_HEARTBEAT
+                )
+                if not ready:
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    message = json.loads(notify.payload)
+                    self.broadcaster.dispatch(
+                        message['records'], message['event']
+                    )
+        finally:
+            conn.close()
+
+
+broadcaster = Broadcaster()
+
+
+def serialize_records(records):
+    """Representation of the `records` instances given by the records
+    serializer.
+    """
+    serializer = RecordFastSerializer()
+    attnames = [
+        Record._meta.get_field(name).attname for name in serializer.fields
+    ]
+    return [
+        serializer.to_representation(
+            [getattr(record, attname) for attname in attnames]
+        )
+        for record in records
+    ]
+
+
+def notify(data, event='record'):
+    """Sends the serialized records of `event` with NOTIFY, packed in as
+    few payloads as possible.
+    """
+    template = '{{"event": {}, "records": [{{}}]}}'.format(json.dumps(event))
+    empty = len(template.format(''))
+    payloads, chunk, size = [], [], empty
+    for item in data:
+        encoded = json.dumps(item)
+        if chunk and size + len(encoded) + 1 > NOTIFY_MAX_BYTES:
+            payloads.append(template.format(','.join(chunk)))
+            chunk, size = [], empty
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        payloads.append(template.format(','.join(chunk)))
+
+    with connection.cursor() as cursor:
+        for payload in payloads:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+
+
+def publish(records, event='record'):
+    """Publishes the stored `records` to the live tail, as `record` events
+    for the created ones and `merge` events for the ones a duplicate was
+    merged into. Called inside the ingestion transaction, the records are
+    only seen once it commits.
+    """
+    backend = settings.RECORDS_TAIL_BACKEND
+    if not records or not backend:
+        return
+    if backend == 'postgres':
+        # Notifications are delivered on commit.
+        notify(serialize_records(records), event)
+    elif broadcaster.has_subscribers():
+        data = serialize_records(records)
+        transaction.on_commit(lambda: broadcaster.dispatch(data, event))
+
+
+def format_event(record, event='record'):
+    lines = []
+    if event == 'record' and record['id'] is not None:
+        lines.append('id: {}'.format(record['id']))
+    lines.append('event: {}'.format(event))
+    lines.append('data: {}'.format(json.dumps(record)))
+    return '\n'.join(lines) + '\n\n'
+
+
+def replay(filters, last_event_id):
+    """Records stored after the one with `last_event_id`, missed by a
+    reconnecting viewer, up to a page of the records list.
+    """
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        return []
+    serializer = RecordFastSerializer()
+    queryset = Record.objects.filter(id__gt=last_id, **filters)
+    rows = serializer.get_queryset(queryset.order_by('id'))
+    return serializer.serialize(rows[:settings.RECORDS_PAGE_SIZE])
+
+
+def events(subscription, last_event_id=None):
+    """Yields the Server-Sent Events of the records of `subscription`,
+    with a comment every RECORDS_TAIL_HEARTBEAT seconds without records
+    to keep the connection open.
+    """
+    yield 'retry: {}\n\n'.format(settings.RECORDS_TAIL_RETRY)
+
+    last_id = None
+    if last_event_id is not None:
+        for record in replay(subscription.filters, last_event_id):
+            last_id = record['id']
+            yield format_event(record)
+
+    while True:
+        try:
+            event, record = subscription.queue.get(
+                timeout=settings.RECORDS_TAIL_HEARTBEAT
+            )
+        except queue.Empty:
+            yield ': keepalive\n\n'
+            continue
+        # Already sent by the replay.
+        if event == 'record' and last_id is not None \
+                and record['id'] is not None and record['id'] <= last_id:
+            continue
+        yield format_event(record, event)
+
+
+class EventStream:
+    """Events of a subscription, given to the streaming response. The
+    subscription ends when the response is closed, even if it was never
+    iterated.
+    """
+
+    def __init__(self, subscription, last_event_id=None):
+        self.subscription = subscription
+        self.events = events(subscription, last_event_id)
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        broadcaster.unsubscribe(self.subscription)
+
+
+def event_stream(filters, last_event_id=None):
+    """Stream of the events of the records matching `filters`, or None
+    when the process already has RECORDS_TAIL_MAX_SUBSCRIBERS viewers.
+    Each viewer holds a worker thread while connected.
+    """
+    subscription = broadcaster.subscribe(filters)
+    if subscription is None:
+        return None
+    return EventStream(subscription, last_event_id)
@@ -1,13 +1,72 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.test import TestCase
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from model_bakery import baker
+import msgpack
+from model_bakery import baker, random_gen
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from .models import Record
+from . import db, metrics, partitions, syslog
+from .authentication import token_cache
+from .caching import GENERATION_KEY, invalidate_responses
+from .fields import clear_interned_values, interned_values
+from .ingest import bulk_ingest
+from .models import (
+    ArchivedRecord,
+    Record,
+    RecordBulkJob,
+    RecordEnvironment,
+    RecordRollup,
+)
+from .search import fulltext_enabled
+from .serializers import RecordFastSerializer, RecordModelSerializer
+from .spool import get_spool
+
+baker.generators.add('api.fields.InternedCharField', random_gen.gen_string)
+
+
+class RecordDataMixin:
+    """Builds the data of a record posted by `self.user`.
+    """
+
+    def record_data(self, **kwargs):
+        data = {
+            'environment': 'Production',
+            'level': 'error',
+            'message': 'some error message',
+            'origin': '192.168.0.111',
+            'is_archived': False,
+            'date': '2020-04-01T11:54:37Z',
+            'events': 1,
+            'user_id': self.user.id
+        }
+        data.update(kwargs)
+        return data
 
 
 class TestRecord(TestCase):
@@ -28,6 +87,21 @@ class TestRecord(TestCase):
             rec.level = 'invalid_one'
             rec.full_clean()
 
+    def test_record_fingerprint(self):
+        rec = baker.make('api.Record', message='first')
+        other = baker.make(
+            'api.Record',
+            environment=rec.environment,
+            level=rec.level,
+            origin=rec.origin,
+            message=rec.message
+        )
+        self.assertEqual(rec.fingerprint, other.fingerprint)
+
+        rec.message = 'second'
+        rec.save()
+        self.assertNotEqual(rec.fingerprint, other.fingerprint)
+
     def test_record_invalid_oring(self):
         with self.assertRaises(ValidationError):
             rec = baker.make('api.Record')
@@ -35,6 +109,125 @@ class TestRecord(TestCase):
             rec.full_clean()
 
 
+class TestRecordEncoding(TestCase):
+
+    def setUp(self):
+        self.user = baker.make(User)
+        self.record = baker.make(
+            'api.Record', environment='production', level='warning',
+            user_id=self.user
+        )
+
+    def test_record_stored_as_codes(self):
+        """Ensure that the level is stored as its code and the environment
+        as the id of its interned row, read back as strings.
+        """
+        environment = RecordEnvironment.objects.get(name='production')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT environment, level FROM api_record WHERE id = %s',
+                [self.record.id]
+            )
+            self.assertEqual(
+                cursor.fetchone(),
+                (environment.id, Record.LEVEL_CODES['warning'])
+            )
+
+        record = Record.objects.get(id=self.record.id)
+        self.assertEqual(record.environment, 'production')
+        self.assertEqual(record.level, 'warning')
+        self.assertEqual(
+            list(Record.objects.values_list('environment', 'level')),
+            [('production', 'warning')]
+        )
+
+    def test_environment_interned_once(self):
+        baker.make('api.Record', environment='production', user_id=self.user)
+        self.assertEqual(
+            RecordEnvironment.objects.filter(name='production').count(), 1
+        )
+
+    def test_record_lookups(self):
+        self.assertEqual(
+            Record.objects.filter(
+                environment='production', level='warning'
+            ).count(),
+            1
+        )
+        self.assertEqual(
+            Record.objects.filter(environment__in=['production']).count(), 1
+        )
+        self.assertFalse(Record.objects.filter(environment='unknown'))
+        self.assertFalse(
+            RecordEnvironment.objects.filter(name='unknown').exists()
+        )
+        self.assertTrue(Record.objects.exclude(environment='unknown'))
+
+    def test_record_invalid_level_not_saved(self):
+        with self.assertRaises(ValueError):
+            baker.make('api.Record', level='invalid_one')
+
+    def test_interned_rolled_back_not_cached(self):
+        """Ensure that an environment interned by a rolled back transaction
+        isn't cached, its row is gone.
+        """
+        cache = interned_values('api.RecordEnvironment')
+        try:
+            with transaction.atomic():
+                baker.make('api.Record', environment='gone', user_id=self.user)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertNotIn('gone', cache.ids)
+        self.assertFalse(RecordEnvironment.objects.filter(name='gone'))
+        baker.make('api.Record', environment='gone', user_id=self.user)
+        self.assertEqual(
+            Record.objects.filter(environment='gone').count(), 1
+        )
+
+    def test_interned_read_cached_in_transaction(self):
+        """Ensure that the rows read inside a transaction are cached right
+        away, so moving records doesn't read the lookup table per row.
+        """
+        # Not created through the cache, like a row of another transaction.
+        RecordEnvironment.objects.create(name='qa')
+        baker.make(
+            'api.Record', environment='qa', is_archived=True,
+            user_id=self.user, _quantity=20
+        )
+        clear_interned_values()
+        self.addCleanup(clear_interned_values)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('move_archived', stdout=StringIO())
+
+        self.assertFalse(Record.objects.filter(is_archived=True))
+        lookups = [
+            query for query in queries
+            if 'api_recordenvironment' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_interned_created_pending(self):
+        """Ensure that a row created inside a transaction is reused by it
+        without queries, and only cached once the transaction commits.
+        """
+        cache = interned_values('api.RecordEnvironment')
+        pk = cache.get_id('staging', create=True)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_id('staging', create=True), pk)
+            self.assertEqual(cache.get_name(pk), 'staging')
+        self.assertNotIn('staging', cache.ids)
+
+        # The test runs in a transaction that never commits.
+        self.addCleanup(clear_interned_values)
+        for _, hook in connection.run_on_commit:
+            hook()
+        self.assertEqual(cache.ids['staging'], pk)
+
+
 class TestAuthTokenAPI(TestCase):
 
     def setUp(self):
@@ -92,7 +285,117 @@ class TestUsersAPI(TestCase):
         resp = client.get('/api/users/')
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), len(self.users))
+        self.assertEqual(len(resp.data['results']), len(self.users))
+
+    def test_users_get_paginated(self):
+        """Ensure that the users list is paginated by id, following the
+        cursor links.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        resp = client.get('/api/users/', {'page_size': 1})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertIsNone(resp.data['previous'])
+
+        resp = client.get(resp.data['next'])
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertIsNone(resp.data['next'])
+
+        usernames = list(User.objects.order_by('id').values_list(
+            'username', flat=True
+        ))
+        self.assertEqual(resp.data['results'][0]['username'], usernames[1])
+
+    def test_users_get_record_stats(self):
+        """Ensure that with 'include=record_stats' each user has the
+        number of its records by level and the date of its last error,
+        counted in the same query as the users.
+        """
+        john, beth = User.objects.order_by('id')
+        last_error = timezone.now() - timedelta(hours=1)
+        baker.make(
+            'api.Record', user_id=john, level='error', date=last_error
+        )
+        baker.make(
+            'api.Record', user_id=john, level='error',
+            date=last_error - timedelta(days=1)
+        )
+        baker.make('api.Record', user_id=john, level='info', _quantity=3)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        client.get('/api/users/')
+        with CaptureQueriesContext(connection) as queries:
+            resp = client.get('/api/users/', {'include': 'record_stats'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        stats = {
+            user['username']: user['record_stats']
+            for user in resp.data['results']
+        }
+        self.assertEqual(stats['john']['error'], 2)
+        self.assertEqual(stats['john']['info'], 3)
+        self.assertEqual(stats['john']['critical'], 0)
+        self.assertEqual(
+            parse_datetime(stats['john']['last_error_date']), last_error
+        )
+        self.assertEqual(stats['beth']['error'], 0)
+        self.assertIsNone(stats['beth']['last_error_date'])
+
+    def test_users_get_record_stats_archived(self):
+        """Ensure that the record stats count the archived records moved
+        to the cold tier.
+        """
+        john, beth = User.objects.order_by('id')
+        last_error = timezone.now() - timedelta(days=2)
+        baker.make(
+            'api.Record', user_id=john, level='error', date=last_error,
+            is_archived=True
+        )
+        baker.make(
+            'api.Record', user_id=john, level='error',
+            date=last_error - timedelta(days=1), is_archived=False
+        )
+        baker.make(
+            'api.Record', user_id=beth, level='error', date=last_error,
+            is_archived=True
+        )
+        baker.make(
+            'api.Record', user_id=beth, level='info', is_archived=False
+        )
+        call_command('move_archived', '--min-age', '0', stdout=StringIO())
+        self.assertEqual(ArchivedRecord.objects.count(), 2)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        resp = client.get('/api/users/', {'include': 'record_stats'})
+
+        stats = {
+            user['username']: user['record_stats']
+            for user in resp.data['results']
+        }
+        self.assertEqual(stats['john']['error'], 2)
+        self.assertEqual(
+            parse_datetime(stats['john']['last_error_date']), last_error
+        )
+        self.assertEqual(stats['beth']['error'], 1)
+        self.assertEqual(stats['beth']['info'], 1)
+        self.assertEqual(
+            parse_datetime(stats['beth']['last_error_date']), last_error
+        )
+
+    def test_users_get_invalid_include(self):
+        """Ensure that an unknown include returns a bad request status
+        code.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        resp = client.get('/api/users/', {'include': 'passwords'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_users_get_without_token(self):
         """Ensure that a get in '/api/users/' without a valid token will
@@ -291,7 +594,7 @@ class TestRecordAPI(TestCase):
         resp = client.get('/api/records/', format='json')
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(Record.objects.count(), len(resp.data))
+        self.assertEqual(Record.objects.count(), len(resp.data['results']))
 
     def test_records_get_without_token(self):
         """Ensure that a get in '/api/records/' without a token will
@@ -584,3 +887,2481 @@ class TestRecordAPI(TestCase):
         resp = client.delete('/api/records/1/', format='json')
 
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestRecordPaginationAPI(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # Pairs of records sharing the same date, to exercise the id
+        # tie breaker.
+        base = timezone.now()
+        for i in range(10):
+            baker.make(
+                Record,
+                date=base - timedelta(minutes=i // 2),
+                user_id=self.user
+            )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            resp = self.client.get(url, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            ids.extend(record['id'] for record in resp.data['results'])
+            url = resp.data['next']
+        return ids
+
+    def test_records_pages_newest_first(self):
+        """Ensure that following the next links returns every record once,
+        ordered by date and id, newest first.
+        """
+        ids = self.walk('/api/records/?page_size=3')
+        records = Record.objects.order_by('-date', '-id')
+        expected = list(records.values_list('id', flat=True))
+
+        self.assertEqual(ids, expected)
+
+    def test_records_first_page_links(self):
+        """Ensure that the first page has a next link and no previous
+        link, and respects the page size.
+        """
+        resp = self.client.get('/api/records/?page_size=4', format='json')
+
+        self.assertEqual(len(resp.data['results']), 4)
+        self.assertIsNotNone(resp.data['next'])
+        self.assertIsNone(resp.data['previous'])
+
+    def test_records_previous_page(self):
+        """Ensure that the previous link of the second page returns the
+        first page.
+        """
+        first = self.client.get('/api/records/?page_size=3', format='json')
+        second = self.client.get(first.data['next'], format='json')
+        back = self.client.get(second.data['previous'], format='json')
+
+        self.assertEqual(
+            [record['id'] for record in back.data['results']],
+            [record['id'] for record in first.data['results']]
+        )
+        self.assertIsNone(back.data['previous'])
+
+    def test_records_last_page(self):
+        """Ensure that the last page has no next link.
+        """
+        resp = self.client.get('/api/records/?page_size=10', format='json')
+
+        self.assertEqual(len(resp.data['results']), 10)
+        self.assertIsNone(resp.data['next'])
+
+    @override_settings(RECORDS_MAX_PAGE_SIZE=5)
+    def test_records_page_size_limit(self):
+        """Ensure that the page size is limited by the settings.
+        """
+        resp = self.client.get('/api/records/?page_size=100', format='json')
+
+        self.assertEqual(len(resp.data['results']), 5)
+
+    def test_records_invalid_cursor(self):
+        """Ensure that an invalid cursor returns a not found status code.
+        """
+        resp = self.client.get('/api/records/?cursor=invalid', format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_records_count(self):
+        """Ensure that every page has the exact count of the whole list
+        below the threshold.
+        """
+        caches['records'].clear()
+        first = self.client.get('/api/records/?page_size=3', format='json')
+        second = self.client.get(first.data['next'], format='json')
+
+        for resp in (first, second):
+            self.assertEqual(resp.data['count'], 10)
+            self.assertFalse(resp.data['count_is_approximate'])
+
+    @override_settings(RECORDS_COUNT_THRESHOLD=4)
+    def test_records_count_approximate(self):
+        """Ensure that above the threshold the counting stops, giving an
+        approximate count, at least the threshold, while filtered lists
+        below it are still counted exactly.
+        """
+        caches['records'].clear()
+        Record.objects.update(environment='Production')
+        Record.objects.filter(
+            pk__in=Record.objects.order_by('id')[:2].values('pk')
+        ).update(environment='Homologation')
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get('/api/records/?page_size=3')
+        self.assertGreater(resp.data['count'], 4)
+        self.assertTrue(resp.data['count_is_approximate'])
+        self.assertTrue(any(
+            'LIMIT 5' in query['sql'] and 'COUNT' in query['sql']
+            for query in queries
+        ))
+
+        resp = self.client.get('/api/records/?environment=Homologation')
+        self.assertEqual(resp.data['count'], 2)
+        self.assertFalse(resp.data['count_is_approximate'])
+
+    @override_settings(RECORDS_COUNT_THRESHOLD=None)
+    def test_records_count_exact(self):
+        """Ensure that without a threshold the records are always counted
+        exactly, in both tiers.
+        """
+        caches['records'].clear()
+        Record.objects.update(is_archived=True)
+        call_command('move_archived', stdout=StringIO())
+
+        resp = self.client.get('/api/records/')
+
+        self.assertEqual(resp.data['count'], 10)
+        self.assertFalse(resp.data['count_is_approximate'])
+
+
+class TestRecordFieldsAPI(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='joe', email='joe@email.com', password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        base = timezone.now()
+        for i in range(7):
+            baker.make(
+                Record, date=base - timedelta(hours=i), is_archived=False,
+                user_id=self.user
+            )
+
+    def test_records_fields(self):
+        """Ensure that 'fields' narrows the serialized fields and the
+        columns read from the database.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get('/api/records/?fields=level,message')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        record = Record.objects.order_by('-date').first()
+        self.assertEqual(
+            resp.data['results'][0],
+            {'level': record.level, 'message': record.message}
+        )
+        select = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'api_record' in
+            query['sql'] and '"message"' in query['sql']
+        )
+        self.assertNotIn('"origin"', select)
+        self.assertNotIn('"environment"', select)
+
+    def test_records_fields_pages(self):
+        """Ensure that the pages are followed without the date and id among
+        the fields.
+        """
+        url = '/api/records/?fields=message&page_size=3'
+        messages = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            messages.extend(
+                record['message'] for record in resp.data['results']
+            )
+            url = resp.data['next']
+
+        self.assertEqual(messages, list(
+            Record.objects.order_by('-date').values_list('message', flat=True)
+        ))
+
+    def test_records_compact(self):
+        """Ensure that 'compact' gives the records as lists of values in
+        the order of the fields.
+        """
+        resp = self.client.get(
+            '/api/records/?compact=true&fields=id,date,level&page_size=2'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['fields'], ['id', 'date', 'level'])
+        self.assertEqual(list(resp.data)[-1], 'results')
+        full = self.client.get('/api/records/?page_size=2').data['results']
+        self.assertEqual(resp.data['results'], [
+            [record['id'], record['date'], record['level']]
+            for record in full
+        ])
+        self.assertIsNotNone(resp.data['next'])
+
+    def test_records_compact_all_fields(self):
+        resp = self.client.get('/api/records/?compact=1')
+
+        self.assertEqual(
+            resp.data['fields'], RecordModelSerializer.Meta.fields
+        )
+        self.assertEqual(
+            len(resp.data['results'][0]), len(resp.data['fields'])
+        )
+
+    def test_records_invalid_fields(self):
+        resp = self.client.get('/api/records/?fields=level,password')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestRecordFilterAPI(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='joe', email='joe@email.com', password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        now = timezone.now()
+        self.records = {
+            'recent_error': baker.make(
+                Record, level='error', environment='Production',
+                origin='10.1.2.3', events=50, is_archived=False,
+                date=now - timedelta(minutes=5), user_id=self.user
+            ),
+            'recent_critical': baker.make(
+                Record, level='critical', environment='Testing',
+                origin='192.168.0.10', events=1, is_archived=False,
+                date=now - timedelta(minutes=10), user_id=self.user
+            ),
+            'old_info': baker.make(
+                Record, level='info', environment='Homologation',
+                origin='10.200.0.1', events=5, is_archived=True,
+                date=now - timedelta(days=2), user_id=self.user
+            ),
+            'old_error': baker.make(
+                Record, level='error', environment='Production',
+                origin='172.16.5.4', events=200, is_archived=True,
+                date=now - timedelta(days=3), user_id=self.user
+            ),
+        }
+
+    def get_names(self, params):
+        resp = self.client.get('/api/records/', params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        names = {record.id: name for name, record in self.records.items()}
+        return {names[record['id']] for record in resp.data['results']}
+
+    def test_origin_int_stored(self):
+        record = self.records['recent_error']
+        record.refresh_from_db()
+        self.assertEqual(record.origin_int, (10 << 24) + (1 << 16) + 515)
+
+        record.origin = '0.0.0.1'
+        record.save()
+        record.refresh_from_db()
+        self.assertEqual(record.origin_int, 1)
+
+    def test_filter_date_range(self):
+        now = timezone.now()
+        self.assertEqual(
+            self.get_names({'date__gte': now - timedelta(minutes=15)}),
+            {'recent_error', 'recent_critical'}
+        )
+        self.assertEqual(
+            self.get_names({
+                'date__gt': now - timedelta(days=4),
+                'date__lt': now - timedelta(days=1),
+            }),
+            {'old_info', 'old_error'}
+        )
+        self.assertEqual(
+            self.get_names({'date__lte': now - timedelta(days=3)}),
+            {'old_error'}
+        )
+
+    def test_filter_last(self):
+        self.assertEqual(
+            self.get_names({'last': 'PT7M'}), {'recent_error'}
+        )
+        self.assertEqual(
+            self.get_names({'last': '00:15:00'}),
+            {'recent_error', 'recent_critical'}
+        )
+
+    def test_filter_in_lists(self):
+        self.assertEqual(
+            self.get_names({'level__in': 'error,critical'}),
+            {'recent_error', 'recent_critical', 'old_error'}
+        )
+        self.assertEqual(
+            self.get_names({'environment__in': 'Testing,Homologation'}),
+            {'recent_critical', 'old_info'}
+        )
+        self.assertEqual(
+            self.get_names({'origin__in': '10.1.2.3,172.16.5.4'}),
+            {'recent_error', 'old_error'}
+        )
+
+    def test_filter_origin_cidr(self):
+        self.assertEqual(
+            self.get_names({'origin__cidr': '10.0.0.0/8'}),
+            {'recent_error', 'old_info'}
+        )
+        self.assertEqual(
+            self.get_names({'origin__cidr': '10.1.0.0/16,172.16.0.0/12'}),
+            {'recent_error', 'old_error'}
+        )
+        self.assertEqual(
+            self.get_names({'origin__cidr': '192.168.0.10/32'}),
+            {'recent_critical'}
+        )
+
+    def test_filter_events_thresholds(self):
+        self.assertEqual(
+            self.get_names({'events__gte': 50}), {'recent_error', 'old_error'}
+        )
+        self.assertEqual(
+            self.get_names({'events__gte': 5, 'events__lte': 50}),
+            {'recent_error', 'old_info'}
+        )
+
+    def test_filters_combined(self):
+        self.assertEqual(
+            self.get_names({
+                'level__in': 'error,info',
+                'origin__cidr': '10.0.0.0/8',
+                'events__lte': 10,
+            }),
+            {'old_info'}
+        )
+
+    def test_filters_on_cold_table(self):
+        """Ensure that the filters apply to the archived records moved to
+        the cold table as well.
+        """
+        call_command('move_archived', stdout=StringIO())
+        self.assertEqual(ArchivedRecord.objects.count(), 2)
+
+        self.assertEqual(
+            self.get_names({'origin__cidr': '10.0.0.0/8'}),
+            {'recent_error', 'old_info'}
+        )
+        self.assertEqual(
+            self.get_names({'level__in': 'error', 'events__gte': 100}),
+            {'old_error'}
+        )
+
+    def test_invalid_filters(self):
+        """Ensure that invalid filter values return a bad request status
+        code.
+        """
+        for params in [
+            {'origin__cidr': '10.0.0.0/33'},
+            {'origin__cidr': 'fe80::/10'},
+            {'level__in': 'error,invalid'},
+            {'date__gte': 'yesterday'},
+            {'events__gte': 'many'},
+            {'last': 'a while'},
+        ]:
+            resp = self.client.get('/api/records/', params)
+            self.assertEqual(
+                resp.status_code, status.HTTP_400_BAD_REQUEST, params
+            )
+
+
+class TestRecordBulkAPI(RecordDataMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+
+        client = APIClient()
+        data = {'username': 'mary', 'password': 'asdf1243'}
+        resp = client.post('/api/auth/token/', data, format='json')
+        self.token = resp.data['token']
+
+    def test_records_bulk_post(self):
+        """Ensure that a post in '/api/records/bulk/' with a valid token
+        and a list of records will create all of them.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        data = [self.record_data(message=f'message {i}') for i in range(5)]
+        resp = client.post('/api/records/bulk/', data, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['created'], 5)
+        self.assertEqual(resp.data['errors'], [])
+        self.assertEqual(Record.objects.count(), 5)
+
+    def test_records_bulk_post_ndjson(self):
+        """Ensure that a post in '/api/records/bulk/' accepts newline
+        delimited json.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        lines = [json.dumps(self.record_data()) for _ in range(3)]
+        resp = client.post(
+            '/api/records/bulk/',
+            '\n'.join(lines) + '\n',
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Record.objects.count(), 3)
+
+    def test_records_bulk_post_ndjson_invalid_encoding(self):
+        """Ensure that a newline delimited json body that isn't valid
+        UTF-8 returns a bad request status code.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        line = json.dumps(self.record_data()).encode()
+        resp = client.post(
+            '/api/records/bulk/',
+            line + b'\n\xff\xfe\n',
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('line 2', resp.data['detail'])
+        self.assertEqual(Record.objects.count(), 0)
+
+    def test_records_bulk_post_partial_errors(self):
+        """Ensure that invalid items are reported by their index and the
+        valid ones are still created.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        data = [
+            self.record_data(),
+            self.record_data(level='invalid'),
+            self.record_data(user_id=1000),
+            self.record_data(),
+        ]
+        resp = client.post('/api/records/bulk/', data, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['created'], 2)
+        self.assertEqual(
+            [error['index'] for error in resp.data['errors']], [1, 2]
+        )
+        self.assertIn('level', resp.data['errors'][0]['errors'])
+        self.assertIn('user_id', resp.data['errors'][1]['errors'])
+        self.assertEqual(Record.objects.count(), 2)
+
+    def test_records_bulk_post_all_invalid(self):
+        """Ensure that a batch without valid items returns a bad request
+        status code.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        data = [self.record_data(origin='a.b.c.d')]
+        resp = client.post('/api/records/bulk/', data, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Record.objects.count(), 0)
+
+    def test_records_bulk_post_not_a_list(self):
+        """Ensure that a post in '/api/records/bulk/' with a single object
+        returns a bad request status code.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        resp = client.post(
+            '/api/records/bulk/', self.record_data(), format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECORDS_BULK_MAX_ITEMS=2)
+    def test_records_bulk_post_too_many_items(self):
+        """Ensure that batches bigger than the configured limit are
+        rejected.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        data = [self.record_data() for _ in range(3)]
+        resp = client.post('/api/records/bulk/', data, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Record.objects.count(), 0)
+
+    def test_records_bulk_post_without_token(self):
+        """Ensure that a post in '/api/records/bulk/' without a token will
+        return an unauthorized status code.
+        """
+        client = APIClient()
+        resp = client.post(
+            '/api/records/bulk/', [self.record_data()], format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(RECORDS_DEDUP_WINDOW=60)
+class TestRecordDedupAPI(RecordDataMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_records_post_merges_duplicate(self):
+        """Ensure that a duplicate posted within the window is merged into
+        the existing record, adding its events and moving its date.
+        """
+        self.client.post('/api/records/', self.record_data(), format='json')
+        resp = self.client.post(
+            '/api/records/',
+            self.record_data(date='2020-04-01T11:55:07Z', events=3),
+            format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['events'], 4)
+        self.assertEqual(Record.objects.count(), 1)
+        record = Record.objects.get()
+        self.assertEqual(record.events, 4)
+        self.assertEqual(record.date.minute, 55)
+
+    def test_records_post_outside_window(self):
+        """Ensure that a duplicate posted after the window creates a new
+        record.
+        """
+        self.client.post('/api/records/', self.record_data(), format='json')
+        resp = self.client.post(
+            '/api/records/',
+            self.record_data(date='2020-04-01T11:56:37Z'),
+            format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Record.objects.count(), 2)
+
+    def test_records_post_different_fingerprint(self):
+        """Ensure that records of a different kind are not merged.
+        """
+        self.client.post('/api/records/', self.record_data(), format='json')
+        resp = self.client.post(
+            '/api/records/',
+            self.record_data(origin='192.168.0.112'),
+            format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Record.objects.count(), 2)
+
+    def test_records_bulk_post_merges_duplicates(self):
+        """Ensure that duplicates are merged inside a batch and into the
+        existing records.
+        """
+        self.client.post('/api/records/', self.record_data(), format='json')
+        data = [
+            self.record_data(date='2020-04-01T11:54:40Z'),
+            self.record_data(date='2020-04-01T11:54:50Z'),
+            self.record_data(level='info'),
+            self.record_data(level='info'),
+        ]
+        resp = self.client.post('/api/records/bulk/', data, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['created'], 1)
+        self.assertEqual(resp.data['merged'], 3)
+        self.assertEqual(
+            Record.objects.get(level='error').events, 3
+        )
+        self.assertEqual(Record.objects.get(level='info').events, 2)
+
+    @override_settings(RECORDS_DEDUP_WINDOW=0)
+    def test_records_post_dedup_disabled(self):
+        """Ensure that duplicates are kept when deduplication is disabled.
+        """
+        self.client.post('/api/records/', self.record_data(), format='json')
+        resp = self.client.post(
+            '/api/records/', self.record_data(), format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Record.objects.count(), 2)
+
+    def test_records_post_locks_before_merging(self):
+        """Ensure that the ingestion takes the write lock before looking
+        for the duplicate, so concurrent duplicates are not both created.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                '/api/records/', self.record_data(), format='json'
+            )
+
+        statements = [query['sql'] for query in queries]
+        lock = next(
+            i for i, sql in enumerate(statements) if sql.endswith('WHERE 0')
+        )
+        select = next(
+            i for i, sql in enumerate(statements) if 'fingerprint' in sql
+        )
+        self.assertLess(lock, select)
+
+
+class TestRecordSearchAPI(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.messages = [
+            'Database connection refused',
+            'Disk quota exceeded on /var',
+            'Connection timeout while reading',
+        ]
+        for message in self.messages:
+            baker.make(Record, message=message, user_id=self.user)
+
+    def search(self, terms):
+        resp = self.client.get('/api/records/', {'search': terms})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return sorted(record['message'] for record in resp.data['results'])
+
+    def test_records_search_uses_fulltext_index(self):
+        self.assertTrue(fulltext_enabled(Record))
+
+    def test_records_search_fulltext_lookup_cached(self):
+        """Ensure that the full text table is looked up once, not on every
+        search.
+        """
+        fulltext_enabled(Record)
+        with self.assertNumQueries(0):
+            self.assertTrue(fulltext_enabled(Record))
+
+    def test_records_search(self):
+        """Ensure that '?search=' returns the records with words starting
+        with every term, ignoring the case.
+        """
+        self.assertEqual(
+            self.search('connection'),
+            [self.messages[2], self.messages[0]]
+        )
+        self.assertEqual(self.search('conn refused'), [self.messages[0]])
+        self.assertEqual(self.search('quota'), [self.messages[1]])
+        self.assertEqual(self.search('missing'), [])
+
+    def test_records_search_follows_updates(self):
+        """Ensure that the index follows record updates and deletions.
+        """
+        record = Record.objects.get(message=self.messages[1])
+        record.message = 'Memory quota exceeded'
+        record.save()
+        Record.objects.filter(message=self.messages[0]).delete()
+
+        self.assertEqual(self.search('memory'), ['Memory quota exceeded'])
+        self.assertEqual(self.search('disk'), [])
+        self.assertEqual(self.search('refused'), [])
+
+    def test_records_search_bulk_created(self):
+        """Ensure that records created in bulk are indexed.
+        """
+        bulk_ingest([baker.prepare(
+            Record, message='Bulk created message', user_id=self.user
+        )])
+
+        self.assertEqual(self.search('bulk'), ['Bulk created message'])
+
+    def test_records_search_without_words(self):
+        """Ensure that terms without words fall back to the default
+        search.
+        """
+        self.assertEqual(self.search('/'), [self.messages[1]])
+
+
+class TestRecordStatsAPI(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        data = [
+            ('error', 'Production', '10.0.0.1', '2020-04-01T11:54:37Z', 2),
+            ('error', 'Production', '10.0.0.1', '2020-04-01T11:58:00Z', 3),
+            ('error', 'Production', '10.0.0.2', '2020-04-01T12:10:00Z', 1),
+            ('info', 'Homolog', '10.0.0.1', '2020-04-01T12:20:00Z', 4),
+        ]
+        for level, environment, origin, date, events in data:
+            resp = self.client.post('/api/records/', {
+                'environment': environment,
+                'level': level,
+                'message': 'some message',
+                'origin': origin,
+                'is_archived': False,
+                'date': date,
+                'events': events,
+                'user_id': self.user.id
+            }, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+    def stats(self, **params):
+        resp = self.client.get('/api/records/stats/', params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data['results']
+
+    def test_records_stats_by_hour(self):
+        """Ensure that the statistics are grouped by hour and by level,
+        environment and origin.
+        """
+        results = self.stats(bucket='hour')
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['level'], 'error')
+        self.assertEqual(results[0]['origin'], '10.0.0.1')
+        self.assertEqual(results[0]['records'], 2)
+        self.assertEqual(results[0]['events'], 5)
+
+    def test_records_stats_group_by(self):
+        """Ensure that 'group_by' narrows the grouping fields.
+        """
+        results = self.stats(bucket='day', group_by='level')
+
+        self.assertEqual(
+            [(row['level'], row['records'], row['events'])
+             for row in results],
+            [('error', 3, 6), ('info', 1, 4)]
+        )
+        self.assertNotIn('origin', results[0])
+
+    def test_records_stats_filters(self):
+        """Ensure that the statistics can be filtered.
+        """
+        results = self.stats(
+            bucket='minute',
+            group_by='environment',
+            level='error',
+            since='2020-04-01T11:55:00Z'
+        )
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(sum(row['events'] for row in results), 4)
+
+    def test_records_stats_invalid_parameters(self):
+        """Ensure that invalid parameters return a bad request status code.
+        """
+        resp = self.client.get('/api/records/stats/', {'bucket': 'year'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get('/api/records/stats/', {'group_by': 'user'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_records_stats_without_token(self):
+        """Ensure that a get in '/api/records/stats/' without a token will
+        return an unauthorized status code.
+        """
+        resp = APIClient().get('/api/records/stats/')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rebuild_rollups_command(self):
+        """Ensure that the rebuild command recreates the same rollups from
+        the stored records.
+        """
+        expected = self.stats(bucket='hour')
+        RecordRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(self.stats(bucket='hour'), expected)
+
+    def assertRollupsRebuilt(self):
+        """Asserts that the rollups are the ones rebuilt from the stored
+        records.
+        """
+        expected = {
+            bucket: self.stats(bucket=bucket)
+            for bucket in settings.RECORDS_ROLLUP_BUCKETS
+        }
+        call_command('rebuild_rollups', stdout=StringIO())
+        for bucket in settings.RECORDS_ROLLUP_BUCKETS:
+            self.assertEqual(self.stats(bucket=bucket), expected[bucket])
+
+    def test_records_stats_follow_updates(self):
+        """Ensure that an updated record moves between the buckets.
+        """
+        record = Record.objects.get(events=4)
+        resp = self.client.patch(
+            '/api/records/{}/'.format(record.pk),
+            {'level': 'error', 'date': '2020-04-02T08:00:00Z', 'events': 5},
+            format='json'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        results = self.stats(bucket='day', group_by='level')
+        self.assertEqual(
+            [(row['bucket'], row['level'], row['records'], row['events'])
+             for row in results],
+            [('2020-03-31T21:00:00-03:00', 'error', 3, 6),
+             ('2020-04-01T21:00:00-03:00', 'error', 1, 5)]
+        )
+        self.assertRollupsRebuilt()
+
+    def test_records_stats_follow_deletes(self):
+        """Ensure that deleted records, one by one, in bulk or along with
+        their user, are taken off the rollups, cold ones included.
+        """
+        record = Record.objects.get(events=4)
+        resp = self.client.delete('/api/records/{}/'.format(record.pk))
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            [row['level'] for row in self.stats(bucket='hour')],
+            ['error', 'error']
+        )
+        self.assertRollupsRebuilt()
+
+        resp = self.client.post('/api/records/bulk/delete/?events__lte=1')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = self.stats(bucket='day')
+        self.assertEqual(
+            [(row['records'], row['events']) for row in results], [(2, 5)]
+        )
+        self.assertRollupsRebuilt()
+
+        Record.objects.update(is_archived=True)
+        call_command('move_archived', stdout=StringIO())
+        self.assertRollupsRebuilt()
+        self.user.delete()
+        self.assertEqual(self.stats(bucket='day'), [])
+        self.assertFalse(RecordRollup.objects.exists())
+
+    @override_settings(RECORDS_DEDUP_WINDOW=3600)
+    def test_records_stats_merged_records(self):
+        """Ensure that a merged record adds its events, not a record, to
+        the bucket of the record it is merged into.
+        """
+        data = {
+            'environment': 'Homolog',
+            'level': 'info',
+            'message': 'some message',
+            'origin': '10.0.0.1',
+            'is_archived': False,
+            'date': '2020-04-01T13:05:00Z',
+            'events': 2,
+            'user_id': self.user.id
+        }
+        resp = self.client.post('/api/records/', data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.post('/api/records/bulk/', [data], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        results = self.stats(bucket='hour', level='info')
+        self.assertEqual(
+            [(row['bucket'], row['records'], row['events'])
+             for row in results],
+            [('2020-04-01T10:00:00-03:00', 1, 8)]
+        )
+        self.assertRollupsRebuilt()
+
+
+class TestRecordWriteBehindAPI(RecordDataMixin, TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        spool_path = os.path.join(self.tmpdir.name, 'spool.sqlite3')
+        self.settings = override_settings(
+            RECORDS_WRITE_BEHIND=True,
+            RECORDS_SPOOL_PATH=spool_path
+        )
+        self.settings.enable()
+
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmpdir.cleanup()
+
+    def drain(self):
+        call_command('drain_spool', '--once', stdout=StringIO())
+
+    def test_records_post_queued(self):
+        """Ensure that a post in '/api/records/' queues the record and
+        returns an accepted status code, the record being stored by the
+        spool worker.
+        """
+        resp = self.client.post(
+            '/api/records/', self.record_data(), format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Record.objects.count(), 0)
+        self.assertEqual(get_spool().size(), 1)
+
+        self.drain()
+
+        self.assertEqual(get_spool().size(), 0)
+        record = Record.objects.get()
+        self.assertEqual(record.message, 'some error message')
+        self.assertEqual(record.user_id, self.user)
+        self.assertTrue(RecordRollup.objects.exists())
+
+    def test_records_post_invalid_not_queued(self):
+        """Ensure that invalid records are rejected before being queued.
+        """
+        resp = self.client.post(
+            '/api/records/', self.record_data(level='invalid'), format='json'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_spool().size(), 0)
+
+    def test_records_bulk_post_queued(self):
+        """Ensure that the valid items of a bulk post are queued.
+        """
+        data = [self.record_data(), self.record_data(origin='a.b.c.d')]
+        resp = self.client.post('/api/records/bulk/', data, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(resp.data['queued'], 1)
+        self.assertEqual(len(resp.data['errors']), 1)
+
+        self.drain()
+
+        self.assertEqual(Record.objects.count(), 1)
+
+    def test_drain_drops_records_of_deleted_users(self):
+        """Ensure that spooled records of a deleted user are dropped.
+        """
+        other = User.objects.create_user(username='john', password='x')
+        self.client.post('/api/records/', self.record_data(), format='json')
+        self.client.post(
+            '/api/records/', self.record_data(user_id=other.id), format='json'
+        )
+        other.delete()
+
+        with self.assertLogs('api.spool', 'WARNING'):
+            self.drain()
+
+        self.assertEqual(Record.objects.count(), 1)
+        self.assertEqual(get_spool().size(), 0)
+
+
+class TestCachedTokenAuthentication(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.other = User.objects.create_user(
+            username='john',
+            email='john@email.com',
+            password='asdf1243'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_cached_token_skips_lookup(self):
+        """Ensure that once the token is cached a request doesn't look the
+        token and user up.
+        """
+        url = f'/api/users/{self.other.id}/'
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            resp = self.client.get(url)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_deleted_token_is_invalidated(self):
+        """Ensure that a deleted or rotated token stops working right away.
+        """
+        self.client.get('/api/users/')
+        self.token.delete()
+        Token.objects.create(user=self.user)
+        resp = self.client.get('/api/users/')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_invalidated(self):
+        """Ensure that the token of a user deleted through
+        '/api/users/{id}/' stops working right away.
+        """
+        other_token = Token.objects.create(user=self.other)
+        other_client = APIClient()
+        other_client.credentials(
+            HTTP_AUTHORIZATION='Token ' + other_token.key
+        )
+        other_client.get('/api/users/')
+
+        resp = self.client.delete(f'/api/users/{self.other.id}/')
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+
+        resp = other_client.get('/api/users/')
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_invalidated(self):
+        """Ensure that the token of a deactivated user stops working right
+        away.
+        """
+        self.client.get('/api/users/')
+        self.user.is_active = False
+        self.user.save()
+        resp = self.client.get('/api/users/')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=0)
+    def test_expired_entries_are_looked_up(self):
+        """Ensure that expired entries are looked up again.
+        """
+        self.client.get('/api/users/')
+
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=1)
+    def test_cache_size_limit(self):
+        """Ensure that the least recently used tokens are evicted.
+        """
+        other_token = Token.objects.create(user=self.other)
+        token_cache.set(self.token.key, self.token)
+        token_cache.set(other_token.key, other_token)
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(token_cache.get(other_token.key), other_token)
+
+
+@override_settings(RECORDS_EXPORT_CHUNK_SIZE=2)
+class TestRecordExportAPI(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        for level in ['error', 'error', 'info', 'error', 'debug']:
+            baker.make(Record, level=level, user_id=self.user)
+
+    def content(self, resp):
+        return b''.join(resp.streaming_content)
+
+    def test_records_export_ndjson(self):
+        """Ensure that '/api/records/export/ndjson/' streams every record
+        as the records serializer represents it.
+        """
+        resp = self.client.get('/api/records/export/ndjson/')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        lines = self.content(resp).decode().splitlines()
+        records = Record.objects.order_by('date', 'id')
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            RecordModelSerializer(records, many=True).data
+        )
+
+    def test_records_export_csv(self):
+        """Ensure that '/api/records/export/csv/' streams a header and a
+        line per record.
+        """
+        resp = self.client.get('/api/records/export/csv/')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(io.StringIO(self.content(resp).decode())))
+        self.assertEqual(rows[0], RecordModelSerializer.Meta.fields)
+        self.assertEqual(len(rows), 6)
+
+    def test_records_export_filters(self):
+        """Ensure that the export accepts the records list filters.
+        """
+        resp = self.client.get('/api/records/export/ndjson/?level=error')
+
+        lines = self.content(resp).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_records_export_gzip(self):
+        """Ensure that the export is compressed when the client accepts
+        gzip.
+        """
+        resp = self.client.get(
+            '/api/records/export/ndjson/', HTTP_ACCEPT_ENCODING='gzip'
+        )
+
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(self.content(resp)).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_records_export_gzip_refused(self):
+        """Ensure that the export isn't compressed when the client refuses
+        gzip.
+        """
+        for header in ['gzip;q=0, identity', 'gzip;q=0, *']:
+            resp = self.client.get(
+                '/api/records/export/ndjson/', HTTP_ACCEPT_ENCODING=header
+            )
+
+            self.assertFalse(resp.has_header('Content-Encoding'))
+            lines = self.content(resp).decode().splitlines()
+            self.assertEqual(len(lines), 5)
+
+    def test_records_export_unknown_format(self):
+        """Ensure that unknown formats return a not found status code.
+        """
+        resp = self.client.get('/api/records/export/xml/')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_records_export_without_token(self):
+        """Ensure that the export without a token will return an
+        unauthorized status code.
+        """
+        resp = APIClient().get('/api/records/export/csv/')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestContentEncodingAPI(TestCase):
+    def setUp(self):
+        caches['records'].clear()
+        self.user = User.objects.create_user(
+            username='mary', email='mary@email.com', password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        baker.make(
+            Record, is_archived=False, user_id=self.user, _quantity=20
+        )
+
+    def test_records_list_msgpack(self):
+        """Ensure that the records list is rendered as MessagePack when
+        the client accepts it, with the same content as in JSON.
+        """
+        as_json = self.client.get('/api/records/')
+        resp = self.client.get(
+            '/api/records/', HTTP_ACCEPT='application/msgpack'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            msgpack.unpackb(resp.content, raw=False),
+            json.loads(as_json.content)
+        )
+        self.assertLess(len(resp.content), len(as_json.content))
+
+    def test_records_post_msgpack(self):
+        """Ensure that records are created from MessagePack bodies, one at
+        a time or in bulk, with dates as timestamps or strings.
+        """
+        data = {
+            'environment': 'Production',
+            'level': 'error',
+            'message': 'some error message',
+            'origin': '192.168.0.111',
+            'is_archived': False,
+            'date': datetime(2020, 4, 1, 11, 54, 37, tzinfo=timezone.utc),
+            'events': 1,
+            'user_id': self.user.id
+        }
+        resp = self.client.post(
+            '/api/records/', msgpack.packb(data, datetime=True),
+            content_type='application/msgpack'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        record = Record.objects.get(pk=resp.data['id'])
+        self.assertEqual(record.date, data['date'])
+
+        data['date'] = '2020-04-01T11:54:37Z'
+        resp = self.client.post(
+            '/api/records/bulk/', msgpack.packb([data, data]),
+            content_type='application/msgpack'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Record.objects.filter(
+            message='some error message'
+        ).count(), 3)
+
+    def test_records_post_invalid_msgpack(self):
+        """Ensure that a body that isn't MessagePack gets a bad request.
+        """
+        resp = self.client.post(
+            '/api/records/', b'\xc1\x00', content_type='application/msgpack'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_large_response_compressed(self):
+        """Ensure that responses above the size threshold are compressed
+        with the encoding accepted by the client, with a weak ETag still
+        matching the cached response.
+        """
+        plain = self.client.get('/api/records/')
+        resp = self.client.get(
+            '/api/records/', HTTP_ACCEPT_ENCODING='gzip;q=1.0, br;q=0'
+        )
+
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', resp['Vary'])
+        self.assertEqual(gzip.decompress(resp.content), plain.content)
+        self.assertEqual(resp['Content-Length'], str(len(resp.content)))
+        self.assertEqual(resp['ETag'], 'W/' + plain['ETag'])
+
+        resp = self.client.get(
+            '/api/records/', HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=resp['ETag']
+        )
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_refused_encoding_not_used(self):
+        """Ensure that an encoding refused with a quality of 0 isn't used
+        through the '*' wildcard.
+        """
+        resp = self.client.get(
+            '/api/records/', HTTP_ACCEPT_ENCODING='gzip;q=0, *'
+        )
+        self.assertNotEqual(resp.get('Content-Encoding'), 'gzip')
+
+        resp = self.client.get(
+            '/api/records/', HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0, *'
+        )
+        self.assertFalse(resp.has_header('Content-Encoding'))
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_SIZE=1 << 20)
+    def test_small_response_not_compressed(self):
+        """Ensure that responses below the size threshold, or to clients
+        not accepting any encoding, are sent uncompressed.
+        """
+        resp = self.client.get('/api/records/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(resp.has_header('Content-Encoding'))
+
+        with self.settings(RESPONSE_COMPRESSION_MIN_SIZE=0):
+            resp = self.client.get(
+                '/api/records/', HTTP_ACCEPT_ENCODING='identity'
+            )
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertEqual(resp.data['results'][0]['id'], json.loads(
+            resp.content
+        )['results'][0]['id'])
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_SIZE=0)
+    def test_streaming_response_not_compressed(self):
+        """Ensure that the streamed responses are left to the views.
+        """
+        resp = self.client.get(
+            '/api/records/export/ndjson/', HTTP_ACCEPT_ENCODING='br'
+        )
+
+        self.assertTrue(resp.streaming)
+        self.assertFalse(resp.has_header('Content-Encoding'))
+
+
+class TestRecordFastSerializer(TestCase):
+    def setUp(self):
+        base = timezone.now().replace(microsecond=0)
+        baker.make(Record, date=base)
+        baker.make(Record, date=base.replace(microsecond=123456))
+        baker.make(Record, is_archived=True, events=0)
+
+    def assert_same_representation(self):
+        records = Record.objects.order_by('id')
+        serializer = RecordFastSerializer()
+        rows = serializer.get_queryset(records)
+
+        self.assertEqual(
+            serializer.serialize(rows),
+            RecordModelSerializer(records, many=True).data
+        )
+
+    def test_same_representation(self):
+        """Ensure that the fast serializer gives the same representation
+        of the model serializer.
+        """
+        self.assert_same_representation()
+
+    def test_same_representation_utc(self):
+        """Ensure that UTC dates keep the 'Z' suffix of the model
+        serializer.
+        """
+        with timezone.override('UTC'):
+            self.assert_same_representation()
+
+    def test_field_subset(self):
+        serializer = RecordFastSerializer(['id', 'level'])
+        rows = serializer.get_queryset(Record.objects.order_by('id'))
+
+        self.assertEqual(
+            serializer.serialize(rows),
+            list(Record.objects.order_by('id').values('id', 'level'))
+        )
+
+
+class TestRecordRetention(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for days in [1, 10, 40, 100, 400]:
+            baker.make(Record, date=now - timedelta(days=days))
+
+    def test_apply_retention(self):
+        """Ensure that the records older than the retention period are
+        deleted, in batches.
+        """
+        out = StringIO()
+        call_command(
+            'apply_retention', '--days', '30', '--batch-size', '1', stdout=out
+        )
+
+        self.assertIn('Deleted 3 expired records.', out.getvalue())
+        self.assertEqual(Record.objects.count(), 2)
+
+    @override_settings(RECORDS_RETENTION_DAYS=None)
+    def test_apply_retention_keeps_records(self):
+        """Ensure that the records are kept without a retention period.
+        """
+        call_command('apply_retention', stdout=StringIO())
+
+        self.assertEqual(Record.objects.count(), 5)
+
+    def test_partition_months(self):
+        month = partitions.month_start(
+            datetime(2020, 12, 31, 23, 0, tzinfo=timezone.utc)
+        )
+
+        self.assertEqual(month, datetime(2020, 12, 1, tzinfo=timezone.utc))
+        self.assertEqual(
+            partitions.add_months(month, 1),
+            datetime(2021, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            partitions.partition_name(month), 'api_record_p202012'
+        )
+        self.assertEqual(
+            partitions.partition_month('api_record_p202012'), month
+        )
+        self.assertIsNone(partitions.partition_month('api_record_default'))
+        self.assertIn(
+            "FROM ('2020-12-01T00:00:00+00:00') "
+            "TO ('2021-01-01T00:00:00+00:00')",
+            partitions.create_partition_sql(month)
+        )
+
+    def test_attach_partition_sql(self):
+        """Ensure that the rows of a month on the default partition are
+        moved to the new partition before it is attached.
+        """
+        month = datetime(2030, 5, 1, tzinfo=timezone.utc)
+        condition = (
+            "date >= '2030-05-01T00:00:00+00:00' "
+            "AND date < '2030-06-01T00:00:00+00:00'"
+        )
+
+        self.assertEqual(partitions.attach_partition_sql(month), [
+            'CREATE TABLE api_record_p203005 '
+            '(LIKE api_record INCLUDING DEFAULTS)',
+            'INSERT INTO api_record_p203005 SELECT * FROM api_record_default '
+            'WHERE ' + condition,
+            'DELETE FROM api_record_default WHERE ' + condition,
+            'ALTER TABLE api_record ATTACH PARTITION api_record_p203005 '
+            "FOR VALUES FROM ('2030-05-01T00:00:00+00:00') "
+            "TO ('2030-06-01T00:00:00+00:00')",
+        ])
+
+
+class TestRecordBulkActionAPI(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        baker.make(
+            Record,
+            environment='Production',
+            level='error',
+            is_archived=False,
+            _quantity=5
+        )
+        baker.make(
+            Record,
+            environment='Testing',
+            level='error',
+            is_archived=False,
+            _quantity=3
+        )
+        baker.make(
+            Record, environment='Testing', level='info', is_archived=True
+        )
+
+    def test_records_bulk_archive(self):
+        """Ensure that a post in '/api/records/bulk/archive/' archives the
+        records matching the filters, in batches, returning the number of
+        affected records.
+        """
+        with override_settings(RECORDS_BULK_ACTION_BATCH_SIZE=2):
+            resp = self.client.post(
+                '/api/records/bulk/archive/?environment=Testing'
+            )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {'affected': 3})
+        self.assertEqual(
+            Record.objects.filter(
+                environment='Testing', is_archived=False
+            ).count(),
+            0
+        )
+        self.assertEqual(
+            Record.objects.filter(is_archived=False).count(), 5
+        )
+
+    def test_records_bulk_delete(self):
+        """Ensure that a post in '/api/records/bulk/delete/' deletes only
+        the records matching the filters.
+        """
+        resp = self.client.post(
+            '/api/records/bulk/delete/?environment=Production&level=error'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {'affected': 5})
+        self.assertEqual(Record.objects.count(), 4)
+        self.assertFalse(
+            Record.objects.filter(environment='Production').exists()
+        )
+
+    def test_records_bulk_delete_requires_filters(self):
+        """Ensure that deleting all the records must be explicit.
+        """
+        resp = self.client.post('/api/records/bulk/delete/')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Record.objects.count(), 9)
+
+        resp = self.client.post('/api/records/bulk/delete/?all=true')
+
+        self.assertEqual(resp.data, {'affected': 9})
+        self.assertEqual(Record.objects.count(), 0)
+
+    @override_settings(RECORDS_BULK_JOB_THRESHOLD=4)
+    def test_records_bulk_job(self):
+        """Ensure that large sets are left to a background job, whose
+        progress is served by '/api/records/bulk/jobs/<pk>/'.
+        """
+        resp = self.client.post(
+            '/api/records/bulk/archive/?level=error'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(resp.data['status'], 'pending')
+        url = '/api/records/bulk/jobs/{}/'.format(resp.data['id'])
+        self.assertEqual(resp['Location'], url)
+        self.assertEqual(Record.objects.filter(is_archived=True).count(), 1)
+
+        call_command(
+            'run_bulk_jobs', '--once', '--batch-size', '3', stdout=StringIO()
+        )
+
+        resp = self.client.get(url)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['status'], 'done')
+        self.assertEqual(resp.data['total'], 8)
+        self.assertEqual(resp.data['processed'], 8)
+        self.assertEqual(Record.objects.filter(is_archived=True).count(), 9)
+
+    def test_records_bulk_job_background(self):
+        """Ensure that the background parameter forces a job, which keeps
+        the filters and search of the request.
+        """
+        baker.make(Record, environment='Testing', message='disk is full')
+
+        resp = self.client.post(
+            '/api/records/bulk/delete/'
+            '?environment=Testing&search=disk&background=true'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Record.objects.count(), 10)
+
+        call_command('run_bulk_jobs', '--once', stdout=StringIO())
+
+        job = RecordBulkJob.objects.get()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.processed, 1)
+        self.assertEqual(job.user_id, self.user)
+        self.assertEqual(Record.objects.count(), 9)
+
+    def test_records_bulk_job_last(self):
+        """Ensure that a job keeps the records of the last filter as of
+        when it was enqueued, instead of when it runs.
+        """
+        now = timezone.now()
+        Record.objects.update(date=now - timedelta(days=1))
+        baker.make(Record, date=now - timedelta(minutes=30))
+
+        resp = self.client.post(
+            '/api/records/bulk/delete/?last=PT1H&background=true'
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        job = RecordBulkJob.objects.get()
+        self.assertNotIn('last=', job.params)
+        self.assertIn('date__gte=', job.params)
+
+        later = now + timedelta(hours=2)
+        with mock.patch.object(timezone, 'now', return_value=later):
+            call_command('run_bulk_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.processed, 1)
+        self.assertEqual(Record.objects.count(), 9)
+
+    def test_records_bulk_job_not_found(self):
+        resp = self.client.get('/api/records/bulk/jobs/1000/')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_records_bulk_archive_without_token(self):
+        resp = APIClient().post('/api/records/bulk/archive/')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(Record.objects.filter(is_archived=True).count(), 1)
+
+
+class TestRecordColdTier(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # Archived and unarchived records interleaved by date.
+        base = timezone.now()
+        for i in range(10):
+            baker.make(
+                Record,
+                environment='Production' if i % 3 else 'Testing',
+                date=base - timedelta(days=i),
+                is_archived=i % 2 == 0,
+                user_id=self.user
+            )
+        self.ids = list(
+            Record.objects.order_by('-date').values_list('id', flat=True)
+        )
+
+    def move(self, *args):
+        call_command('move_archived', *args, stdout=StringIO())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            resp = self.client.get(url, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            ids.extend(record['id'] for record in resp.data['results'])
+            url = resp.data['next']
+        return ids
+
+    def test_move_archived(self):
+        """Ensure that the archived records are moved to the cold table
+        keeping their ids and data.
+        """
+        record = Record.objects.filter(is_archived=True).first()
+        expected = RecordModelSerializer(record).data
+
+        self.move('--batch-size', '2')
+
+        self.assertEqual(Record.objects.filter(is_archived=True).count(), 0)
+        self.assertEqual(Record.objects.count(), 5)
+        self.assertEqual(ArchivedRecord.objects.count(), 5)
+        self.assertEqual(
+            RecordModelSerializer(ArchivedRecord.objects.get(pk=record.pk))
+            .data,
+            expected
+        )
+
+    def test_move_archived_min_age(self):
+        """Ensure that only the archived records older than the minimum
+        age are moved.
+        """
+        self.move('--min-age', '5')
+
+        self.assertEqual(ArchivedRecord.objects.count(), 2)
+
+    def test_records_list_reads_cold_tier(self):
+        """Ensure that the records list merges the records and the cold
+        archived records, newest first, across the pages.
+        """
+        self.move()
+
+        self.assertEqual(self.walk('/api/records/?page_size=3'), self.ids)
+        self.assertEqual(
+            self.walk('/api/records/?is_archived=true&page_size=2'),
+            self.ids[::2]
+        )
+        self.assertEqual(
+            self.walk('/api/records/?is_archived=false'), self.ids[1::2]
+        )
+
+    def test_records_list_filters_cold_tier(self):
+        """Ensure that the filters and search apply to the cold records.
+        """
+        self.move()
+
+        ids = self.walk('/api/records/?environment=Testing')
+        expected = [pk for i, pk in enumerate(self.ids) if i % 3 == 0]
+
+        self.assertEqual(ids, expected)
+
+    def test_records_id_get_cold_record(self):
+        """Ensure that a moved record is still served by its id.
+        """
+        self.move()
+
+        resp = self.client.get('/api/records/{}/'.format(self.ids[0]))
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['id'], self.ids[0])
+        self.assertTrue(resp.data['is_archived'])
+
+    def test_records_id_patch_cold_record(self):
+        """Ensure that a moved record can be updated, and that unarchiving
+        it moves it back to the records table with its id.
+        """
+        self.move()
+
+        resp = self.client.patch(
+            '/api/records/{}/'.format(self.ids[0]),
+            {'message': 'still archived'}, format='json'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            ArchivedRecord.objects.get(pk=self.ids[0]).message,
+            'still archived'
+        )
+
+        resp = self.client.patch(
+            '/api/records/{}/'.format(self.ids[0]),
+            {'is_archived': False}, format='json'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(resp.data['is_archived'])
+        self.assertFalse(
+            ArchivedRecord.objects.filter(pk=self.ids[0]).exists()
+        )
+        record = Record.objects.get(pk=self.ids[0])
+        self.assertEqual(record.message, 'still archived')
+        self.assertFalse(record.is_archived)
+        self.assertEqual(
+            self.client.get('/api/records/{}/'.format(self.ids[0])).data,
+            resp.data
+        )
+
+    def test_records_id_delete_cold_record(self):
+        """Ensure that a moved record can be deleted by its id.
+        """
+        self.move()
+
+        resp = self.client.delete('/api/records/{}/'.format(self.ids[0]))
+
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(
+            ArchivedRecord.objects.filter(pk=self.ids[0]).exists()
+        )
+        resp = self.client.get('/api/records/{}/'.format(self.ids[0]))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_records_bulk_delete_cold_tier(self):
+        """Ensure that the bulk delete also deletes the cold records.
+        """
+        self.move()
+
+        resp = self.client.post('/api/records/bulk/delete/?is_archived=true')
+
+        self.assertEqual(resp.data, {'affected': 5})
+        self.assertEqual(ArchivedRecord.objects.count(), 0)
+        self.assertEqual(Record.objects.count(), 5)
+
+    def test_records_export_cold_tier(self):
+        """Ensure that the export includes the cold records.
+        """
+        self.move()
+
+        resp = self.client.get('/api/records/export/ndjson/')
+        body = b''.join(resp.streaming_content).decode()
+        ids = [json.loads(line)['id'] for line in body.splitlines()]
+
+        self.assertEqual(ids, self.ids[::-1])
+
+
+class TestRecordResponseCache(RecordDataMixin, TestCase):
+    def setUp(self):
+        caches['records'].clear()
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.records = baker.make(
+            Record,
+            environment='Production',
+            level='error',
+            is_archived=False,
+            user_id=self.user,
+            _quantity=3
+        )
+
+    def test_records_list_cached(self):
+        """Ensure that the same list, in any query parameters order, is
+        served from the cache without querying the database.
+        """
+        first = self.client.get('/api/records/?level=error&page_size=2')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/records/?page_size=2&level=error')
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_records_list_not_modified(self):
+        """Ensure that a request with the ETag of an unchanged response
+        gets a 304 with no content.
+        """
+        etag = self.client.get('/api/records/')['ETag']
+
+        with self.assertNumQueries(0):
+            resp = self.client.get('/api/records/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp.content, b'')
+        self.assertEqual(resp['ETag'], etag)
+
+    def test_records_list_not_modified_only_while_cached(self):
+        """Ensure that once the cached response expires, a write missed by
+        the generation, like one of a process not sharing the cache, is
+        seen by a client revalidating its ETag.
+        """
+        etag = self.client.get('/api/records/')['ETag']
+        Record.objects.bulk_create([
+            baker.prepare(Record, user_id=self.user, is_archived=False)
+        ])
+        # The cached response expires, the generation stays.
+        cache = caches['records']
+        generation = cache.get(GENERATION_KEY)
+        cache.clear()
+        cache.set(GENERATION_KEY, generation, None)
+
+        resp = self.client.get('/api/records/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['results']), 4)
+
+    def test_generation_never_moves_backwards(self):
+        """Ensure that the generation only grows on the file based cache,
+        even when it is ahead of the clock, and that an empty bulk
+        ingestion doesn't bump it.
+        """
+        cache = caches['records']
+        ahead = time.time_ns() + 10 ** 12
+        cache.set(GENERATION_KEY, ahead, None)
+
+        invalidate_responses()
+        self.assertEqual(cache.get(GENERATION_KEY), ahead + 1)
+
+        bulk_ingest([])
+        self.assertEqual(cache.get(GENERATION_KEY), ahead + 1)
+
+    def test_records_list_invalidated_by_writes(self):
+        """Ensure that creating, bulk creating, updating and deleting
+        records invalidate the cached responses.
+        """
+        writes = [
+            lambda: self.client.post(
+                '/api/records/', self.record_data(), format='json'
+            ),
+            lambda: self.client.post(
+                '/api/records/bulk/', [self.record_data()], format='json'
+            ),
+            lambda: self.client.patch(
+                '/api/records/{}/'.format(self.records[0].id),
+                {'message': 'changed'},
+                format='json'
+            ),
+            lambda: self.client.delete(
+                '/api/records/{}/'.format(self.records[1].id)
+            ),
+            lambda: self.client.post(
+                '/api/records/bulk/archive/?environment=Production'
+            ),
+        ]
+        for write in writes:
+            etag = self.client.get('/api/records/')['ETag']
+            write()
+
+            resp = self.client.get('/api/records/', HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(resp['ETag'], etag)
+            self.assertEqual(
+                [record['id'] for record in resp.data['results']],
+                list(Record.objects.order_by('-date', '-id').values_list(
+                    'id', flat=True
+                ))
+            )
+
+    def test_records_id_get_cached(self):
+        """Ensure that the record detail is cached and revalidated.
+        """
+        url = '/api/records/{}/'.format(self.records[0].id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(url, {'events': 10}, format='json')
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['events'], 10)
+
+    def test_records_cache_per_user(self):
+        """Ensure that each user has its own cached responses.
+        """
+        etag = self.client.get('/api/records/')['ETag']
+        other = User.objects.create_user(username='john', password='x')
+        self.client.force_authenticate(other)
+
+        resp = self.client.get('/api/records/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    @override_settings(RECORDS_CACHE_ALIAS=None)
+    def test_records_cache_disabled(self):
+        resp = self.client.get('/api/records/')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(resp.has_header('ETag'))
+
+
+@override_settings(RECORDS_TAIL_BACKEND='local', RECORDS_TAIL_HEARTBEAT=0.1)
+class TestRecordTailAPI(RecordDataMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def open_tail(self, url, **extra):
+        resp = self.client.get(url, **extra)
+        self.addCleanup(resp.close)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        events = iter(resp.streaming_content)
+        self.assertTrue(next(events).startswith(b'retry:'))
+        return events
+
+    def parse_event(self, event):
+        lines = event.decode().strip().splitlines()
+        fields = dict(line.split(': ', 1) for line in lines)
+        return fields, json.loads(fields['data'])
+
+    def test_records_tail_streams_records(self):
+        """Ensure that '/api/records/tail/' streams the records created
+        after opening it, matching its filters.
+        """
+        events = self.open_tail('/api/records/tail/?level=error')
+
+        self.client.post(
+            '/api/records/', self.record_data(level='info'), format='json'
+        )
+        resp = self.client.post(
+            '/api/records/', self.record_data(), format='json'
+        )
+
+        fields, record = self.parse_event(next(events))
+
+        self.assertEqual(fields['event'], 'record')
+        self.assertEqual(fields['id'], str(resp.data['id']))
+        self.assertEqual(record, resp.data)
+        self.assertEqual(next(events), b': keepalive\n\n')
+
+    def test_records_tail_bulk(self):
+        """Ensure that the records of a bulk post are streamed.
+        """
+        events = self.open_tail('/api/records/tail/?environment=Testing')
+
+        self.client.post('/api/records/bulk/', [
+            self.record_data(environment='Testing', message='first'),
+            self.record_data(message='second'),
+            self.record_data(environment='Testing', message='third'),
+        ], format='json')
+
+        received = [self.parse_event(next(events)) for _ in range(2)]
+
+        self.assertEqual(
+            [record['message'] for _, record in received], ['first', 'third']
+        )
+        # The events have the ids of the stored records, to resume from.
+        ids = dict(Record.objects.values_list('message', 'id'))
+        for fields, record in received:
+            self.assertEqual(record['id'], ids[record['message']])
+            self.assertEqual(fields['id'], str(record['id']))
+
+    def test_records_tail_replay(self):
+        """Ensure that a reconnecting client gets the records missed since
+        its last event.
+        """
+        ids = [
+            self.client.post(
+                '/api/records/', self.record_data(), format='json'
+            ).data['id']
+            for _ in range(3)
+        ]
+
+        events = self.open_tail(
+            '/api/records/tail/', HTTP_LAST_EVENT_ID=str(ids[0])
+        )
+
+        self.assertEqual(
+            [int(self.parse_event(next(events))[0]['id']) for _ in range(2)],
+            ids[1:]
+        )
+
+    @override_settings(RECORDS_DEDUP_WINDOW=60)
+    def test_records_tail_merges(self):
+        """Ensure that the records duplicates are merged into are streamed
+        as merge events, without an id to resume from.
+        """
+        events = self.open_tail('/api/records/tail/')
+
+        created = self.client.post(
+            '/api/records/', self.record_data(), format='json'
+        ).data
+        merged = self.client.post(
+            '/api/records/', self.record_data(events=2), format='json'
+        ).data
+        self.client.post('/api/records/bulk/', [
+            self.record_data(events=3),
+        ], format='json')
+
+        fields, record = self.parse_event(next(events))
+        self.assertEqual(fields['id'], str(created['id']))
+        self.assertEqual(record, created)
+
+        fields, record = self.parse_event(next(events))
+        self.assertEqual(fields['event'], 'merge')
+        self.assertNotIn('id', fields)
+        self.assertEqual(record, merged)
+
+        fields, record = self.parse_event(next(events))
+        self.assertEqual(fields['event'], 'merge')
+        self.assertNotIn('id', fields)
+        self.assertEqual(record['id'], created['id'])
+        self.assertEqual(record['events'], 6)
+
+    def test_records_tail_invalid_filter(self):
+        resp = self.client.get('/api/records/tail/?level=invalid')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECORDS_TAIL_MAX_SUBSCRIBERS=1)
+    def test_records_tail_max_subscribers(self):
+        """Ensure that past the maximum of viewers the tail answers with a
+        service unavailable status code, until a viewer leaves.
+        """
+        first = self.client.get('/api/records/tail/')
+        self.addCleanup(first.close)
+
+        resp = self.client.get('/api/records/tail/')
+        self.assertEqual(
+            resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+        # Closed without ever being read.
+        first.close()
+        self.open_tail('/api/records/tail/')
+
+    @override_settings(RECORDS_TAIL_BACKEND=None)
+    def test_records_tail_disabled(self):
+        resp = self.client.get('/api/records/tail/')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_records_tail_without_token(self):
+        resp = APIClient().get('/api/records/tail/')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestSyslogParsing(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='mary', password='x')
+
+    def test_parse_rfc5424(self):
+        parsed = syslog.parse_message(
+            '<165>1 2020-04-01T11:54:37.003Z web01 nginx 1234 ID47 '
+            '[exampleSDID@32473 iut="3" eventSource="App\\]"] '
+            '\ufeffconnection refused'
+        )
+
+        self.assertEqual(parsed, {
+            'severity': 5,
+            'date': datetime(
+                2020, 4, 1, 11, 54, 37, 3000, tzinfo=timezone.utc
+            ),
+            'hostname': 'web01',
+            'app_name': 'nginx',
+            'message': 'connection refused',
+        })
+
+    def test_parse_rfc5424_nil_values(self):
+        parsed = syslog.parse_message('<11>1 - - - - - - disk full\n')
+
+        self.assertEqual(parsed['severity'], 3)
+        self.assertIsNone(parsed['date'])
+        self.assertIsNone(parsed['hostname'])
+        self.assertIsNone(parsed['app_name'])
+        self.assertEqual(parsed['message'], 'disk full')
+
+    def test_parse_rfc5424_invalid_date(self):
+        parsed = syslog.parse_message(
+            '<11>1 2024-02-30T10:00:00Z web01 app - - - disk full'
+        )
+
+        self.assertIsNone(parsed['date'])
+        self.assertEqual(parsed['hostname'], 'web01')
+        self.assertEqual(parsed['message'], 'disk full')
+
+    def test_parse_rfc3164(self):
+        now = timezone.make_aware(datetime(2021, 1, 2, 10, 0))
+        parsed = syslog.parse_message(
+            '<34>Dec 31 22:14:15 mymachine su[123]: \'su root\' failed',
+            now=now
+        )
+
+        self.assertEqual(parsed['severity'], 2)
+        self.assertEqual(
+            parsed['date'],
+            timezone.make_aware(datetime(2020, 12, 31, 22, 14, 15))
+        )
+        self.assertEqual(parsed['hostname'], 'mymachine')
+        self.assertEqual(parsed['app_name'], 'su')
+        self.assertEqual(parsed['message'], "'su root' failed")
+
+    def test_parse_without_header(self):
+        parsed = syslog.parse_message('just a message')
+
+        self.assertEqual(parsed['severity'], 5)
+        self.assertEqual(parsed['message'], 'just a message')
+
+    def test_to_record(self):
+        """Ensure that the severities map to the record levels and the
+        values are truncated to the model limits.
+        """
+        levels = [
+            syslog.to_record(
+                {'severity': severity, 'date': None, 'hostname': None,
+                 'app_name': None, 'message': ''},
+                '10.0.0.1', self.user
+            ).level
+            for severity in range(8)
+        ]
+        self.assertEqual(levels, [
+            'critical', 'critical', 'critical', 'error', 'warning', 'info',
+            'info', 'debug'
+        ])
+
+        parsed = syslog.parse_message(
+            '<12>1 - {} app - - - {}'.format('h' * 100, 'm' * 300)
+        )
+        record = syslog.to_record(parsed, '10.0.0.1', self.user)
+        record.full_clean()
+
+        self.assertEqual(record.environment, 'h' * 30)
+        self.assertEqual(len(record.message), 200)
+        self.assertEqual(record.level, 'warning')
+
+        record = syslog.to_record(
+            parsed, '10.0.0.1', self.user, environment_from='app-name'
+        )
+        self.assertEqual(record.environment, 'app')
+
+    def test_source_ipv4(self):
+        self.assertEqual(syslog.source_ipv4('10.0.0.1'), '10.0.0.1')
+        self.assertEqual(syslog.source_ipv4('::ffff:10.0.0.1'), '10.0.0.1')
+        self.assertIsNone(syslog.source_ipv4('::1'))
+
+    def test_read_frames(self):
+        """Ensure that TCP streams framed by octet counting and by new
+        lines are split into messages.
+        """
+        async def frames():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'11 <13>first 2<14>second\n<15>third\n')
+            reader.feed_eof()
+            return [frame async for frame in syslog.read_frames(reader)]
+
+        self.assertEqual(
+            asyncio.run(frames()),
+            [b'<13>first 2', b'<14>second\n', b'<15>third\n']
+        )
+
+    def test_read_frames_too_long(self):
+        """Ensure that octet counted frames longer than the maximum are
+        skipped, going on with the next frames.
+        """
+        async def frames():
+            reader = asyncio.StreamReader()
+            length = syslog.MAX_FRAME_BYTES + 1
+            reader.feed_data(
+                b'%d ' % length + b'x' * length + b'5 <13>a'
+            )
+            reader.feed_eof()
+            return [frame async for frame in syslog.read_frames(reader)]
+
+        self.assertEqual(asyncio.run(frames()), [b'<13>a'])
+
+
+class TestSyslogBatcher(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='mary', password='x')
+
+    def test_batcher_stores_batches(self):
+        """Ensure that the received messages are stored in batches, by
+        size and when closing.
+        """
+        batcher = syslog.RecordBatcher(self.user, 2, 60)
+
+        async def receive():
+            for index in range(5):
+                message = '<11>message {}'.format(index)
+                batcher.add(message.encode(), '10.0.0.1')
+            batcher.add(b'<11>from ipv6', '::1')
+            await batcher.close()
+
+        asyncio.run(receive())
+
+        self.assertEqual(batcher.stored, 5)
+        self.assertEqual(batcher.dropped, 1)
+        self.assertEqual(
+            sorted(Record.objects.values_list('message', flat=True)),
+            ['message {}'.format(index) for index in range(5)]
+        )
+        self.assertEqual(
+            set(Record.objects.values_list('level', 'origin')),
+            {('error', '10.0.0.1')}
+        )
+
+    def test_batcher_retries_failed_batches(self):
+        """Ensure that a batch failing to be stored is tried again.
+        """
+        attempts = []
+
+        def flaky_ingest(records):
+            attempts.append(len(records))
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return bulk_ingest(records)
+
+        batcher = syslog.RecordBatcher(self.user, 2, 60, retry_delay=0)
+
+        async def receive():
+            batcher.add(b'<11>first', '10.0.0.1')
+            batcher.add(b'<11>second', '10.0.0.1')
+            await batcher.close()
+
+        with mock.patch.object(syslog, 'bulk_ingest', flaky_ingest):
+            asyncio.run(receive())
+
+        self.assertEqual(attempts, [2, 2])
+        self.assertEqual(batcher.stored, 2)
+        self.assertEqual(batcher.failed, 0)
+        self.assertEqual(Record.objects.count(), 2)
+
+    def test_batcher_bounds_pending_batches(self):
+        """Ensure that past `max_pending` batches waiting for the database
+        the messages are shed and the TCP senders wait.
+        """
+        release = threading.Event()
+        batcher = syslog.RecordBatcher(self.user, 1, 60, max_pending=1)
+        store = batcher._store
+
+        def slow_store(records):
+            release.wait(5)
+            store(records)
+
+        batcher._store = slow_store
+
+        async def receive():
+            for message in [b'<11>first', b'<11>second', b'<11>third']:
+                batcher.add(message, '10.0.0.1')
+            self.assertTrue(batcher.full())
+
+            waiting = asyncio.ensure_future(batcher.wait_ready())
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            release.set()
+            await waiting
+            await batcher.close()
+
+        asyncio.run(receive())
+
+        self.assertEqual(batcher.shed, 1)
+        self.assertEqual(batcher.stored, 2)
+        self.assertEqual(
+            sorted(Record.objects.values_list('message', flat=True)),
+            ['first', 'second']
+        )
+
+
+class TestMetrics(TestCase):
+    SAMPLE_RE = re.compile(
+        r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})?'
+        r' \S+$'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='mary',
+            email='mary@email.com',
+            password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain'))
+        samples = {}
+        for line in resp.content.decode().splitlines():
+            if line.startswith('#'):
+                continue
+            self.assertRegex(line, self.SAMPLE_RE)
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+        return samples
+
+    def test_histogram(self):
+        registry = metrics.Registry()
+        histogram = metrics.Histogram(
+            'test_seconds', 'Test.', ['view'], buckets=(0.1, 1),
+            registry=registry
+        )
+        for value in [0.05, 0.5, 0.5, 5]:
+            histogram.labels('a').observe(value)
+
+        self.assertEqual(registry.expose(), '\n'.join([
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a",le="0.1"} 1',
+            'test_seconds_bucket{view="a",le="1"} 3',
+            'test_seconds_bucket{view="a",le="+Inf"} 4',
+            'test_seconds_sum{view="a"} 6.05',
+            'test_seconds_count{view="a"} 4',
+        ]) + '\n')
+
+    def test_metrics_requests(self):
+        """Ensure that the requests latency, database queries and
+        serializer time are labelled by view.
+        """
+        before = self.scrape()
+        baker.make(Record, _quantity=3)
+        self.client.get('/api/records/')
+        self.client.get('/api/users/')
+        samples = self.scrape()
+
+        def delta(name):
+            return samples.get(name, 0) - before.get(name, 0)
+
+        self.assertEqual(delta(
+            'http_request_duration_seconds_count'
+            '{view="RecordListCreate",method="GET"}'
+        ), 1)
+        self.assertEqual(delta(
+            'http_requests_total'
+            '{view="UserListCreateView",method="GET",status="200"}'
+        ), 1)
+        self.assertEqual(delta(
+            'db_queries_per_request_count{view="RecordListCreate"}'
+        ), 1)
+        self.assertGreater(delta(
+            'db_queries_per_request_sum{view="RecordListCreate"}'
+        ), 0)
+        self.assertEqual(delta(
+            'serializer_duration_seconds_count'
+            '{serializer="RecordFastSerializer"}'
+        ), 1)
+        self.assertEqual(delta(
+            'serializer_duration_seconds_count'
+            '{serializer="UserModelSerializer"}'
+        ), 1)
+
+    def test_metrics_ingestion(self):
+        """Ensure that the ingested records and batch sizes are counted.
+        """
+        before = self.scrape()
+        bulk_ingest(baker.prepare(Record, user_id=self.user, _quantity=4))
+        samples = self.scrape()
+
+        self.assertEqual(
+            samples['records_ingested_total{outcome="created"}']
+            - before.get('records_ingested_total{outcome="created"}', 0),
+            4
+        )
+        self.assertEqual(
+            samples['records_ingest_batch_size_count']
+            - before.get('records_ingest_batch_size_count', 0),
+            1
+        )
+        self.assertEqual(samples['records_bulk_jobs_pending'], 0)
+        self.assertEqual(samples['records_spool_size'], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        resp = self.client.get('/metrics')
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        resp = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_disabled(self):
+        resp = self.client.get('/metrics')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestDatabaseTuning(TestCase):
+    def setUp(self):
+        caches['records'].clear()
+        self.user = User.objects.create_user(
+            username='mary', email='mary@email.com', password='asdf1243'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        Record.objects.bulk_create(
+            baker.prepare(Record, user_id=self.user, _quantity=500)
+        )
+
+    def test_sqlite_pragmas(self):
+        """Ensure that the sqlite pragmas are applied to the connections.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @override_settings(DATABASE_STATEMENT_TIMEOUTS={
+        'default': None, 'RecordListCreate': 1e-6,
+    })
+    def test_statement_timeout(self):
+        """Ensure that the statements of a view running past its timeout
+        are interrupted, with a service unavailable status code, while the
+        other views aren't limited.
+        """
+        # Scans the records, the messages aren't indexed.
+        resp = self.client.get('/api/records/?message=missing')
+
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('detail', resp.json())
+
+        record = Record.objects.first()
+        resp = self.client.get('/api/records/{}/'.format(record.pk))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        # The connection is still usable.
+        self.assertEqual(Record.objects.count(), 500)
+
+    def test_postgres_statement_timeout(self):
+        """Ensure that the Postgres timeout is set before the first
+        statement, once per session, and set again after a request setting
+        it inside a transaction.
+        """
+        executed = []
+        cursor = SimpleNamespace(
+            cursor=SimpleNamespace(
+                execute=lambda sql, params: executed.append(params)
+            )
+        )
+        session = SimpleNamespace(statement_timeout=None)
+        context = {'connection': session, 'cursor': cursor}
+
+        def run_request(in_atomic_block):
+            session.in_atomic_block = in_atomic_block
+            timeout = db.PostgresStatementTimeout(
+                SimpleNamespace(statement_timeout=5000)
+            )
+            timeout(lambda *args: None, 'SELECT 1', None, False, context)
+            timeout.finish(session)
+
+        run_request(False)
+        run_request(False)
+        self.assertEqual(executed, [[5000]])
+        self.assertEqual(session.statement_timeout, 5000)
+
+        # Set inside a transaction, which may be rolled back.
+        session.statement_timeout = 1000
+        run_request(True)
+        self.assertEqual(executed, [[5000], [5000]])
+        self.assertIsNone(session.statement_timeout)
+
+
+class TestDatabaseHealthChecks(TransactionTestCase):
+    @override_settings(DATABASE_HEALTH_CHECK_INTERVAL=60)
+    def test_health_check_interval(self):
+        """Ensure that a persistent connection is checked again only after
+        the health check interval.
+        """
+        connection.ensure_connection()
+        connection.health_checked = 0
+        db.check_connections()
+
+        checked = connection.health_checked
+        self.assertGreater(checked, 0)
+        db.check_connections()
+        self.assertEqual(connection.health_checked, checked)
@@ -0,0 +1,131 @@
+"""Hot and cold tiers of the records.
+
+Archived records are moved by the `move_archived` command from the
+records table into the compact ArchivedRecord table, so the records
+table and its indexes only keep the records still being worked on. The
+records list reads both tables through TieredQuerySet, which merges their
+ordered rows, so the move is transparent to the clients.
+"""
+import heapq
+from datetime import timedelta
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_generation
+from .models import ArchivedRecord, Record
+
+COLUMNS = [
+    field.attname for field in ArchivedRecord._meta.concrete_fields
+]
+
+
+class TieredQuerySet:
+    """Read only union of querysets over tables with the same columns,
+    each one filtered and ordered on its own and merged on reading.
+
+    Supports the chaining used by the records list, the pagination and
+    the export: ordering by the same direction on every field, slicing
+    from the start, counting and iterating.
+    """
+
+    def __init__(self, querysets, ordering=()):
+        self.querysets = list(querysets)
+        self.ordering = tuple(ordering)
+
+    def _chain(self, method, *args, **kwargs):
+        return TieredQuerySet(
+            [getattr(qs, method)(*args, **kwargs) for qs in self.querysets],
+            self.ordering
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain('exclude', *args, **kwargs)
+
+    def values_list(self, *fields, **kwargs):
+        return self._chain('values_list', *fields, **kwargs)
+
+    def order_by(self, *ordering):
+        descending = {name.startswith('-') for name in ordering}
+        if len(descending) > 1:
+            raise ValueError('Mixed ordering directions are not supported.')
+        tiered = self._chain('order_by', *ordering)
+        tiered.ordering = tuple(ordering)
+        return tiered
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def _merge(self, iterables):
+        if not self.ordering:
+            return heapq.merge(*iterables, key=lambda row: 0)
+        names = [name.lstrip('-') for name in self.ordering]
+        return heapq.merge(
+            *iterables,
+            key=attrgetter(*names),
+            reverse=self.ordering[0].startswith('-')
+        )
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.start or key.step \
+                or key.stop is None:
+            raise TypeError('Only slices from the start are supported.')
+        rows = self._merge([qs[:key.stop] for qs in self.querysets])
+        return list(islice(rows, key.stop))
+
+    def iterator(self, chunk_size=2000):
+        return self._merge([
+            qs.iterator(chunk_size=chunk_size) for qs in self.querysets
+        ])
+
+    def __iter__(self):
+        return iter(self._merge(self.querysets))
+
+
+def move_archived(batch_size, min_age=0):
+    """Moves the archived records, archived at least `min_age` days ago
+    by their date, from the records table to the cold table in
+    transactions of `batch_size` records. Returns the number of moved
+    records.
+    """
+    archived = Record.objects.filter(is_archived=True)
+    if min_age:
+        archived = archived.filter(
+            date__lt=timezone.now() - timedelta(days=min_age)
+        )
+    archived = archived.order_by('id')
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(archived.values_list(*COLUMNS)[:batch_size])
+            if not rows:
+                return moved
+            cold = [ArchivedRecord(**dict(zip(COLUMNS, row))) for row in rows]
+            ArchivedRecord.objects.bulk_create(cold, batch_size=min(
+                settings.RECORDS_BULK_BATCH_SIZE,
+                connection.ops.bulk_batch_size(COLUMNS, cold)
+            ))
+            Record.objects.filter(id__in=[row[0] for row in rows]).delete()
+            bump_generation()
+        moved += len(rows)
+
+
+def restore_archived(archived):
+    """Moves an unarchived record of the cold table back to the records
+    table, keeping its id. Returns the record.
+    """
+    with transaction.atomic():
+        record = Record(**{
+            column: getattr(archived, column) for column in COLUMNS
+        })
+        record.save(force_insert=True)
+        archived.delete()
+        bump_generation()
+    return record
@@ -1,10 +1,16 @@
-from django.urls import path
+from django.urls import path, re_path
 
 from rest_framework.authtoken.views import obtain_auth_token
 
 from .views import (
+    RecordBulkAction,
+    RecordBulkCreate,
+    RecordBulkJobRetrieve,
+    RecordExport,
     RecordListCreate,
     RecordRetrieveUpdateDestroy,
+    RecordStatsView,
+    RecordTail,
     UserListCreateView,
     UserRetrieveDestroyView,
 )
@@ -27,6 +33,36 @@ urlpatterns = [
         RecordListCreate.as_view(),
         name='records-list-create'
     ),
+    path(
+        'records/bulk/',
+        RecordBulkCreate.as_view(),
+        name='records-bulk-create'
+    ),
+    re_path(
+        r'^records/bulk/(?P<action>archive|delete)/$',
+        RecordBulkAction.as_view(),
+        name='records-bulk-action'
+    ),
+    path(
+        'records/bulk/jobs/<int:pk>/',
+        RecordBulkJobRetrieve.as_view(),
+        name='records-bulk-job'
+    ),
+    path(
+        'records/stats/',
+        RecordStatsView.as_view(),
+        name='records-stats'
+    ),
+    path(
+        'records/tail/',
+        RecordTail.as_view(),
+        name='records-tail'
+    ),
+    re_path(
+        r'^records/export/(?P<fmt>ndjson|csv)/$',
+        RecordExport.as_view(),
+        name='records-export'
+    ),
     path(
         'records/<int:pk>/',
         RecordRetrieveUpdateDestroy.as_view(),
@@ -1,23 +1,86 @@
+import copy
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django_filters import rest_framework as rest_filters
 
-from rest_framework import generics, filters
-from rest_framework.authentication import TokenAuthentication
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.serializers import DateTimeField
+from rest_framework.settings import api_settings
 
-from .models import Record
-from .serializers import UserModelSerializer, RecordModelSerializer
+from .authentication import CachedTokenAuthentication
+from .bulk import count_action, run_action
+from .caching import bump_generation, cached_response
+from .export import CONTENT_TYPES, export_records, gzip_stream
+from .filters import RecordFilterSet, RecordSearchFilter
+from .metrics import CONTENT_TYPE, REGISTRY, SERIALIZER_SECONDS
+from .ingest import bulk_ingest, ingest_record
+from .middleware import accepted_encodings, coding_quality
+from .models import ArchivedRecord, Record, RecordBulkJob, RecordRollup
+from .pagination import RecordKeysetPagination, UserCursorPagination
+from .parsers import MessagePackParser, NDJSONParser
+from .rollups import update_rollups
+from .serializers import (
+    RecordBulkJobSerializer,
+    RecordBulkSerializer,
+    RecordFastSerializer,
+    RecordListQuerySerializer,
+    RecordModelSerializer,
+    RecordStatsQuerySerializer,
+    RecordTailQuerySerializer,
+    UserListQuerySerializer,
+    UserModelSerializer,
+    UserRecordStatsSerializer,
+    annotate_record_stats,
+)
+from .spool import get_spool
+from .tail import event_stream
+from .tiers import TieredQuerySet, restore_archived
 
 
 class UserListCreateView(generics.ListCreateAPIView):
     """Handles get user list and post to create user.
 
     Authentication and token are mandatory.
+    Users are paginated by id, following the cursor links. With
+    `include=record_stats` each user has the number of its records by
+    level and the date of its last error.
     """
     queryset = User.objects.all()
     serializer_class = UserModelSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = UserCursorPagination
+
+    def get_includes(self):
+        if self.request.method != 'GET':
+            return []
+        serializer = UserListQuerySerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data.get('include', [])
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if 'record_stats' in self.get_includes():
+            queryset = annotate_record_stats(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if 'record_stats' in self.get_includes():
+            return UserRecordStatsSerializer
+        return super().get_serializer_class()
 
 
 class UserRetrieveDestroyView(generics.RetrieveDestroyAPIView):
@@ -27,23 +90,99 @@ class UserRetrieveDestroyView(generics.RetrieveDestroyAPIView):
     """
     queryset = User.objects.all()
     serializer_class = UserModelSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
 
-class RecordListCreate(generics.ListCreateAPIView):
+class RecordFiltersMixin:
+    """Filters and search of the records list, shared by the views
+    working on filtered sets of records.
+    """
+    filter_backends = [rest_filters.DjangoFilterBackend, RecordSearchFilter]
+    filterset_class = RecordFilterSet
+    search_fields = ['message']
+
+    def get_tiered_queryset(self):
+        """Filtered records of the records table and, unless only the
+        unarchived records are requested, of the archived records table.
+        """
+        querysets = [self.get_queryset()]
+        archived = self.request.query_params.get('is_archived', '')
+        if archived.lower() not in ('false', '0'):
+            querysets.append(ArchivedRecord.objects.all())
+        return TieredQuerySet(
+            self.filter_queryset(queryset) for queryset in querysets
+        )
+
+
+class RecordListCreate(RecordFiltersMixin, generics.ListCreateAPIView):
     """Handles get record list and post to create record.
 
     Authentication and token are mandatory.
     Filters and search are enabled.
+    Records are paginated newest first, following the cursor links.
+    Archived records moved to the cold table are listed as well.
+    Responses are cached, with an ETag to revalidate them.
+    `fields` narrows the columns read and serialized, `compact=true`
+    gives each record as a list of values, in the order of `fields`.
     """
     queryset = Record.objects.all()
     serializer_class = RecordModelSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [rest_filters.DjangoFilterBackend, filters.SearchFilter]
-    filter_fields = ['environment', 'level', 'message', 'origin']
-    search_fields = ['message']
+    pagination_class = RecordKeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        """Lists the records through the fast read serializer, caching
+        the response.
+        """
+        return cached_response(request, self._list)
+
+    def _list(self):
+        params = RecordListQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        compact = params.validated_data['compact']
+
+        # The pagination reads the position of the rows.
+        serializer = RecordFastSerializer(
+            params.validated_data.get('fields'), extra_fields=['date', 'id']
+        )
+        queryset = self.get_tiered_queryset()
+        page = self.paginate_queryset(serializer.get_queryset(queryset))
+        with SERIALIZER_SECONDS.labels('RecordFastSerializer').time():
+            if compact:
+                data = serializer.serialize_compact(page)
+            else:
+                data = serializer.serialize(page)
+        response = self.get_paginated_response(data)
+        if compact:
+            response.data['fields'] = serializer.fields
+            response.data.move_to_end('results')
+        return response
+
+    def create(self, request, *args, **kwargs):
+        """Creates the record or, with deduplication enabled, merges it
+        into a recent record of the same kind, answering with the merged
+        record and an OK status code.
+
+        With the write-behind mode on, the record is queued on the spool
+        and the answer has an accepted status code.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if settings.RECORDS_WRITE_BEHIND:
+            get_spool().put([serializer.validated_data])
+            return Response({'queued': 1}, status=status.HTTP_202_ACCEPTED)
+
+        record, created = ingest_record(serializer.validated_data)
+
+        serializer.instance = record
+        if not created:
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        )
 
 
 class RecordRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
@@ -51,8 +190,349 @@ class RecordRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     record.
 
     Authentication and token are mandatory.
+    Records moved to the cold table are found there too, unarchiving one
+    moves it back to the records table.
+    Responses are cached, with an ETag to revalidate them.
     """
     queryset = Record.objects.all()
     serializer_class = RecordModelSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        """Gets the record, looking for it among the archived records of
+        the cold table when it isn't on the records table.
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            return get_object_or_404(
+                ArchivedRecord, pk=self.kwargs[self.lookup_field]
+            )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Gets the record. The response is cached.
+        """
+        return cached_response(
+            request, lambda: self._retrieve(request, *args, **kwargs)
+        )
+
+    def _retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        previous = copy.copy(serializer.instance)
+        with transaction.atomic():
+            record = serializer.save()
+            if isinstance(record, ArchivedRecord):
+                if not record.is_archived:
+                    serializer.instance = restore_archived(record)
+                bump_generation()
+            update_rollups([record], [previous])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            update_rollups([], [instance])
+        bump_generation()
+
+
+class RecordBulkCreate(generics.GenericAPIView):
+    """Handles post of a batch of records, sent as a JSON array, as
+    newline delimited JSON or as a MessagePack array.
+
+    Authentication and token are mandatory.
+    Invalid items are reported by their position in the batch and don't
+    prevent the valid ones from being created, or queued on the spool
+    with the write-behind mode on.
+    """
+    queryset = Record.objects.all()
+    serializer_class = RecordBulkSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser, MessagePackParser]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['users'] = User.objects.in_bulk(self._user_ids())
+        return context
+
+    def _user_ids(self):
+        ids = set()
+        for item in self.request.data:
+            try:
+                ids.add(int(item.get('user_id')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        return ids
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise ParseError('Expected a list of records.')
+        if len(items) > settings.RECORDS_BULK_MAX_ITEMS:
+            raise ParseError('A batch accepts at most {} records.'.format(
+                settings.RECORDS_BULK_MAX_ITEMS
+            ))
+
+        context = self.get_serializer_context()
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            serializer = self.serializer_class(data=item, context=context)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        if settings.RECORDS_WRITE_BEHIND:
+            get_spool().put(valid)
+            resp_status = (
+                status.HTTP_202_ACCEPTED if valid or not items
+                else status.HTTP_400_BAD_REQUEST
+            )
+            return Response(
+                {'queued': len(valid), 'errors': errors},
+                status=resp_status
+            )
+
+        created, merged = bulk_ingest(valid)
+        resp_status = (
+            status.HTTP_201_CREATED if valid or not items
+            else status.HTTP_400_BAD_REQUEST
+        )
+        return Response(
+            {'created': len(created), 'merged': merged, 'errors': errors},
+            status=resp_status
+        )
+
+
+class RecordBulkAction(RecordFiltersMixin, generics.GenericAPIView):
+    """Handles post to archive or delete all the records matching the
+    filters and search of the records list.
+
+    Authentication and token are mandatory.
+    Records are changed in batches, answering with the number of affected
+    records. Large sets, or any set with `background=true`, are left to a
+    background job whose progress is served by the jobs endpoint.
+    Deleting without filters or search requires `all=true`.
+    """
+    queryset = Record.objects.all()
+    serializer_class = RecordBulkJobSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def _is_filtered(self):
+        names = list(self.filterset_class.base_filters)
+        names.append(api_settings.SEARCH_PARAM)
+        return any(self.request.query_params.get(name) for name in names)
+
+    def _flag(self, name):
+        value = self.request.query_params.get(name, '')
+        return value.lower() in ('1', 'true')
+
+    def _job_params(self):
+        """Query string of the job, with the relative `last` filter turned
+        into an absolute `date__gte`, so the job acts on the records
+        matching when it was enqueued rather than when it runs.
+        """
+        params = self.request.query_params.copy()
+        last = params.pop('last', [''])[-1]
+        if last:
+            filters = self.filterset_class.base_filters
+            since = timezone.now() - filters['last'].field.clean(last)
+            given = params.get('date__gte')
+            if given:
+                since = max(since, filters['date__gte'].field.clean(given))
+            params['date__gte'] = since.isoformat()
+        return params.urlencode()
+
+    def post(self, request, action, *args, **kwargs):
+        unfiltered = not (self._is_filtered() or self._flag('all'))
+        if action == 'delete' and unfiltered:
+            raise ParseError(
+                'Deleting all the records requires the all=true parameter.'
+            )
+
+        records = self.get_tiered_queryset()
+        threshold = settings.RECORDS_BULK_JOB_THRESHOLD
+        background = self._flag('background') or count_action(
+            action, records, threshold + 1
+        ) > threshold
+
+        if background:
+            job = RecordBulkJob.objects.create(
+                action=action,
+                params=self._job_params(),
+                user_id=request.user
+            )
+            serializer = self.get_serializer(job)
+            headers = {
+                'Location': reverse('api:records-bulk-job', args=[job.pk])
+            }
+            return Response(
+                serializer.data,
+                status=status.HTTP_202_ACCEPTED,
+                headers=headers
+            )
+
+        affected = run_action(
+            action, records, settings.RECORDS_BULK_ACTION_BATCH_SIZE
+        )
+        return Response({'affected': affected})
+
+
+class RecordBulkJobRetrieve(generics.RetrieveAPIView):
+    """Handles get of a bulk job, following its progress.
+
+    Authentication and token are mandatory.
+    """
+    queryset = RecordBulkJob.objects.all()
+    serializer_class = RecordBulkJobSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+
+class RecordStatsView(generics.GenericAPIView):
+    """Handles get of the number of records and sum of their events by
+    time bucket, grouped by level, environment and origin.
+
+    Authentication and token are mandatory.
+    Served from the rollups kept up to date on ingestion, update and
+    delete.
+    """
+    queryset = RecordRollup.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = RecordStatsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        group_fields = RecordStatsQuerySerializer.GROUP_FIELDS
+        group_by = params.get('group_by', group_fields)
+        queryset = self.get_queryset().filter(bucket_size=params['bucket'])
+        for field in group_fields:
+            if field in params:
+                queryset = queryset.filter(**{field: params[field]})
+        if 'since' in params:
+            queryset = queryset.filter(bucket__gte=params['since'])
+        if 'until' in params:
+            queryset = queryset.filter(bucket__lte=params['until'])
+
+        rows = queryset.values('bucket', *group_by).annotate(
+            records=Sum('records'), events=Sum('events')
+        ).order_by('bucket', *group_by)
+
+        date_field = DateTimeField()
+        results = [
+            dict(row, bucket=date_field.to_representation(row['bucket']))
+            for row in rows
+        ]
+        return Response({
+            'bucket': params['bucket'],
+            'group_by': group_by,
+            'results': results,
+        })
+
+
+class RecordExport(RecordFiltersMixin, generics.GenericAPIView):
+    """Handles get of all the records, oldest first, streamed as NDJSON or
+    CSV.
+
+    Authentication and token are mandatory.
+    Accepts the same filters and search of the records list. The export
+    is compressed with gzip when the client accepts it.
+    """
+    queryset = Record.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The export isn't rendered by the renderers, any Accept header
+        # is fine.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, fmt, *args, **kwargs):
+        queryset = self.get_tiered_queryset()
+        chunks = export_records(
+            queryset, fmt, settings.RECORDS_EXPORT_CHUNK_SIZE
+        )
+
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        gzipped = coding_quality(accepted, 'gzip') > 0
+        if gzipped:
+            chunks = gzip_stream(chunks)
+
+        response = StreamingHttpResponse(
+            chunks, content_type=CONTENT_TYPES[fmt]
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="records.{}"'.format(fmt)
+        )
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+class RecordTail(generics.GenericAPIView):
+    """Handles get of a live tail of the ingested records, streamed as
+    Server-Sent Events.
+
+    Authentication and token are mandatory.
+    Filtered by environment, level and origin. Reconnecting clients get
+    the records missed since the Last-Event-ID header. Each viewer holds
+    a worker thread, past RECORDS_TAIL_MAX_SUBSCRIBERS viewers the tail
+    answers with a service unavailable status code.
+    """
+    queryset = Record.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The events aren't rendered by the renderers, any Accept header
+        # is fine.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, *args, **kwargs):
+        if not settings.RECORDS_TAIL_BACKEND:
+            raise NotFound('The live tail is disabled.')
+
+        serializer = RecordTailQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        stream = event_stream(
+            serializer.validated_data, request.META.get('HTTP_LAST_EVENT_ID')
+        )
+        if stream is None:
+            return Response(
+                {'detail': 'Too many live tail viewers, try again later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        response = StreamingHttpResponse(
+            stream, content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Tells nginx not to buffer the events.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def metrics(request):
+    """Serves the metrics of the process in the Prometheus text format.
+
+    Requires the METRICS_TOKEN bearer token when the setting is set.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and not constant_time_compare(
+        authorization, 'Bearer {}'.format(token)
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(REGISTRY.expose(), content_type=CONTENT_TYPE)
@@ -0,0 +1,88 @@
+"""Queries and latency per request with and without the token cache.
+
+Runs the same authenticated requests with DRF's TokenAuthentication and
+with CachedTokenAuthentication on the api views.
+
+    python benchmarks/auth_queries.py --requests 200
+"""
+import argparse
+import json
+
+from common import (
+    benchmark_user,
+    create_database,
+    destroy_database,
+    measure,
+    seed_records,
+    setup_django,
+)
+
+ENDPOINTS = ['/api/users/', '/api/records/?page_size=10']
+
+
+def run(requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+
+    from api import views
+    from api.authentication import CachedTokenAuthentication, token_cache
+
+    user = benchmark_user()
+    seed_records(100, user)
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    view_classes = [
+        value for value in vars(views).values()
+        if getattr(value, 'authentication_classes', None)
+        == [CachedTokenAuthentication]
+    ]
+
+    results = {}
+    for authentication in [TokenAuthentication, CachedTokenAuthentication]:
+        for view_class in view_classes:
+            view_class.authentication_classes = [authentication]
+        token_cache.clear()
+
+        result = results[authentication.__name__] = {}
+        for url in ENDPOINTS:
+            client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(requests):
+                    client.get(url)
+            result[url] = {
+                'queries_per_request': len(queries) / requests,
+                'latency': measure(lambda: client.get(url), requests),
+            }
+
+    for view_class in view_classes:
+        view_class.authentication_classes = [CachedTokenAuthentication]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sqlite-file')
+    parser.add_argument('--output', help='Writes the results as JSON.')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database(args.sqlite_file)
+    try:
+        results = run(args.requests)
+    finally:
+        destroy_database(old_name)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
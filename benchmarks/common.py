@@ -0,0 +1,129 @@
+"""Helpers shared by the benchmark scripts.
+
+The scripts run against a throwaway database created the same way the
+test runner does, so they never touch the configured database.
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEVELS = ['error', 'info', 'debug', 'warning', 'critical']
+ENVIRONMENTS = ['env-{:02d}'.format(i) for i in range(20)]
+ORIGINS = ['10.0.{}.{}'.format(i // 16, i % 16 + 1) for i in range(256)]
+
+
+def setup_django():
+    """Configures the project settings and loads the apps.
+    """
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'errorscenter.settings')
+    os.environ.setdefault('ACELERADEV_FINAL_PROJ_KEY', 'benchmark')
+
+    import django
+    django.setup()
+
+
+def create_database(sqlite_file=None):
+    """Creates and migrates the benchmark database.
+
+    On sqlite the database is kept on `sqlite_file`, a temporary file by
+    default, because big data volumes don't fit the in-memory database
+    used by the tests. Returns the name of the original database, to be
+    given to `destroy_database`.
+    """
+    from django.db import connection
+
+    if connection.vendor == 'sqlite':
+        if sqlite_file is None:
+            sqlite_file = os.path.join(
+                tempfile.mkdtemp(prefix='errorscenter-bench-'), 'db.sqlite3'
+            )
+        connection.settings_dict['TEST']['NAME'] = sqlite_file
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    return old_name
+
+
+def destroy_database(old_name):
+    from django.db import connection
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def benchmark_user():
+    from django.contrib.auth.models import User
+
+    user, _ = User.objects.get_or_create(username='benchmark')
+    return user
+
+
+def make_records(count, user, seed=0):
+    """Yields `count` unsaved records spread over environments, levels,
+    origins and the last 90 days.
+    """
+    from django.utils import timezone
+
+    from api.models import Record
+
+    rand = random.Random(seed)
+    now = timezone.now()
+    for i in range(count):
+        yield Record(
+            environment=rand.choice(ENVIRONMENTS),
+            level=rand.choice(LEVELS),
+            message='benchmark message {}'.format(rand.randrange(10000)),
+            origin=rand.choice(ORIGINS),
+            date=now - timedelta(seconds=rand.randrange(90 * 24 * 3600)),
+            is_archived=rand.random() < 0.1,
+            events=rand.randrange(1, 100),
+            user_id=user,
+        )
+
+
+def seed_records(count, user, batch_size=10000, seed=0):
+    """Inserts `count` records, committing every `batch_size` rows.
+    """
+    from api.ingest import bulk_ingest
+
+    records = make_records(count, user, seed=seed)
+    created = 0
+    while created < count:
+        batch = [
+            record for _, record in
+            zip(range(min(batch_size, count - created)), records)
+        ]
+        bulk_ingest(batch)
+        created += len(batch)
+
+
+def percentile(timings, fraction):
+    """Nearest-rank percentile of the sorted `timings`, rounded.
+    """
+    index = max(0, math.ceil(fraction * len(timings)) - 1)
+    return round(timings[min(index, len(timings) - 1)], 3)
+
+
+def measure(func, repeat=20):
+    """Runs `func` `repeat` times and returns its latency summary in
+    milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'min_ms': round(timings[0], 3),
+        'p50_ms': percentile(timings, 0.50),
+        'p95_ms': percentile(timings, 0.95),
+        'max_ms': round(timings[-1], 3),
+    }
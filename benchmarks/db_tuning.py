@@ -0,0 +1,136 @@
+"""Throughput of a mixed read and write load with and without the
+database tuning.
+
+Seeds a throwaway database with --records records and runs the mixed
+workload of loadtest.py, --write-ratio of the requests ingesting records
+and the others listing or reading them, on gunicorn at each concurrency
+level, first with the settings of benchmarks/untuned_settings.py, a
+connection per request and the sqlite rollback journal, then with the
+production settings, persistent connections and WAL. The lists bypass
+the responses cache.
+
+    python benchmarks/db_tuning.py --records 100000 --concurrency 1,8,32
+
+Runs on sqlite by default, set DATABASE_URL to run on Postgres, see
+loadtest.py.
+"""
+import argparse
+import json
+import os
+import sys
+
+from common import create_database, destroy_database, setup_django
+from loadtest import (
+    commit,
+    free_port,
+    prepare,
+    run_level,
+    start_gunicorn,
+)
+
+CONFIGURATIONS = [
+    # Name, settings module and sqlite journal mode.
+    ('untuned', 'benchmarks.untuned_settings', 'delete'),
+    ('tuned', 'errorscenter.settings_prod', 'wal'),
+]
+
+
+def set_journal_mode(mode):
+    """Sets the journal mode of the sqlite database up front, it is kept
+    in the database file, and closes the connection of the benchmark.
+    """
+    from django.db import connection
+
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = {}'.format(mode))
+    connection.close()
+
+
+def run(args):
+    from django.db import connection
+
+    token, context, url = prepare(args.records)
+    context['write_ratio'] = args.write_ratio
+
+    results = {}
+    for name, settings_module, journal_mode in CONFIGURATIONS:
+        set_journal_mode(journal_mode)
+        port = free_port()
+        server = start_gunicorn(
+            url, port, args.workers, args.threads, settings_module
+        )
+        try:
+            results[name] = {}
+            for concurrency in args.concurrency:
+                results[name][str(concurrency)] = run_level(
+                    port, token, 'mixed', context, concurrency,
+                    args.duration, bust_cache=True
+                )
+                print(name, concurrency, results[name][str(concurrency)],
+                      file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait()
+
+    speedup = {
+        concurrency: round(
+            results['tuned'][concurrency]['rps']
+            / results['untuned'][concurrency]['rps'], 2
+        )
+        for concurrency in results['tuned']
+        if results['untuned'][concurrency].get('rps')
+        and results['tuned'][concurrency].get('rps')
+    }
+    return {
+        'commit': commit(),
+        'database': connection.vendor,
+        'records': args.records,
+        'write_ratio': args.write_ratio,
+        'workers': args.workers,
+        'threads': args.threads,
+        'duration_s': args.duration,
+        'results': results,
+        'rps_speedup': speedup,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument(
+        '--concurrency',
+        type=lambda value: [int(level) for level in value.split(',')],
+        default=[1, 8, 32],
+    )
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument(
+        '--duration', type=float, default=10,
+        help='Seconds each configuration runs at each concurrency level.'
+    )
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sqlite-file')
+    parser.add_argument('--output', help='Writes the results as JSON.')
+    args = parser.parse_args()
+
+    if os.environ.get('DATABASE_URL'):
+        os.environ.setdefault(
+            'DJANGO_SETTINGS_MODULE', 'errorscenter.settings_prod'
+        )
+    setup_django()
+    old_name = create_database(args.sqlite_file)
+    try:
+        results = run(args)
+    finally:
+        destroy_database(old_name)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
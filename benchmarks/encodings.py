@@ -0,0 +1,133 @@
+"""Bytes on the wire and CPU of the JSON and MessagePack encodings.
+
+Serializes pages of --page-size records, as objects and as compact
+lists, and renders and parses them with the JSON and the MessagePack
+renderer and parser, uncompressed and compressed by the compression
+middleware with each content coding available (gzip, and brotli when
+installed), reporting the size of each page and the best time to
+encode and decode it.
+
+    python benchmarks/encodings.py --page-size 1000
+"""
+import argparse
+import io
+import json
+import time
+
+from common import (
+    benchmark_user,
+    create_database,
+    destroy_database,
+    seed_records,
+    setup_django,
+)
+
+
+def best_ms(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 3)
+
+
+def decompressor(coding):
+    if coding == 'gzip':
+        import gzip
+        return gzip.decompress
+    import brotli
+    return brotli.decompress
+
+
+def measure(data, renderer, parser, repeat):
+    from api.middleware import compressors
+
+    body = renderer.render(data)
+    assert parser.parse(io.BytesIO(body)) == json.loads(json.dumps(data))
+    results = {
+        'identity': {
+            'bytes': len(body),
+            'encode_ms': best_ms(lambda: renderer.render(data), repeat),
+            'decode_ms': best_ms(
+                lambda: parser.parse(io.BytesIO(body)), repeat
+            ),
+        },
+    }
+    for coding, compress in compressors():
+        decompress = decompressor(coding)
+        compressed = compress(body)
+        results[coding] = {
+            'bytes': len(compressed),
+            'encode_ms': best_ms(
+                lambda: compress(renderer.render(data)), repeat
+            ),
+            'decode_ms': best_ms(
+                lambda: parser.parse(io.BytesIO(decompress(compressed))),
+                repeat
+            ),
+        }
+    return results
+
+
+def run(page_size, repeat):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from api.models import Record
+    from api.parsers import MessagePackParser
+    from api.renderers import MessagePackRenderer
+    from api.serializers import RecordFastSerializer
+
+    seed_records(page_size, benchmark_user())
+    queryset = Record.objects.order_by('-date', '-id')[:page_size]
+    serializer = RecordFastSerializer()
+    rows = list(serializer.get_queryset(queryset))
+    pages = {
+        'objects': {'results': serializer.serialize(rows)},
+        'compact': {
+            'fields': serializer.fields,
+            'results': serializer.serialize_compact(rows),
+        },
+    }
+    encodings = {
+        'json': (JSONRenderer(), JSONParser()),
+        'msgpack': (MessagePackRenderer(), MessagePackParser()),
+    }
+
+    return {
+        'page_size': page_size,
+        'pages': {
+            name: {
+                encoding: measure(data, renderer, parser, repeat)
+                for encoding, (renderer, parser) in encodings.items()
+            }
+            for name, data in pages.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sqlite-file')
+    parser.add_argument('--output', help='Writes the results as JSON.')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database(args.sqlite_file)
+    try:
+        results = run(args.page_size, args.repeat)
+    finally:
+        destroy_database(old_name)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Records list latency as the table grows.
+
+Seeds the table up to each requested size and measures the list endpoint
+and the queries behind the dashboards. Run with --without-indexes to get
+the numbers for the table without the Record indexes. The responses
+cache is off, the repeated requests would be cache hits.
+
+    python benchmarks/list_latency.py --sizes 100000,1000000,10000000
+"""
+import argparse
+import json
+
+from common import (
+    benchmark_user,
+    create_database,
+    destroy_database,
+    measure,
+    seed_records,
+    setup_django,
+)
+
+ENDPOINT_FILTERS = {
+    'env_level_origin': {
+        'environment': 'env-03',
+        'level': 'error',
+        'origin': '10.0.1.1',
+    },
+    'origin': {'origin': '10.0.2.5'},
+    'search': {'search': '1234'},
+}
+
+QUERY_FILTERS = {
+    'env_level_latest': {'environment': 'env-03', 'level': 'error'},
+    'level_latest': {'level': 'critical'},
+    'archived_latest': {'is_archived': True},
+    'latest': {},
+}
+
+
+def drop_indexes():
+    from django.db import connection
+
+    from api.models import Record
+
+    with connection.schema_editor() as editor:
+        for index in Record._meta.indexes:
+            editor.remove_index(Record, index)
+
+
+def run(sizes, repeat, page_size):
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    from api.models import Record
+
+    user = benchmark_user()
+    client = APIClient()
+    client.force_authenticate(user)
+
+    results = []
+    seeded = 0
+    for size in sizes:
+        seed_records(size - seeded, user, seed=seeded)
+        seeded = size
+
+        result = {'rows': size, 'endpoint': {}, 'query': {}}
+        with override_settings(RECORDS_CACHE_ALIAS=None):
+            for name, params in ENDPOINT_FILTERS.items():
+                result['endpoint'][name] = measure(
+                    lambda: client.get('/api/records/', params), repeat
+                )
+        for name, params in QUERY_FILTERS.items():
+            queryset = Record.objects.filter(**params).order_by('-date')
+            result['query'][name] = measure(
+                lambda: list(queryset[:page_size]), repeat
+            )
+        results.append(result)
+        print(json.dumps(result), flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000,10000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--without-indexes', action='store_true')
+    parser.add_argument('--sqlite-file')
+    parser.add_argument('--output', help='Writes the results as JSON.')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database(args.sqlite_file)
+    try:
+        if args.without_indexes:
+            drop_indexes()
+        sizes = sorted(int(size) for size in args.sizes.split(','))
+        results = run(sizes, args.repeat, args.page_size)
+    finally:
+        destroy_database(old_name)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'indexes': not args.without_indexes,
+                'results': results,
+            }, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
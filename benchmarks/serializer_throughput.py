@@ -0,0 +1,143 @@
+"""Records serialized per second by the model and the fast serializers.
+
+Serializes pages of --page-size records, measuring the fetch and the
+serialization together and the serialization alone. The fast serializer
+is measured with all the fields and with the --fields projection, as
+objects and as compact lists, along with the JSON size of each page.
+
+    python benchmarks/serializer_throughput.py --page-size 10000
+"""
+import argparse
+import json
+import time
+
+from common import (
+    benchmark_user,
+    create_database,
+    destroy_database,
+    seed_records,
+    setup_django,
+)
+
+
+def rate(func, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(rows / best)
+
+
+def projection(serializer, queryset, rows, page_size, repeat, compact):
+    serialize = serializer.serialize_compact if compact \
+        else serializer.serialize
+    return {
+        'fetch_and_serialize': rate(
+            lambda: serialize(serializer.get_queryset(queryset)),
+            page_size, repeat
+        ),
+        'serialize': rate(lambda: serialize(rows), page_size, repeat),
+    }
+
+
+def json_bytes(serialize, rows):
+    return len(json.dumps(serialize(rows)))
+
+
+def run(page_size, repeat, fields):
+    from api.models import Record
+    from api.serializers import RecordFastSerializer, RecordModelSerializer
+
+    seed_records(page_size, benchmark_user())
+    queryset = Record.objects.order_by('-date', '-id')[:page_size]
+    fast = RecordFastSerializer()
+
+    records = list(queryset)
+    rows = list(fast.get_queryset(queryset))
+    assert fast.serialize(rows) == RecordModelSerializer(
+        records, many=True
+    ).data
+    narrow = RecordFastSerializer(fields, extra_fields=['date', 'id'])
+    narrow_rows = list(narrow.get_queryset(queryset))
+
+    return {
+        'page_size': page_size,
+        'rows_per_second': {
+            'model_serializer': {
+                'fetch_and_serialize': rate(
+                    lambda: RecordModelSerializer(
+                        list(queryset), many=True
+                    ).data,
+                    page_size, repeat
+                ),
+                'serialize': rate(
+                    lambda: RecordModelSerializer(records, many=True).data,
+                    page_size, repeat
+                ),
+            },
+            'fast_serializer': {
+                'fetch_and_serialize': rate(
+                    lambda: fast.serialize(fast.get_queryset(queryset)),
+                    page_size, repeat
+                ),
+                'serialize': rate(
+                    lambda: fast.serialize(rows), page_size, repeat
+                ),
+            },
+            'fast_serializer_compact': projection(
+                fast, queryset, rows, page_size, repeat, compact=True
+            ),
+            'fields': projection(
+                narrow, queryset, narrow_rows, page_size, repeat,
+                compact=False
+            ),
+            'fields_compact': projection(
+                narrow, queryset, narrow_rows, page_size, repeat,
+                compact=True
+            ),
+        },
+        'json_bytes': {
+            'fast_serializer': json_bytes(fast.serialize, rows),
+            'fast_serializer_compact': json_bytes(
+                fast.serialize_compact, rows
+            ),
+            'fields': json_bytes(narrow.serialize, narrow_rows),
+            'fields_compact': json_bytes(
+                narrow.serialize_compact, narrow_rows
+            ),
+        },
+        'fields': fields,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--fields',
+        type=lambda value: value.split(','),
+        default=['id', 'date', 'level', 'message'],
+        help='Fields of the projection.'
+    )
+    parser.add_argument('--sqlite-file')
+    parser.add_argument('--output', help='Writes the results as JSON.')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database(args.sqlite_file)
+    try:
+        results = run(args.page_size, args.repeat, args.fields)
+    finally:
+        destroy_database(old_name)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Size of the records table and indexes with the dictionary encoding.
+
+Seeds the records table, where the level is stored as a small integer
+code and the environment as the id of its interned row, copies it to a
+table storing both as strings, like before the encoding, with the same
+indexes, and compares the table and index sizes of both.
+
+    python benchmarks/storage_size.py --records 10000000
+
+On sqlite the sizes come from the dbstat table, on Postgres from the
+relation sizes, adding up the partitions of the records table.
+"""
+import argparse
+import json
+
+from common import (
+    benchmark_user,
+    create_database,
+    destroy_database,
+    seed_records,
+    setup_django,
+)
+
+PLAIN_TABLE = 'benchmark_plain_record'
+
+
+def copy_plain(connection):
+    """Copies the records, with the level and environment decoded, to the
+    plain table and creates the indexes of the records table on it.
+    """
+    from api.models import Record, RecordEnvironment
+
+    table = Record._meta.db_table
+    level = 'CASE r.level {} END'.format(' '.join(
+        "WHEN {} THEN '{}'".format(code, name)
+        for name, code in Record.LEVEL_CODES.items()
+    ))
+    columns = [
+        field.column for field in Record._meta.concrete_fields
+        if field.name not in ('level', 'environment')
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE {plain} AS SELECT {columns}, '
+            'CAST(e.name AS VARCHAR(30)) AS environment, '
+            'CAST({level} AS VARCHAR(10)) AS level '
+            'FROM {table} r JOIN {environments} e '
+            'ON e.id = r.environment'.format(
+                plain=PLAIN_TABLE,
+                columns=', '.join('r.' + column for column in columns),
+                level=level,
+                table=table,
+                environments=RecordEnvironment._meta.db_table,
+            )
+        )
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'ALTER TABLE {} ADD PRIMARY KEY (id, date)'.format(
+                    PLAIN_TABLE
+                )
+            )
+        indexes = [
+            (index.name, index.fields) for index in Record._meta.indexes
+        ]
+        indexes.append(('user_id', ['user_id']))
+        for name, fields in indexes:
+            cursor.execute('CREATE INDEX plain_{} ON {} ({})'.format(
+                name,
+                PLAIN_TABLE,
+                ', '.join(
+                    Record._meta.get_field(field).column for field in fields
+                ),
+            ))
+
+
+def vacuum(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM' if connection.vendor == 'sqlite' else
+                       'VACUUM ANALYZE')
+
+
+def sqlite_sizes(cursor, table):
+    cursor.execute(
+        'SELECT d.name, SUM(d.pgsize) FROM dbstat d '
+        'JOIN sqlite_master m ON m.name = d.name '
+        'WHERE m.tbl_name = %s GROUP BY d.name',
+        [table]
+    )
+    sizes = dict(cursor.fetchall())
+    return sizes.pop(table), sizes
+
+
+def postgres_sizes(cursor, table):
+    # The records table may be partitioned, its own relation is empty.
+    cursor.execute(
+        'SELECT COALESCE(SUM(pg_relation_size(c.oid)), 0) FROM pg_class c '
+        'WHERE c.oid = to_regclass(%s) OR c.oid IN ('
+        'SELECT inhrelid FROM pg_inherits '
+        'WHERE inhparent = to_regclass(%s))',
+        [table, table]
+    )
+    table_size = cursor.fetchone()[0]
+    cursor.execute(
+        'SELECT i.relname, pg_relation_size(i.oid) FROM pg_index x '
+        'JOIN pg_class i ON i.oid = x.indexrelid '
+        'WHERE x.indrelid = to_regclass(%s)',
+        [table]
+    )
+    sizes = dict(cursor.fetchall())
+    cursor.execute(
+        'SELECT parent.relname, SUM(pg_relation_size(child.indexrelid)) '
+        'FROM pg_inherits i '
+        'JOIN pg_class parent ON parent.oid = i.inhparent '
+        'JOIN pg_index child ON child.indexrelid = i.inhrelid '
+        'WHERE parent.relkind = %s GROUP BY parent.relname',
+        ['I']
+    )
+    for name, size in cursor.fetchall():
+        if name in sizes:
+            sizes[name] += size
+    return table_size, sizes
+
+
+def sizes(connection, table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            table_size, indexes = sqlite_sizes(cursor, table)
+        else:
+            table_size, indexes = postgres_sizes(cursor, table)
+    names = {
+        name: name[len('plain_'):] if name.startswith('plain_') else name
+        for name in indexes
+    }
+    # The name of the index of the user foreign key is generated.
+    names.update({
+        name: 'user_id' for name in indexes if '_user_id_' in name
+    })
+    indexes = {names[name]: size for name, size in indexes.items()}
+    return {
+        'table_bytes': int(table_size),
+        'indexes_bytes': int(sum(indexes.values())),
+        'indexes': {name: int(size) for name, size in sorted(indexes.items())},
+    }
+
+
+def run(records):
+    from django.db import connection
+
+    from api.models import Record
+
+    seed_records(records, benchmark_user())
+    copy_plain(connection)
+    vacuum(connection)
+
+    encoded = sizes(connection, Record._meta.db_table)
+    plain = sizes(connection, PLAIN_TABLE)
+    total_encoded = encoded['table_bytes'] + encoded['indexes_bytes']
+    total_plain = plain['table_bytes'] + plain['indexes_bytes']
+    return {
+        'database': connection.vendor,
+        'records': records,
+        'encoded': encoded,
+        'plain': plain,
+        'table_reduction': round(
+            1 - encoded['table_bytes'] / plain['table_bytes'], 3
+        ),
+        'indexes_reduction': round(
+            1 - encoded['indexes_bytes'] / plain['indexes_bytes'], 3
+        ),
+        'total_reduction': round(1 - total_encoded / total_plain, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=10000000)
+    parser.add_argument('--sqlite-file')
+    parser.add_argument('--output', help='Writes the results as JSON.')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database(args.sqlite_file)
+    try:
+        results = run(args.records)
+    finally:
+        destroy_database(old_name)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
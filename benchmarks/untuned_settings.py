@@ -0,0 +1,10 @@
+"""Production settings without the database tuning, the baseline of
+db_tuning.py: a connection per request, no health checks, no sqlite
+pragmas and no statement timeouts.
+"""
+from errorscenter.settings_prod import *  # noqa: F401,F403
+
+DATABASES['default']['CONN_MAX_AGE'] = 0  # noqa: F405
+SQLITE_PRAGMAS = {}
+DATABASE_HEALTH_CHECKS = False
+DATABASE_STATEMENT_TIMEOUTS = {'default': None}
@@ -43,6 +43,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.StatementTimeoutMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,9 +83,61 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Pragmas applied to each new sqlite connection: WAL lets the readers go
+# on during the writes, with NORMAL synchronous commits are only synced
+# at the checkpoints, and the database file is read through a memory map
+# of up to mmap_size bytes.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 268435456,
+}
+
+# Whether the persistent connections are checked, and replaced when
+# closed by the server, at the start of the requests. Costs a round trip
+# on Postgres, so a connection is checked at most once every
+# DATABASE_HEALTH_CHECK_INTERVAL seconds.
+DATABASE_HEALTH_CHECKS = True
+DATABASE_HEALTH_CHECK_INTERVAL = 30
+
+# Milliseconds a statement of each view may run, by the view class name,
+# and of the views not listed under 'default'. None doesn't limit them,
+# like the streamed export and live tail.
+DATABASE_STATEMENT_TIMEOUTS = {
+    'default': 30000,
+    'RecordListCreate': 5000,
+    'RecordStatsView': 10000,
+    'RecordExport': None,
+    'RecordTail': None,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# The records alias keeps the records responses cache and the generation
+# of the records, bumped by every process writing records: the web
+# workers, the spool, syslog and bulk jobs workers and the management
+# commands. It must be shared by all of them, the file based backend
+# shares it among the processes of a host, use Memcached or Redis to
+# share it among hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'records': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'records'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -125,12 +180,132 @@ STATIC_URL = '/static/'
 # rest_framework specific config
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'api.parsers.MessagePackParser',
+    ],
 }
 
+# Responses compression: responses smaller than the number of bytes are
+# sent uncompressed, larger ones with brotli, when installed, or gzip at
+# the level, as accepted by the client.
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+RESPONSE_COMPRESSION_LEVEL = 6
+
+# Users listing
+# Default and maximum number of users on a page of the users list.
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
+
+# Records listing
+# Default and maximum number of records on a page of the records list.
+RECORDS_PAGE_SIZE = 100
+RECORDS_MAX_PAGE_SIZE = 1000
+
+# Number of records counted exactly by the records list, larger counts
+# are estimated by the Postgres planner, or given as a lower bound on
+# other databases. None always counts them all.
+RECORDS_COUNT_THRESHOLD = 10000
+
+# Number of records read from the database and written at a time by the
+# records export.
+RECORDS_EXPORT_CHUNK_SIZE = 2000
+
+# Records ingestion
+# Maximum number of records accepted by a single bulk request.
+RECORDS_BULK_MAX_ITEMS = 10000
+
+# Number of rows sent on each INSERT statement of a bulk creation.
+RECORDS_BULK_BATCH_SIZE = 500
+
+# Number of records archived or deleted per transaction by the bulk
+# actions, and the size of the sets left to a background job run by
+# `manage.py run_bulk_jobs`.
+RECORDS_BULK_ACTION_BATCH_SIZE = 1000
+RECORDS_BULK_JOB_THRESHOLD = 10000
+
+# Records with the same environment, level, origin and message received
+# within this number of seconds are merged, adding up their events.
+# Zero disables the deduplication.
+RECORDS_DEDUP_WINDOW = 0
+
+# Write-behind mode: the records views queue the validated records on a
+# local spool and answer right away, `manage.py drain_spool` stores them.
+RECORDS_WRITE_BEHIND = False
+RECORDS_SPOOL_PATH = os.path.join(BASE_DIR, 'spool.sqlite3')
+RECORDS_SPOOL_BATCH_SIZE = 5000
+
+# Bucket sizes of the records rollups kept up to date on ingestion and
+# served by the statistics endpoint. An empty list disables them.
+RECORDS_ROLLUP_BUCKETS = ['minute', 'hour', 'day']
+
+# Token authentication cache: number of tokens kept in each process, for
+# how many seconds, and the optional cache alias shared by the processes.
+AUTH_TOKEN_CACHE_SIZE = 1024
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_CACHE_ALIAS = None
+
+# Records retention, applied by `manage.py apply_retention`: records older
+# than the number of days are removed, None keeps them forever. On
+# Postgres the records table is partitioned by month and partitions are
+# kept ready for the upcoming months.
+RECORDS_RETENTION_DAYS = None
+RECORDS_PARTITIONS_AHEAD = 3
+RECORDS_RETENTION_BATCH_SIZE = 5000
+
+# Records responses cache: cache alias, None disables it, and seconds a
+# cached list or detail response is kept. Writes invalidate it at once.
+RECORDS_CACHE_ALIAS = 'records'
+RECORDS_CACHE_TIMEOUT = 60
+
+# Records live tail: 'local' feeds the viewers from the ingestion of the
+# same process, 'postgres' from any process through LISTEN/NOTIFY, None
+# disables it. Each viewer holds a worker thread, so run gunicorn with
+# threads. Seconds between keepalive comments, milliseconds a client
+# waits to reconnect and records queued per viewer.
+RECORDS_TAIL_BACKEND = 'local'
+RECORDS_TAIL_HEARTBEAT = 15
+RECORDS_TAIL_RETRY = 3000
+RECORDS_TAIL_QUEUE_SIZE = 1000
+# Viewers per process, None doesn't limit them. Keep it below the threads
+# of a worker, 8 in the Procfile, so the viewers don't take every thread
+# and block the rest of the API.
+RECORDS_TAIL_MAX_SUBSCRIBERS = 4
+
+# Syslog listener, `manage.py run_syslog`: UDP and TCP port, and the
+# received records are stored every batch size messages or flush
+# interval milliseconds.
+RECORDS_SYSLOG_PORT = 5140
+RECORDS_SYSLOG_BATCH_SIZE = 1000
+RECORDS_SYSLOG_FLUSH_INTERVAL = 200
+# Batches waiting for the database before the TCP senders are paused and
+# the UDP messages shed, and times a failed batch is tried again.
+RECORDS_SYSLOG_MAX_PENDING = 10
+RECORDS_SYSLOG_RETRIES = 3
+
+# Prometheus metrics served on /metrics, requiring the bearer token when
+# set. The values are per process. Production only serves them with a
+# token.
+METRICS_ENABLED = True
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Cold tier: `manage.py move_archived` moves the archived records older
+# than the number of days to the archived records table, in transactions
+# of the batch size. The records list reads both tables.
+RECORDS_COLD_MIN_AGE = 0
+RECORDS_COLD_BATCH_SIZE = 5000
+
 # Custom user
 # AUTH_USER_MODEL = 'api.User'
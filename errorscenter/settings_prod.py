@@ -1,3 +1,5 @@
+import os
+
 import dj_database_url
 
 from .settings import *
@@ -5,6 +7,18 @@ from .settings import *
 
 DEBUG = False
 
+# Connections are kept open for the number of seconds, instead of opening
+# one for each request.
 DATABASES = {
-    'default': dj_database_url.config(),
+    'default': dj_database_url.config(
+        conn_max_age=int(os.getenv('DATABASE_CONN_MAX_AGE', '600'))
+    ),
 }
+
+# The web processes run several workers, so the live tail goes through
+# Postgres for every viewer to see the records ingested by any of them.
+RECORDS_TAIL_BACKEND = os.getenv('RECORDS_TAIL_BACKEND', 'postgres')
+
+# The metrics are only served behind their token, /metrics is not found
+# when METRICS_TOKEN isn't set.
+METRICS_ENABLED = bool(METRICS_TOKEN)